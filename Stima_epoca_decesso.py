@@ -23,8 +23,8 @@ from app.parameters import (
     dati_parametri_aggiuntivi, nomi_brevi,
 )
 
-from app.data_sources import load_tabelle_correzione
-from app.plotting import compute_plot_data, render_ranges_plot
+from app.data_sources import load_tabella2_interpolatore
+from app.plotting import compute_plot_data
 from app.textgen import (
     build_final_sentence,
     paragrafo_raffreddamento_dettaglio,
@@ -43,14 +43,19 @@ from app.textgen import (
 
 from app.cautelativa import compute_raffreddamento_cautelativo
 from app.graphing import aggiorna_grafico  # in cima al file
+from app.sopraciliare_ui import install_sopraciliare_click_selector
+from app.shared_resources import inizializza_risorse_condivise
+from app.timing import avvia_misura_rerun, chiudi_misura_rerun
 
 import streamlit as st
-import matplotlib.pyplot as plt
 import numpy as np
 import datetime
 import pandas as pd
 import math
 
+# Selezione cliccabile dell'eccitabilità sopraciliare (patch di st.selectbox solo in questa pagina)
+install_sopraciliare_click_selector()
+
 def _is_num(x):
     try:
         return x is not None and float(x) == float(x)
@@ -127,6 +132,11 @@ def _warn_palette():
 # =========================
 st.set_page_config(page_title="Mor-tem", layout="centered", initial_sidebar_state="expanded")
 
+# Tabelle condivise tra le sessioni (create una volta per processo)
+inizializza_risorse_condivise()
+# Tempi per fase di questo rerun (pagina Diagnostica)
+avvia_misura_rerun("Stima_epoca_decesso")
+
 st.markdown("""
 <style>
 .final-text{
@@ -484,7 +494,7 @@ def pannello_suggerisci_fc(peso_default: float = 70.0, key_prefix: str = "fcpane
         acqua_mode = "stagnante" if acqua_label == "In acqua stagnante" else "corrente"
 
         try:
-            tabella2 = load_tabelle_correzione()
+            tabella2 = load_tabella2_interpolatore()
         except Exception:
             tabella2 = None
 
@@ -577,7 +587,7 @@ def pannello_suggerisci_fc(peso_default: float = 70.0, key_prefix: str = "fcpane
             correnti_presenti = st.toggle("Correnti d'aria presenti?", key=k("toggle_correnti_fc"), disabled=False)
 
     try:
-        tabella2 = load_tabelle_correzione()
+        tabella2 = load_tabella2_interpolatore()
     except Exception:
         tabella2 = None
 
@@ -842,6 +852,7 @@ if st.session_state["show_results"]:
 
     if no_rt and no_macchie and no_rigidita:
         st.warning("Nessun dato inserito per la stima")
+        chiudi_misura_rerun()   # st.stop salta la chiusura in fondo alla pagina
         st.stop()
 
     base_ok = (
@@ -878,4 +889,7 @@ if st.session_state["show_results"]:
         input_ora_rilievo=st.session_state.get("input_ora_rilievo"),
         alterazioni_putrefattive=st.session_state.get("alterazioni_putrefattive", False),
         skip_warnings=True,
+        firma=curr_sig,   # rerun con gli stessi input: stima, testi e grafico dalla cache di sessione
     )
+
+chiudi_misura_rerun()
@@ -1,5 +1 @@
 # -*- coding: utf-8 -*-
-
-from app.sopraciliare_ui import install_sopraciliare_click_selector
-
-install_sopraciliare_click_selector()
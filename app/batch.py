@@ -0,0 +1,435 @@
+# -*- coding: utf-8 -*-
+# app/batch.py — Ristima headless di un archivio di casi (CSV/JSONL).
+#
+# Uso:
+#   python -m app.batch casi.csv -o risultati.jsonl
+#   python -m app.batch casi.jsonl --formato-output csv > risultati.csv
+#   cat casi.jsonl | python -m app.batch - --formato-input jsonl
+#   python -m app.batch casi.csv -o out.jsonl --workers 0 --chunk-size 128
+#
+# I casi sono letti e i risultati scritti una riga alla volta: la memoria
+# resta costante qualunque sia la dimensione dell'archivio. Con --workers
+# i casi sono distribuiti a blocchi su un pool di processi, con un numero
+# limitato di blocchi in volo e output nello stesso ordine dell'input.
+#
+# Campi di input (colonne CSV o chiavi JSON; vuoto/assente = non fornito):
+#   id                     identificativo riportato in output
+#   Tr, Ta, T0, peso       temperature (°C) e peso (kg); T0 default 37.2
+#   FC                     fattore di correzione; se assente è calcolato dallo
+#                          scenario (stato, acqua, sottili, spessi, coperte_medie,
+#                          coperte_pesanti, superficie, correnti_aria) oppure 1.0
+#   macchie, rigidita      voci di opzioni_macchie / opzioni_rigidita
+#   ispezione              data/ora dell'ispezione, "YYYY-MM-DD HH:MM"
+#   putrefattive           alterazioni putrefattive segnalate (bool)
+#   parametri              oggetto JSON {nome: {"stato": ..., "data": "YYYY-MM-DD", "ora": "HH:MM"}}
+#   cautelativa            stima cautelativa (bool) con Ta_min, Ta_max, FC_min,
+#                          FC_max, peso_stimato
+
+from __future__ import annotations
+
+import argparse
+import csv
+import datetime
+import json
+import itertools
+import math
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from app.engine import EstimateInputs, EstimateResult, estimate
+from app.factor_calc import DressCounts, compute_factor
+from app.henssge import METODI_INVERSIONE, METODO_BISEZIONE, METODO_TABELLA, tabella_inversa_qp
+from app.parameters import dati_parametri_aggiuntivi, opzioni_macchie, opzioni_rigidita
+
+T0_DEFAULT = 37.2
+FC_DEFAULT = 1.0
+
+FORMATI_INPUT = ("auto", "csv", "jsonl")
+FORMATI_OUTPUT = ("jsonl", "csv")
+
+CHUNK_SIZE_DEFAULT = 64
+BLOCCHI_IN_VOLO_PER_WORKER = 2   # finestra di blocchi sottomessi ma non ancora scritti
+
+COLONNE_OUTPUT = [
+    "id", "errore", "fc", "raffreddamento_calcolabile",
+    "t_min", "t_max", "t_med", "qd", "potente_ore", "usa_potente",
+    "comune_inizio", "comune_fine", "overlap", "discordanti",
+    "concordanti_inizio", "concordanti_fine", "parametri_esclusi",
+    "frase_breve_html", "frase_finale_html", "avvisi",
+]
+
+
+# ------------------------
+# Parsing dei campi
+# ------------------------
+def _vuoto(v: Any) -> bool:
+    return v is None or (isinstance(v, str) and not v.strip()) or (isinstance(v, float) and math.isnan(v))
+
+def _num(v: Any) -> Optional[float]:
+    if _vuoto(v):
+        return None
+    if isinstance(v, str):
+        v = v.strip().replace(",", ".")
+    return float(v)
+
+def _int(v: Any) -> int:
+    n = _num(v)
+    return 0 if n is None else int(n)
+
+def _bool(v: Any) -> bool:
+    if _vuoto(v):
+        return False
+    if isinstance(v, str):
+        return v.strip().lower() in {"1", "true", "vero", "si", "sì", "yes", "y", "x"}
+    return bool(v)
+
+def _str(v: Any, default: Optional[str] = None) -> Optional[str]:
+    return default if _vuoto(v) else str(v).strip()
+
+def _data(v: Any) -> Optional[datetime.date]:
+    return None if _vuoto(v) else datetime.date.fromisoformat(str(v).strip())
+
+def _ispezione(v: Any) -> Tuple[Optional[datetime.date], Optional[str]]:
+    if _vuoto(v):
+        return None, None
+    dt = datetime.datetime.fromisoformat(str(v).strip())
+    return dt.date(), dt.strftime("%H:%M")
+
+def _parametri(v: Any) -> Dict[str, Dict[str, Any]]:
+    """Parametri aggiuntivi nel formato dei widget di `aggiorna_grafico`."""
+    if _vuoto(v):
+        return {}
+    raw = json.loads(v) if isinstance(v, str) else v
+    if not isinstance(raw, dict):
+        raise ValueError("'parametri' deve essere un oggetto JSON {nome: {stato, data, ora}}")
+    widgets: Dict[str, Dict[str, Any]] = {}
+    for nome, spec in raw.items():
+        if nome not in dati_parametri_aggiuntivi:
+            raise ValueError(f"Parametro aggiuntivo sconosciuto: {nome!r}")
+        spec = spec if isinstance(spec, dict) else {"stato": spec}
+        stato = _str(spec.get("stato"), "Non valutata")
+        if stato not in dati_parametri_aggiuntivi[nome]["opzioni"]:
+            raise ValueError(f"Stato sconosciuto per {nome!r}: {stato!r}")
+        widgets[nome] = {
+            "selettore": stato,
+            "data_rilievo": _data(spec.get("data")),
+            "ora_rilievo": _str(spec.get("ora"), ""),
+        }
+    return widgets
+
+
+# ------------------------
+# Caso → input del motore
+# ------------------------
+def fc_da_scenario(caso: Dict[str, Any], peso: Optional[float], tabella2: Optional[pd.DataFrame]) -> Optional[float]:
+    """FC calcolato con `compute_factor` dalle colonne di scenario (None se assenti)."""
+    stato = _str(caso.get("stato"))
+    if stato is None:
+        return None
+    if stato not in ("Asciutto", "Bagnato", "Immerso"):
+        raise ValueError(f"Stato del corpo non valido: {stato!r}")
+    counts = DressCounts(
+        sottili=_int(caso.get("sottili")),
+        spessi=_int(caso.get("spessi")),
+        coperte_medie=_int(caso.get("coperte_medie")) if stato == "Asciutto" else 0,
+        coperte_pesanti=_int(caso.get("coperte_pesanti")) if stato == "Asciutto" else 0,
+    )
+    res = compute_factor(
+        stato=stato,
+        acqua=_str(caso.get("acqua"), "stagnante") if stato == "Immerso" else None,
+        counts=counts,
+        superficie_display=_str(caso.get("superficie")) if stato == "Asciutto" else None,
+        correnti_aria=_bool(caso.get("correnti_aria")),
+        peso=peso if peso is not None else 70.0,
+        tabella2_df=tabella2,
+    )
+    return float(res.fattore_finale)
+
+def caso_to_inputs(
+    caso: Dict[str, Any], *,
+    tabella2: Optional[pd.DataFrame] = None,
+    round_minutes: int = 30,
+    metodo: str = METODO_BISEZIONE,
+) -> Tuple[EstimateInputs, float]:
+    """Converte un caso grezzo negli input del motore; ritorna anche l'FC usato."""
+    macchie = _str(caso.get("macchie"), "Non valutate")
+    rigidita = _str(caso.get("rigidita"), "Non valutata")
+    if macchie not in opzioni_macchie:
+        raise ValueError(f"Voce 'macchie' sconosciuta: {macchie!r}")
+    if rigidita not in opzioni_rigidita:
+        raise ValueError(f"Voce 'rigidita' sconosciuta: {rigidita!r}")
+
+    peso = _num(caso.get("peso"))
+    fc = _num(caso.get("FC"))
+    if fc is None:
+        fc = fc_da_scenario(caso, peso, tabella2)
+    if fc is None:
+        fc = FC_DEFAULT
+
+    data_isp, ora_isp = _ispezione(caso.get("ispezione"))
+    T0 = _num(caso.get("T0"))
+
+    inp = EstimateInputs(
+        selettore_macchie=macchie,
+        selettore_rigidita=rigidita,
+        input_rt=_num(caso.get("Tr")),
+        input_ta=_num(caso.get("Ta")),
+        input_tm=T0_DEFAULT if T0 is None else T0,
+        input_w=peso,
+        fattore_correzione=fc,
+        widgets_parametri_aggiuntivi=_parametri(caso.get("parametri")),
+        usa_orario_custom=data_isp is not None,
+        input_data_rilievo=data_isp,
+        input_ora_rilievo=ora_isp,
+        alterazioni_putrefattive=_bool(caso.get("putrefattive")),
+        skip_warnings=True,   # come la pagina principale: dati mancanti escludono Henssge
+        round_minutes=int(round_minutes),
+        metodo=metodo,
+        stima_cautelativa=_bool(caso.get("cautelativa")),
+        Ta_min=_num(caso.get("Ta_min")),
+        Ta_max=_num(caso.get("Ta_max")),
+        FC_min=_num(caso.get("FC_min")),
+        FC_max=_num(caso.get("FC_max")),
+        peso_stimato=_bool(caso.get("peso_stimato")),
+        cf_descrizione_valore=fc,
+    )
+    return inp, fc
+
+
+# ------------------------
+# Risultato → record
+# ------------------------
+def _out(x: Any) -> Any:
+    """NaN/inf → None, numpy → tipi Python (JSON valido)."""
+    if x is None:
+        return None
+    if isinstance(x, (bool, str)):
+        return x
+    try:
+        f = float(x)
+    except (TypeError, ValueError):
+        return x
+    return f if math.isfinite(f) else None
+
+def risultato_to_record(caso_id: Any, res: EstimateResult, fc: float) -> Dict[str, Any]:
+    return {
+        "id": caso_id,
+        "errore": res.errore,
+        "fc": _out(fc),
+        "raffreddamento_calcolabile": res.raffreddamento_calcolabile,
+        "t_min": _out(res.t_min_raff_henssge),
+        "t_max": _out(res.t_max_raff_henssge),
+        "t_med": _out(res.t_med_raff_henssge_rounded),
+        "qd": _out(res.Qd_val_check),
+        "potente_ore": _out(res.mt_ore),
+        "usa_potente": res.usa_potente,
+        "comune_inizio": _out(res.comune_inizio),
+        "comune_fine": _out(res.comune_fine),
+        "overlap": res.overlap,
+        "discordanti": res.discordanti,
+        "concordanti_inizio": _out(res.finestra_concordante[0]),
+        "concordanti_fine": _out(res.finestra_concordante[1]),
+        "parametri_esclusi": list(res.nomi_esclusi),
+        "frase_breve_html": res.frase_breve,
+        "frase_finale_html": res.frase_finale_html or None,
+        "avvisi": list(res.avvisi),
+    }
+
+def stima_caso(caso: Dict[str, Any], **opts) -> Dict[str, Any]:
+    """Stima di un singolo caso; gli errori diventano un record con 'errore'."""
+    caso_id = caso.get("id")
+    try:
+        inp, fc = caso_to_inputs(caso, **opts)
+        return risultato_to_record(caso_id, estimate(inp), fc)
+    except Exception as e:  # un caso malformato non deve fermare l'archivio
+        return {"id": caso_id, "errore": f"{type(e).__name__}: {e}"}
+
+
+# ------------------------
+# I/O in streaming
+# ------------------------
+def leggi_casi(fp: IO[str], formato: str) -> Iterator[Dict[str, Any]]:
+    if formato == "csv":
+        yield from csv.DictReader(fp)
+        return
+    for n, riga in enumerate(fp, start=1):
+        if not riga.strip():
+            continue
+        try:
+            caso = json.loads(riga)
+        except json.JSONDecodeError as e:
+            yield {"id": None, "__errore__": f"riga {n}: JSON non valido ({e.msg})"}
+            continue
+        yield caso if isinstance(caso, dict) else {"id": None, "__errore__": f"riga {n}: atteso un oggetto JSON"}
+
+def stima_casi(casi: Iterable[Dict[str, Any]], **opts) -> Iterator[Dict[str, Any]]:
+    for caso in casi:
+        if "__errore__" in caso:
+            yield {"id": None, "errore": caso["__errore__"]}
+        else:
+            yield stima_caso(caso, **opts)
+
+# ------------------------
+# Esecuzione parallela (pool di processi)
+# ------------------------
+_worker_opts: Dict[str, Any] = {}
+
+def _init_worker(usa_tabella2: bool, round_minutes: int, metodo: str) -> None:
+    """Inizializzazione una tantum di ogni processo: Tabella 2 e tabelle di Henssge."""
+    from app.data_sources import leggi_tabella_correzione
+    _worker_opts.clear()
+    _worker_opts.update(
+        tabella2=leggi_tabella_correzione() if usa_tabella2 else None,
+        round_minutes=round_minutes,
+        metodo=metodo,
+    )
+    if metodo == METODO_TABELLA:
+        for A in (1.25, 10 / 9):
+            tabella_inversa_qp(A)
+
+def _stima_blocco(blocco: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return list(stima_casi(blocco, **_worker_opts))
+
+def _blocchi(casi: Iterable[Dict[str, Any]], chunk_size: int) -> Iterator[List[Dict[str, Any]]]:
+    it = iter(casi)
+    while True:
+        blocco = list(itertools.islice(it, chunk_size))
+        if not blocco:
+            return
+        yield blocco
+
+def stima_casi_parallela(
+    casi: Iterable[Dict[str, Any]], *,
+    workers: int,
+    chunk_size: int = CHUNK_SIZE_DEFAULT,
+    usa_tabella2: bool = True,
+    round_minutes: int = 30,
+    metodo: str = METODO_BISEZIONE,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Come `stima_casi`, ma su `workers` processi a blocchi di `chunk_size` casi.
+    L'ordine dei risultati è quello dell'input; al più
+    workers * BLOCCHI_IN_VOLO_PER_WORKER blocchi restano in memoria.
+    """
+    if workers < 1 or chunk_size < 1:
+        raise ValueError("workers e chunk_size devono essere >= 1")
+    max_in_volo = workers * BLOCCHI_IN_VOLO_PER_WORKER
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(usa_tabella2, round_minutes, metodo),
+    ) as pool:
+        in_volo: deque = deque()
+        for blocco in _blocchi(casi, chunk_size):
+            in_volo.append(pool.submit(_stima_blocco, blocco))
+            if len(in_volo) >= max_in_volo:
+                yield from in_volo.popleft().result()
+        while in_volo:
+            yield from in_volo.popleft().result()
+
+def scrivi_risultati(records: Iterable[Dict[str, Any]], fp: IO[str], formato: str) -> Tuple[int, int]:
+    """Scrive un record per riga; ritorna (n_casi, n_errori)."""
+    writer = None
+    if formato == "csv":
+        writer = csv.DictWriter(fp, fieldnames=COLONNE_OUTPUT, extrasaction="ignore")
+        writer.writeheader()
+    n = n_err = 0
+    for rec in records:
+        n += 1
+        n_err += bool(rec.get("errore"))
+        if writer is not None:
+            row = dict(rec)
+            row["avvisi"] = " | ".join(rec.get("avvisi") or [])
+            row["parametri_esclusi"] = " | ".join(rec.get("parametri_esclusi") or [])
+            writer.writerow(row)
+        else:
+            fp.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    fp.flush()
+    return n, n_err
+
+def _formato_input(path: str, formato: str) -> str:
+    if formato != "auto":
+        return formato
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+# ------------------------
+# CLI
+# ------------------------
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(
+        prog="python -m app.batch",
+        description="Ristima headless di casi da CSV/JSONL (un risultato per riga).",
+    )
+    p.add_argument("input", help="file CSV/JSONL dei casi ('-' = stdin)")
+    p.add_argument("-o", "--output", default="-", help="file di output ('-' = stdout)")
+    p.add_argument("--formato-input", choices=FORMATI_INPUT, default="auto")
+    p.add_argument("--formato-output", choices=FORMATI_OUTPUT, default="jsonl")
+    p.add_argument("--round-minutes", type=int, choices=(6, 15, 30), default=30,
+                   help="arrotondamento dell'output di Henssge")
+    p.add_argument("--metodo", choices=METODI_INVERSIONE, default=METODO_BISEZIONE,
+                   help="metodo di inversione dell'equazione di Henssge")
+    p.add_argument("--senza-tabella2", action="store_true",
+                   help="non adattare l'FC di scenario al peso (Tabella 2)")
+    p.add_argument("--workers", type=int, default=1,
+                   help="processi paralleli (1 = sequenziale, 0 = tutti i core)")
+    p.add_argument("--chunk-size", type=int, default=CHUNK_SIZE_DEFAULT,
+                   help="casi per blocco inviato a ciascun processo")
+    return p
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    if args.chunk_size < 1:
+        parser.error("--chunk-size deve essere >= 1")
+
+    formato_in = _formato_input(args.input, args.formato_input)
+    fin = sys.stdin if args.input == "-" else open(args.input, newline="", encoding="utf-8")
+    fout = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        casi = leggi_casi(fin, formato_in)
+        if workers > 1:
+            records = stima_casi_parallela(
+                casi, workers=workers, chunk_size=args.chunk_size,
+                usa_tabella2=not args.senza_tabella2,
+                round_minutes=args.round_minutes, metodo=args.metodo,
+            )
+        else:
+            from app.data_sources import leggi_tabella_correzione
+            records = stima_casi(
+                casi,
+                tabella2=None if args.senza_tabella2 else leggi_tabella_correzione(),
+                round_minutes=args.round_minutes, metodo=args.metodo,
+            )
+        n, n_err = scrivi_risultati(records, fout, args.formato_output)
+    finally:
+        if fin is not sys.stdin:
+            fin.close()
+        if fout is not sys.stdout:
+            fout.close()
+
+    print(f"{n} casi elaborati, {n_err} con errori.", file=sys.stderr)
+    return 0
+
+
+__all__ = [
+    "COLONNE_OUTPUT",
+    "caso_to_inputs",
+    "fc_da_scenario",
+    "stima_caso",
+    "stima_casi",
+    "stima_casi_parallela",
+    "leggi_casi",
+    "scrivi_risultati",
+    "main",
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,537 @@
+# -*- coding: utf-8 -*-
+# app/bench.py — Benchmark riproducibili del nucleo di calcolo.
+#
+# Uso:
+#   python -m app.bench                          # tutti i benchmark
+#   python -m app.bench -k cautelativa -r 5      # filtro sul nome, 5 ripetizioni
+#   python -m app.bench --salva bench_base.json  # salva la baseline
+#   python -m app.bench --confronta bench_base.json [--soglia 0.10] [--fallisci-se-regressione]
+#   python -m app.bench --memoria 300 [--soglia-memoria-mb 25]   # RSS su stime + grafici ripetuti
+#   python -m app.bench --import                 # tempi di import (-X importtime) e import differiti
+#
+# I corpora sono generati con semi fissi (stessi casi a ogni esecuzione):
+# corpi asciutti/bagnati/immersi, Ta ≤ 23 e > 23, range cautelativi stretti e ampi.
+# Per ogni funzione sono riportati i percentili della latenza per chiamata
+# e il throughput (chiamate/s).
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from app.cautelativa import compute_raffreddamento_cautelativo, STRATEGIA_ANGOLI, STRATEGIA_GRIGLIA
+from app.engine import EstimateInputs, estimate
+from app.factor_calc import DressCounts, SURF_DISPLAY_ORDER, adatta_per_peso, compute_factor, compute_factor_batch
+from app.henssge import (
+    CACHE_MAXSIZE_DEFAULT, calcola_raffreddamento, configura_cache_henssge, svuota_cache_henssge,
+)
+from app.montecarlo import normale, simula_raffreddamento, triangolare
+from app.parameters import INF_HOURS, opzioni_macchie, opzioni_rigidita
+from app.plotting import (
+    PLOT_CACHE_MAXSIZE_DEFAULT, compute_plot_data, configura_cache_grafici, render_ranges_image,
+    render_ranges_plot, render_ranges_svg, svuota_cache_grafici,
+)
+from app.textgen import (
+    build_final_sentence, build_simple_sentence, paragrafo_raffreddamento_dettaglio,
+)
+
+SEED = 20240601
+N_CASI = 200
+DT_ISPEZIONE = datetime.datetime(2024, 6, 1, 10, 0)
+
+
+# ------------------------
+# Datamodel
+# ------------------------
+@dataclass(frozen=True)
+class Benchmark:
+    nome: str
+    funzione: Callable[[Any], Any]
+    casi: Sequence[Any]
+    pulizia: Optional[Callable[[Any], None]] = None   # eseguita fuori dalla misura
+
+@dataclass
+class BenchResult:
+    nome: str
+    n: int
+    p50_us: float
+    p90_us: float
+    p99_us: float
+    media_us: float
+    throughput_s: float   # chiamate al secondo (sul tempo misurato)
+
+
+# ------------------------
+# Corpora (semi fissi)
+# ------------------------
+def _rng(offset: int) -> np.random.Generator:
+    # un seme per corpus: aggiungere un corpus non cambia gli altri
+    return np.random.default_rng(SEED + offset)
+
+def _corpus_henssge(n: int) -> List[Dict[str, float]]:
+    r = _rng(1)
+    casi = []
+    for i in range(n):
+        Ta = float(r.uniform(0, 23)) if i % 2 == 0 else float(r.uniform(23.1, 32))   # Ta ≤ 23 e > 23
+        casi.append(dict(
+            Tr=round(float(r.uniform(Ta + 1, 37)), 1), Ta=round(Ta, 1), T0=37.2,
+            W=float(r.integers(45, 120)), CF=float(r.choice([0.5, 0.7, 1.0, 1.1, 1.4, 1.8, 2.4])),
+        ))
+    return casi
+
+def _corpus_fattore(n: int) -> List[Dict[str, Any]]:
+    r = _rng(2)
+    stati = ["Asciutto", "Bagnato", "Immerso"]
+    casi = []
+    for i in range(n):
+        stato = stati[i % 3]   # corpi asciutti / bagnati / immersi
+        casi.append(dict(
+            stato=stato,
+            acqua=("stagnante" if r.random() < 0.5 else "corrente") if stato == "Immerso" else None,
+            counts=DressCounts(
+                sottili=int(r.integers(0, 5)), spessi=int(r.integers(0, 3)),
+                coperte_medie=int(r.integers(0, 2)) if stato == "Asciutto" else 0,
+                coperte_pesanti=int(r.integers(0, 2)) if stato == "Asciutto" else 0,
+            ) if stato != "Immerso" else DressCounts(),
+            superficie_display=str(r.choice(SURF_DISPLAY_ORDER)) if stato == "Asciutto" else None,
+            correnti_aria=bool(r.random() < 0.4),
+            peso=float(r.integers(40, 150)),
+        ))
+    return casi
+
+def _scenari_dataframe(casi: List[Dict[str, Any]]) -> pd.DataFrame:
+    # stesso corpus di compute_factor, in forma tabellare per compute_factor_batch
+    return pd.DataFrame([
+        dict(stato=c["stato"], acqua=c["acqua"], sottili=c["counts"].sottili, spessi=c["counts"].spessi,
+             coperte_medie=c["counts"].coperte_medie, coperte_pesanti=c["counts"].coperte_pesanti,
+             superficie=c["superficie_display"], correnti_aria=c["correnti_aria"], peso=c["peso"])
+        for c in casi
+    ])
+
+def _corpus_peso(n: int) -> List[Dict[str, float]]:
+    r = _rng(3)
+    return [dict(fattore_base=round(float(r.uniform(1.0, 3.0)), 2), peso=float(r.integers(4, 150)))
+            for _ in range(n)]
+
+def _corpus_cautelativa(n: int, ampio: bool) -> List[Dict[str, Any]]:
+    r = _rng(4 if ampio else 5)
+    casi = []
+    for i in range(n):
+        Ta = float(r.uniform(5, 21)) if i % 2 == 0 else float(r.uniform(24, 30))
+        dTa, dCF = (4.0, 0.6) if ampio else (1.0, 0.1)
+        CF = float(r.choice([0.7, 1.0, 1.3, 1.8]))
+        casi.append(dict(
+            dt_ispezione=DT_ISPEZIONE,
+            Ta_value=round(Ta, 1), CF_value=CF, peso_kg=float(r.integers(50, 100)),
+            Ta_range=(round(Ta - dTa, 1), round(Ta + dTa, 1)),
+            CF_range=(max(CF - dCF, 0.35), CF + dCF),
+            peso_stimato=ampio,
+            mostra_tabella=False,
+            solver_kwargs={"Tr": round(float(r.uniform(Ta + dTa + 1, 37)), 1), "T0": 37.2, "round_minutes": 30},
+        ))
+    return casi
+
+def _corpus_plot(n: int) -> List[Dict[str, Any]]:
+    r = _rng(6)
+    macchie = [v for v in opzioni_macchie.values() if isinstance(v, tuple)]
+    rigidita = [v for v in opzioni_rigidita.values() if isinstance(v, tuple)]
+    casi = []
+    for _ in range(n):
+        t_min = float(r.uniform(0, 30))
+        t_max = t_min + float(r.uniform(3, 15))
+        potente = r.random() < 0.3
+        casi.append(dict(
+            macchie_range=macchie[int(r.integers(len(macchie)))], macchie_medi_range=None,
+            rigidita_range=rigidita[int(r.integers(len(rigidita)))], rigidita_medi_range=None,
+            raffreddamento_calcolabile=not potente,
+            t_min_raff_henssge=np.nan if potente else t_min,
+            t_max_raff_henssge=np.nan if potente else t_max,
+            t_med_raff_henssge_rounded_raw=np.nan if potente else 0.5 * (t_min + t_max),
+            Qd_val_check=float(r.uniform(0.1, 0.9)),
+            mt_ore=float(r.uniform(20, 40)) if potente else None,
+            INF_HOURS=INF_HOURS,
+            qd_threshold=0.2,
+            extra_params=[{"label": "Sopraciliare", "start": 3.5, "end": 13.0, "order": 0, "adattato": False}]
+                         if r.random() < 0.5 else [],
+        ))
+    return casi
+
+def _corpus_testi(n: int) -> List[Dict[str, float]]:
+    r = _rng(7)
+    casi = []
+    for _ in range(n):
+        a = float(np.round(r.uniform(0, 40) * 4) / 4)
+        b = a + float(np.round(r.uniform(0.5, 20) * 4) / 4)
+        casi.append(dict(inizio=a, fine=(np.nan if r.random() < 0.2 else b),
+                         qd=float(r.uniform(0.1, 0.9)), ta=float(r.uniform(5, 30))))
+    return casi
+
+def _corpus_estimate(n: int) -> List[EstimateInputs]:
+    r = _rng(8)
+    macchie = list(opzioni_macchie)
+    rigidita = list(opzioni_rigidita)
+    casi = []
+    for i in range(n):
+        Ta = round(float(r.uniform(2, 30)), 1)
+        casi.append(EstimateInputs(
+            selettore_macchie=macchie[int(r.integers(len(macchie)))],
+            selettore_rigidita=rigidita[int(r.integers(len(rigidita)))],
+            input_rt=round(float(r.uniform(Ta + 0.5, 37)), 1), input_ta=Ta, input_tm=37.2,
+            input_w=float(r.integers(45, 110)), fattore_correzione=float(r.choice([0.7, 1.0, 1.3])),
+            usa_orario_custom=True, input_data_rilievo=DT_ISPEZIONE.date(), input_ora_rilievo="10:00",
+            skip_warnings=True,
+            stima_cautelativa=(i % 4 == 0),
+            Ta_min=Ta - 2.0, Ta_max=Ta + 2.0,
+        ))
+    return casi
+
+def _corpus_montecarlo(n: int) -> List[Dict[str, Any]]:
+    r = _rng(9)
+    casi = []
+    for _ in range(n):
+        Ta = round(float(r.uniform(5, 28)), 1)
+        CF = float(r.choice([0.8, 1.0, 1.3]))
+        casi.append(dict(
+            Tr=round(float(r.uniform(Ta + 2, 36)), 1),
+            Ta=normale(Ta, 1.5), CF=triangolare(CF - 0.1, CF, CF + 0.1),
+            W=normale(float(r.integers(50, 100)), 3.0), T0=normale(37.2, 0.4), errore_Tr=normale(0.0, 0.1),
+        ))
+    return casi
+
+
+def benchmarks(n: int = N_CASI) -> List[Benchmark]:
+    """Elenco dei benchmark con i rispettivi corpora."""
+    from app.data_sources import leggi_tabella_correzione
+    tabella2 = leggi_tabella_correzione()
+
+    henssge = _corpus_henssge(n)
+    fattore = _corpus_fattore(n)
+    cautela_stretta = _corpus_cautelativa(max(n // 4, 1), ampio=False)
+    cautela_ampia = _corpus_cautelativa(max(n // 4, 1), ampio=True)
+    plot = _corpus_plot(n)
+    plot_data = [compute_plot_data(**c) for c in plot]
+    testi = _corpus_testi(n)
+
+    return [
+        Benchmark("calcola_raffreddamento", lambda c: calcola_raffreddamento(**c), henssge),
+        Benchmark("compute_factor", lambda c: compute_factor(**c, tabella2_df=tabella2), fattore),
+        Benchmark("compute_factor_batch", lambda df: compute_factor_batch(df, tabella2),
+                  [_scenari_dataframe(fattore)]),
+        Benchmark("adatta_per_peso", lambda c: adatta_per_peso(c["fattore_base"], c["peso"], tabella2),
+                  _corpus_peso(n)),
+        Benchmark("cautelativa_stretta_griglia",
+                  lambda c: compute_raffreddamento_cautelativo(**c, strategia=STRATEGIA_GRIGLIA), cautela_stretta),
+        Benchmark("cautelativa_ampia_griglia",
+                  lambda c: compute_raffreddamento_cautelativo(**c, strategia=STRATEGIA_GRIGLIA), cautela_ampia),
+        Benchmark("cautelativa_stretta_angoli",
+                  lambda c: compute_raffreddamento_cautelativo(**c, strategia=STRATEGIA_ANGOLI), cautela_stretta),
+        Benchmark("cautelativa_ampia_angoli",
+                  lambda c: compute_raffreddamento_cautelativo(**c, strategia=STRATEGIA_ANGOLI), cautela_ampia),
+        Benchmark("simula_raffreddamento_100k", lambda c: simula_raffreddamento(**c),
+                  _corpus_montecarlo(max(n // 50, 1))),
+        Benchmark("compute_plot_data", lambda c: compute_plot_data(**c), plot),
+        Benchmark("render_ranges_plot", render_ranges_plot, plot_data[: max(n // 10, 1)]),
+        Benchmark("render_ranges_svg", render_ranges_svg, plot_data),
+        # rerun con dati invariati: l'immagine arriva dalla cache (hash del dict + lookup)
+        Benchmark("render_ranges_image_cache", render_ranges_image, plot_data[:5]),
+        Benchmark("build_final_sentence",
+                  lambda c: build_final_sentence(c["inizio"], c["fine"], DT_ISPEZIONE,
+                                                 qd_val=c["qd"], ta_val=c["ta"], inf_hours=INF_HOURS), testi),
+        Benchmark("build_simple_sentence",
+                  lambda c: build_simple_sentence(c["inizio"], c["fine"], DT_ISPEZIONE, inf_hours=INF_HOURS), testi),
+        Benchmark("paragrafo_raffreddamento_dettaglio",
+                  lambda c: paragrafo_raffreddamento_dettaglio(
+                      t_min_visual=c["inizio"], t_max_visual=c["inizio"] + 6.0,
+                      t_med_round=c["inizio"] + 3.0, qd_val=c["qd"], ta_val=c["ta"]), testi),
+        Benchmark("estimate", estimate, _corpus_estimate(max(n // 4, 1))),
+    ]
+
+
+# ------------------------
+# Misura
+# ------------------------
+def esegui(b: Benchmark, ripetizioni: int = 3) -> BenchResult:
+    """Latenza per chiamata su `ripetizioni` passate del corpus (dopo un giro di riscaldamento)."""
+    for c in b.casi[: min(len(b.casi), 5)]:
+        out = b.funzione(c)
+        if b.pulizia:
+            b.pulizia(out)
+
+    tempi = np.empty(len(b.casi) * ripetizioni, dtype=float)
+    k = 0
+    for _ in range(ripetizioni):
+        for c in b.casi:
+            t0 = time.perf_counter_ns()
+            out = b.funzione(c)
+            tempi[k] = time.perf_counter_ns() - t0
+            k += 1
+            if b.pulizia:
+                b.pulizia(out)
+
+    us = tempi / 1e3
+    p50, p90, p99 = np.percentile(us, [50, 90, 99])
+    return BenchResult(
+        nome=b.nome, n=int(us.size),
+        p50_us=float(p50), p90_us=float(p90), p99_us=float(p99),
+        media_us=float(us.mean()),
+        throughput_s=float(us.size / (us.sum() / 1e6)) if us.sum() > 0 else float("inf"),
+    )
+
+def esegui_tutti(filtro: Optional[str] = None, ripetizioni: int = 3, n: int = N_CASI) -> List[BenchResult]:
+    # La cache LRU di Henssge renderebbe le ripetizioni dei semplici hit:
+    # disattivata durante la misura e ripristinata alla fine.
+    configura_cache_henssge(0)
+    try:
+        return [esegui(b, ripetizioni) for b in benchmarks(n) if not filtro or filtro in b.nome]
+    finally:
+        svuota_cache_henssge()
+        configura_cache_henssge(CACHE_MAXSIZE_DEFAULT)
+
+
+# ------------------------
+# Memoria
+# ------------------------
+SOGLIA_MEMORIA_MB = 25.0
+
+def _rss_mb() -> float:
+    """RSS corrente in MB (/proc/self/statm su Linux; altrimenti il picco da getrusage)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError, AttributeError):
+        import resource
+        picco = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return picco / 2**20 if sys.platform == "darwin" else picco / 2**10
+
+def misura_memoria(n_stime: int = 300, blocco: int = 50) -> List[tuple]:
+    """
+    Esegue `n_stime` stime complete con rendering del grafico (cache immagini
+    disattivata: ogni stima disegna una figura) e campiona l'RSS ogni `blocco`.
+    Ritorna [(stime eseguite, RSS MB), ...]; il primo campione segue un blocco di riscaldamento.
+    """
+    casi = _corpus_estimate(min(n_stime, 100))
+    configura_cache_grafici(0)
+    try:
+        campioni = []
+        for i in range(blocco + n_stime):
+            res = estimate(casi[i % len(casi)])
+            if res.plot_data is not None:
+                render_ranges_image(res.plot_data)
+            eseguite = i + 1 - blocco
+            if eseguite >= 0 and eseguite % blocco == 0:
+                gc.collect()
+                campioni.append((eseguite, _rss_mb()))
+        return campioni
+    finally:
+        svuota_cache_grafici()
+        configura_cache_grafici(PLOT_CACHE_MAXSIZE_DEFAULT)
+
+def formatta_memoria(campioni: List[tuple]) -> str:
+    righe = [f"{'stime':>8}{'RSS MB':>10}{'Δ MB':>9}"]
+    base = campioni[0][1]
+    for n, mb in campioni:
+        righe.append(f"{n:>8}{mb:>10.1f}{mb - base:>+9.1f}")
+    figure = "—"
+    if "matplotlib.pyplot" in sys.modules:
+        figure = str(len(sys.modules["matplotlib.pyplot"].get_fignums()))
+    righe.append(f"figure aperte in pyplot: {figure}")
+    return "\n".join(righe)
+
+
+# ------------------------
+# Tempi di import
+# ------------------------
+# Ogni modulo è importato in un interprete nuovo con `python -X importtime`.
+# Le dipendenze pesanti sono caricate solo al primo uso (scipy quando si
+# cerca una radice, matplotlib quando si disegna, openpyxl quando si legge il
+# workbook): se compaiono già all'import di un modulo è una regressione.
+MODULI_IMPORT = (
+    "app.henssge", "app.factor_calc", "app.plotting", "app.cautelativa",
+    "app.montecarlo", "app.engine", "app.graphing",
+)
+MODULI_DIFFERITI = ("matplotlib", "scipy", "openpyxl", "streamlit_image_coordinates", "streamlit_extras")
+
+@dataclass
+class ImportResult:
+    modulo: str
+    totale_ms: float                       # tempo cumulativo dell'import
+    principali: List[tuple]                # [(modulo, ms)] import diretti più costosi
+    differiti_caricati: List[str]          # voci di MODULI_DIFFERITI caricate all'import
+
+def _importtime(modulo: str) -> List[tuple]:
+    """Righe di `-X importtime` come [(livello, modulo, cumulativo µs)]."""
+    radice = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=radice, capture_output=True, text=True, check=True,
+        env={**os.environ, "PYTHONPATH": radice},
+    )
+    righe = []
+    for riga in proc.stderr.splitlines():
+        if not riga.startswith("import time:") or "|" not in riga:
+            continue
+        _, cumulativo, nome = riga.split("|", 2)
+        if not cumulativo.strip().isdigit():
+            continue   # intestazione
+        nome = nome[1:]
+        livello = (len(nome) - len(nome.lstrip(" "))) // 2
+        righe.append((livello, nome.strip(), int(cumulativo)))
+    return righe
+
+def misura_import(moduli: Sequence[str] = MODULI_IMPORT, ripetizioni: int = 2, top: int = 5) -> List[ImportResult]:
+    """Tempo di import di ciascun modulo (minimo su `ripetizioni` interpreti nuovi)."""
+    risultati = []
+    for modulo in moduli:
+        migliore = None
+        for _ in range(max(1, ripetizioni)):
+            righe = _importtime(modulo)
+            totale = next((us for liv, nome, us in righe if liv == 0 and nome == modulo), 0)
+            if migliore is None or totale < migliore[0]:
+                migliore = (totale, righe)
+        totale, righe = migliore
+        # figli diretti: righe di livello 1 tra la riga di livello 0 precedente e quella del modulo
+        diretti, figli = [], []
+        for liv, nome, us in righe:
+            if liv == 1:
+                figli.append((nome, us / 1e3))
+            elif liv == 0:
+                if nome == modulo:
+                    diretti = sorted(figli, key=lambda x: -x[1])
+                figli = []
+        caricati = {nome for _, nome, _ in righe}
+        differiti = [m for m in MODULI_DIFFERITI if m in caricati]
+        risultati.append(ImportResult(modulo, totale / 1e3, diretti[:top], differiti))
+    return risultati
+
+def formatta_import(risultati: List[ImportResult]) -> str:
+    righe = [f"{'modulo':<24}{'ms':>9}  import più costosi"]
+    for r in risultati:
+        principali = ", ".join(f"{nome} {ms:.0f}" for nome, ms in r.principali[:3])
+        righe.append(f"{r.modulo:<24}{r.totale_ms:>9.1f}  {principali}")
+        if r.differiti_caricati:
+            righe.append(f"{'':<24}{'':>9}  ⚠ caricati all'import: {', '.join(r.differiti_caricati)}")
+    return "\n".join(righe)
+
+
+# ------------------------
+# Report / baseline
+# ------------------------
+def formatta_tabella(risultati: List[BenchResult]) -> str:
+    righe = [f"{'benchmark':<36}{'n':>7}{'p50 µs':>12}{'p90 µs':>12}{'p99 µs':>12}{'chiamate/s':>14}"]
+    for r in risultati:
+        righe.append(f"{r.nome:<36}{r.n:>7}{r.p50_us:>12.1f}{r.p90_us:>12.1f}{r.p99_us:>12.1f}{r.throughput_s:>14.0f}")
+    return "\n".join(righe)
+
+def _metadati() -> Dict[str, Any]:
+    return {
+        "data": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "piattaforma": platform.platform(),
+        "seed": SEED,
+    }
+
+def salva_baseline(risultati: List[BenchResult], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": _metadati(), "risultati": [asdict(r) for r in risultati]}, f, indent=2)
+
+def confronta(risultati: List[BenchResult], path: str, soglia: float = 0.10) -> tuple[str, bool]:
+    """Confronto dei p50 con una baseline salvata; ritorna (report, regressione_trovata)."""
+    with open(path, encoding="utf-8") as f:
+        base = {r["nome"]: r for r in json.load(f)["risultati"]}
+    righe = [f"{'benchmark':<36}{'base p50':>12}{'ora p50':>12}{'rapporto':>10}  esito"]
+    regressione = False
+    for r in risultati:
+        b = base.get(r.nome)
+        if b is None:
+            righe.append(f"{r.nome:<36}{'—':>12}{r.p50_us:>12.1f}{'—':>10}  nuovo")
+            continue
+        ratio = r.p50_us / b["p50_us"] if b["p50_us"] > 0 else float("inf")
+        if ratio > 1 + soglia:
+            esito, regressione = "PIÙ LENTO", True
+        elif ratio < 1 - soglia:
+            esito = "più veloce"
+        else:
+            esito = "invariato"
+        righe.append(f"{r.nome:<36}{b['p50_us']:>12.1f}{r.p50_us:>12.1f}{ratio:>10.2f}  {esito}")
+    return "\n".join(righe), regressione
+
+
+# ------------------------
+# CLI
+# ------------------------
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="python -m app.bench", description="Benchmark del nucleo di calcolo.")
+    p.add_argument("-k", "--filtro", default=None, help="esegue solo i benchmark il cui nome contiene il testo")
+    p.add_argument("-r", "--ripetizioni", type=int, default=3, help="passate su ciascun corpus")
+    p.add_argument("-n", "--casi", type=int, default=N_CASI, help="dimensione dei corpora")
+    p.add_argument("--salva", metavar="JSON", help="salva i risultati come baseline")
+    p.add_argument("--confronta", metavar="JSON", help="confronta con una baseline salvata")
+    p.add_argument("--soglia", type=float, default=0.10, help="variazione relativa del p50 tollerata")
+    p.add_argument("--fallisci-se-regressione", action="store_true",
+                   help="exit code 1 se un benchmark supera la soglia")
+    p.add_argument("--memoria", type=int, metavar="N",
+                   help="al posto dei tempi: N stime con grafico, RSS campionato (exit 1 se cresce oltre la soglia)")
+    p.add_argument("--soglia-memoria-mb", type=float, default=SOGLIA_MEMORIA_MB,
+                   help="crescita massima tollerata dell'RSS dopo il riscaldamento")
+    p.add_argument("--import", dest="importtime", action="store_true",
+                   help="al posto dei tempi: report di -X importtime (exit 1 se un import differito è caricato)")
+    return p
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.memoria:
+        campioni = misura_memoria(args.memoria)
+        print(formatta_memoria(campioni))
+        crescita = campioni[-1][1] - campioni[0][1]
+        if crescita > args.soglia_memoria_mb:
+            print(f"\nRSS cresciuto di {crescita:.1f} MB (soglia {args.soglia_memoria_mb:g} MB)")
+            return 1
+        return 0
+    if args.importtime:
+        risultati_import = misura_import()
+        print(formatta_import(risultati_import))
+        return 1 if any(r.differiti_caricati for r in risultati_import) else 0
+    risultati = esegui_tutti(args.filtro, args.ripetizioni, args.casi)
+    print(formatta_tabella(risultati))
+    if args.salva:
+        salva_baseline(risultati, args.salva)
+        print(f"\nBaseline salvata in {args.salva}")
+    if args.confronta:
+        report, regressione = confronta(risultati, args.confronta, args.soglia)
+        print("\n" + report)
+        if regressione and args.fallisci_se_regressione:
+            return 1
+    return 0
+
+
+__all__ = [
+    "Benchmark",
+    "BenchResult",
+    "benchmarks",
+    "esegui",
+    "esegui_tutti",
+    "formatta_tabella",
+    "salva_baseline",
+    "confronta",
+    "misura_memoria",
+    "ImportResult",
+    "misura_import",
+    "main",
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
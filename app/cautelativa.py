@@ -11,9 +11,10 @@ import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 
-from app.henssge import calcola_raffreddamento
+from app.henssge import calcola_raffreddamento, calcola_raffreddamento_batch, sensibilita_henssge, METODO_BISEZIONE
 from app.utils_time import arrotonda_quarto_dora   # <-- SOLO questa
 from app.parameters import INF_HOURS
+from app.timing import FASE_CAUTELATIVA, cronometra
 
 # ------------------------
 # Costanti e default range
@@ -27,8 +28,17 @@ DEFAULT_TA_STEP = 0.5
 DEFAULT_CF_STEP = 0.05
 DEFAULT_PESO_STEP = 1.0
 
+# Strategie di valutazione del range
+STRATEGIA_GRIGLIA = "griglia"   # prodotto cartesiano completo
+STRATEGIA_ANGOLI = "angoli"     # solo i 2^k vertici (monotonia di Henssge)
+STRATEGIE = (STRATEGIA_GRIGLIA, STRATEGIA_ANGOLI)
+
+# Soglie di Qd a cui cambia la banda Dt di Henssge (≤0.2, ≤0.3, ≤0.5, >0.5)
+QD_SOGLIE_DT = (0.2, 0.3, 0.5)
+
 # Limite di punti per dimensione per tenere le combinazioni gestibili
-MAX_POINTS_PER_DIM = 25
+# (la griglia è risolta in un'unica chiamata vettoriale: 61³ ≈ 227k punti)
+MAX_POINTS_PER_DIM = 61
 
 
 @dataclass
@@ -46,6 +56,12 @@ class CautelativaResult:
     # Riepilogo testuale
     summary_html: str
     parentetica: str
+    # Strategia effettivamente usata ("angoli" può ricadere su "griglia")
+    strategia: str = STRATEGIA_GRIGLIA
+    # Sensibilità di t agli input nei valori inseriti (solo con il solver di default;
+    # tabella solo con mostra_tabella, testo sempre)
+    sensibilita: Optional[pd.DataFrame] = None
+    sensibilita_html: str = ""
 
 
 # ------------------------
@@ -74,10 +90,14 @@ def _discretize(lo: float, hi: float, step: float,
     return [float(round(v, 6)) for v in arr]
 
 
-def _to_datetimes(ore_min: float,
-                  ore_max: float,
-                  dt_ispezione: datetime) -> Tuple[Optional[datetime], Optional[datetime]]:
-
+def ore_to_datetimes(ore_min: float,
+                     ore_max: float,
+                     dt_ispezione: datetime) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Converte un intervallo in ore prima dell'ispezione negli orari del decesso
+    (dt_min, dt_max), arrotondati al quarto d'ora. Un estremo infinito o
+    ≥ INF_HOURS dà None.
+    """
     def _is_inf(h: Optional[float]) -> bool:
         return (h is None) or (not math.isfinite(h)) or (h >= INF_HOURS - 1e-9)
 
@@ -97,9 +117,10 @@ def _default_solver(Ta: float, CF: float, peso_kg: float, **kwargs) -> Tuple[flo
     Tr = kwargs.get("Tr")
     T0 = kwargs.get("T0")
     round_minutes = kwargs.get("round_minutes", 30)
+    metodo = kwargs.get("metodo", METODO_BISEZIONE)
 
     t_med_round, t_min, t_max, t_med_raw, Qd = calcola_raffreddamento(
-        Tr, Ta, T0, peso_kg, CF, round_minutes=round_minutes
+        Tr, Ta, T0, peso_kg, CF, round_minutes=round_minutes, metodo=metodo
     )
 
     ore_min = float(t_min)
@@ -108,9 +129,170 @@ def _default_solver(Ta: float, CF: float, peso_kg: float, **kwargs) -> Tuple[flo
     return ore_min, ore_max, qd
 
 
+def _default_batch_solver(Ta: np.ndarray, CF: np.ndarray, peso_kg: np.ndarray,
+                          **kwargs) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Equivalente vettoriale di `_default_solver` su array di combinazioni.
+    Ritorna (ore_min, ore_max, Qd) come array; NaN per le combinazioni non calcolabili.
+    """
+    _, t_min, t_max, _, Qd = calcola_raffreddamento_batch(
+        kwargs.get("Tr"), Ta, kwargs.get("T0"), peso_kg, CF,
+        round_minutes=kwargs.get("round_minutes", 30),
+        metodo=kwargs.get("metodo", METODO_BISEZIONE),
+    )
+    return t_min, t_max, Qd
+
+
+def _valuta_combinazioni(
+    Ta_vals: List[float], CF_vals: List[float], P_vals: List[float],
+    solver: Callable[..., Tuple[float, float, Optional[float]]],
+    solver_kwargs: Dict[str, Any],
+    *,
+    vettoriale: bool = True,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Valuta il prodotto cartesiano (Ta, CF, peso) e normalizza i range.
+    Ritorna (Ta, CF, peso, ore_min, ore_max, Qd) come array piatti.
+    Con vettoriale=False anche il solver di default è chiamato punto per punto:
+    per pochi punti (i vertici) la versione scalare in cache costa meno delle
+    BISECT_ITER iterazioni della bisezione vettoriale.
+    """
+    if solver is _default_solver and vettoriale:
+        # Griglia completa risolta in un'unica chiamata vettoriale
+        TA, CFg, PG = np.meshgrid(
+            np.asarray(Ta_vals, dtype=float),
+            np.asarray(CF_vals, dtype=float),
+            np.asarray(P_vals, dtype=float),
+            indexing="ij",  # stesso ordine di itertools.product(Ta, CF, P)
+        )
+        TA, CFg, PG = TA.ravel(), CFg.ravel(), PG.ravel()
+        ore_mins, ore_maxs, qds = _default_batch_solver(Ta=TA, CF=CFg, peso_kg=PG, **solver_kwargs)
+    else:
+        TA, CFg, PG = (np.asarray(v, dtype=float) for v in zip(*itertools.product(Ta_vals, CF_vals, P_vals)))
+        out = [solver(Ta=Ta, CF=CF, peso_kg=P, **solver_kwargs) for Ta, CF, P in zip(TA, CFg, PG)]
+        ore_mins = np.array([o[0] for o in out], dtype=float)
+        ore_maxs = np.array([o[1] for o in out], dtype=float)
+        qds = np.array([np.nan if o[2] is None else o[2] for o in out], dtype=float)
+
+    # Normalizzazione
+    ore_mins = np.where(ore_mins < 0, 0.0, ore_mins)
+    ore_maxs = np.where(ore_maxs < ore_mins, ore_mins, ore_maxs)
+    return TA, CFg, PG, ore_mins, ore_maxs, qds
+
+
+def _angoli(vals: List[float]) -> List[float]:
+    return [vals[0]] if len(vals) == 1 or vals[0] == vals[-1] else [vals[0], vals[-1]]
+
+
+def _qd_forma_chiusa(Tr: Optional[float], Ta: float, T0: Optional[float]) -> Optional[float]:
+    """Qd = (Tr - Ta) / (T0 - Ta) con le validazioni di `calcola_raffreddamento`; None se non valido."""
+    if Tr is None or T0 is None:
+        return None
+    if Tr <= Ta + 1e-6 or abs(T0 - Ta) < 1e-6:
+        return None
+    qd = (Tr - Ta) / (T0 - Ta)
+    return qd if 0 < qd <= 1 else None
+
+
+def _angoli_ammissibili(Ta_vals: List[float], CF_vals: List[float],
+                        Tr: Optional[float], T0: Optional[float]) -> bool:
+    """
+    Controlli di `_angoli_affidabili` che non richiedono di risolvere Henssge.
+    Qd dipende solo da Tr, Ta e T0 ed è monotono in Ta (se T0 è fuori dal range
+    di Ta): Qd valido e nella stessa banda Dt ai due estremi di Ta lo è su
+    tutta la griglia. Se falso si passa subito alla griglia completa.
+    """
+    if Ta_vals[0] <= 23 < Ta_vals[-1]:
+        return False  # salto di A
+    if T0 is not None and Ta_vals[0] <= T0 <= Ta_vals[-1]:
+        return False  # polo di Qd nel range
+    qds = [_qd_forma_chiusa(Tr, Ta, T0) for Ta in (Ta_vals[0], Ta_vals[-1])]
+    if any(qd is None for qd in qds):
+        return False  # bordo del dominio valido all'interno del range
+    bande = np.searchsorted(QD_SOGLIE_DT, qds, side="left")
+    if bande[0] != bande[1]:
+        return False  # soglia di Qd attraversata: Dt non monotono
+    if bande[0] in (1, 2) and len(CF_vals) > 1 and any(cf == 1 for cf in CF_vals):
+        return False  # Dt ridotto solo per CF == 1
+    return True
+
+
+def _angoli_affidabili(Ta_vals: List[float], CF_vals: List[float],
+                       ore_mins: np.ndarray, ore_maxs: np.ndarray, qds: np.ndarray) -> bool:
+    """
+    True se gli estremi sui vertici coincidono con quelli della griglia completa.
+    t di Henssge cresce con Ta, CF e peso; t_min/t_max restano monotoni finché
+    tutte le combinazioni stanno nella stessa banda Dt, con lo stesso A
+    (Ta ≤ 23 oppure > 23) e senza il caso speciale CF == 1 interno al range.
+    """
+    if np.isnan(ore_mins).any() or np.isnan(ore_maxs).any() or not np.isfinite(qds).all():
+        return False  # bordo del dominio valido all'interno del range
+    if Ta_vals[0] <= 23 < Ta_vals[-1]:
+        return False  # salto di A
+    bande = np.searchsorted(QD_SOGLIE_DT, qds, side="left")
+    if bande.min() != bande.max():
+        return False  # soglia di Qd attraversata: Dt non monotono
+    if bande[0] in (1, 2) and len(CF_vals) > 1 and any(cf == 1 for cf in CF_vals):
+        return False  # Dt ridotto solo per CF == 1
+    return True
+
+
+def _aggrega(ore_mins: np.ndarray, ore_maxs: np.ndarray, qds: np.ndarray
+             ) -> Tuple[float, float, Optional[float], Optional[float]]:
+    """Riduzioni su array: le combinazioni non calcolabili (NaN) sono ignorate."""
+    if ore_mins.size == 0:
+        return float("inf"), float("inf"), None, None
+    ok_min = ~np.isnan(ore_mins)
+    ok_max = ~np.isnan(ore_maxs)
+    agg_min = float(ore_mins[ok_min].min()) if ok_min.any() else float("nan")
+    agg_max = float(ore_maxs[ok_max].max()) if ok_max.any() else float("nan")
+    qd_ok = qds[np.isfinite(qds)]
+    qd_min = float(qd_ok.min()) if qd_ok.size else None
+    qd_max = float(qd_ok.max()) if qd_ok.size else None
+    return agg_min, agg_max, qd_min, qd_max
+
+
+# Parametri della tabella di sensibilità: (chiave, etichetta, passo di riferimento, unità del passo)
+PARAMETRI_SENSIBILITA = (
+    ("Ta", "Temperatura ambientale", 1.0, "1 °C"),
+    ("CF", "Fattore di correzione", 0.1, "0,1"),
+    ("W", "Peso corporeo", 1.0, "1 kg"),
+    ("Tr", "Temperatura rettale", 0.1, "0,1 °C"),
+    ("T0", "Temperatura al decesso", 0.1, "0,1 °C"),
+)
+
+def righe_sensibilita(
+    Tr: float, Ta: float, T0: float, W: float, CF: float,
+    ampiezze: Dict[str, float], *, metodo: str = METODO_BISEZIONE,
+) -> List[Dict[str, Any]]:
+    """
+    Derivate analitiche di t e variazione di t attesa sull'ampiezza di ciascun
+    range (|dt/dx|·ampiezza, 0 se il parametro è fisso). Costa una sola
+    risoluzione (scalare, in cache); lista vuota se la stima non è calcolabile.
+    """
+    t_med_raw = calcola_raffreddamento(Tr, Ta, T0, W, CF, metodo=metodo)[3]
+    if not np.isfinite(t_med_raw):
+        return []
+    sens = sensibilita_henssge(Tr, Ta, T0, W, CF, t_med_raw=t_med_raw)
+    righe = []
+    for chiave, etichetta, passo, unita in PARAMETRI_SENSIBILITA:
+        derivata = float(getattr(sens, f"dt_d{chiave}"))
+        ampiezza = float(ampiezze.get(chiave, 0.0))
+        righe.append({
+            "parametro": etichetta,
+            "dt_dx": derivata,
+            "ore_per_passo": derivata * passo,
+            "passo": unita,
+            "ampiezza_range": ampiezza,
+            "effetto_ore": abs(derivata) * ampiezza,
+        })
+    return righe
+
+
 # ------------------------
 # Core
 # ------------------------
+@cronometra(FASE_CAUTELATIVA)
 def compute_raffreddamento_cautelativo(
     *,
     dt_ispezione: datetime,
@@ -130,13 +312,26 @@ def compute_raffreddamento_cautelativo(
     # Solver
     solver: Callable[..., Tuple[float, float, Optional[float]]] = _default_solver,
     solver_kwargs: Optional[Dict[str, Any]] = None,
+    # Strategia
+    strategia: str = STRATEGIA_GRIGLIA,
+    verifica_angoli: bool = True,
     # Opzioni
     mostra_tabella: bool = True,
+    calcola_sensibilita: bool = True,
 ) -> CautelativaResult:
     """
     Esegue il prodotto cartesiano delle combinazioni (Ta, CF, peso) e aggrega il range.
     Se Ta_range/CF_range non sono specificati, usa ±1 °C e ±0.1.
     Se peso_stimato=True, usa ±3 kg. Altrimenti peso fisso.
+    Con il solver di default l'intera griglia è risolta in un'unica chiamata
+    vettoriale; un solver personalizzato viene invece chiamato punto per punto.
+    strategia="angoli" valuta solo i vertici del range; con verifica_angoli=True
+    ricade sulla griglia completa quando la monotonia non è garantita
+    (soglie di Qd o Ta = 23 °C attraversate, CF = 1 nel range, combinazioni non valide).
+    I controlli su Qd precedono la risoluzione dei vertici, che avviene con il
+    solver scalare in cache.
+    Con calcola_sensibilita (e il solver di default) aggiunge le derivate di t
+    rispetto agli input nei valori inseriti e quale range pesa di più.
     """
     solver_kwargs = solver_kwargs or {}
 
@@ -154,48 +349,43 @@ def compute_raffreddamento_cautelativo(
     CF_vals = _discretize(CF_lo, CF_hi, CF_step, max_points_per_dim)
     P_vals = _discretize(p_lo, p_hi, peso_step, max_points_per_dim)
 
-    # 3) Itera combinazioni
-    recs: List[Dict[str, Any]] = []
-    ore_mins: List[float] = []
-    ore_maxs: List[float] = []
-    qds: List[float] = []
-
-    for Ta, CF, P in itertools.product(Ta_vals, CF_vals, P_vals):
-        ore_min, ore_max, qd = solver(Ta=Ta, CF=CF, peso_kg=P, **solver_kwargs)
-
-        # Normalizzazione
-        if ore_min < 0:
-            ore_min = 0.0
-        if ore_max < ore_min:
-            ore_max = ore_min
-
-        ore_mins.append(ore_min)
-        ore_maxs.append(ore_max)
-        if qd is not None and math.isfinite(qd):
-            qds.append(qd)
-
-        if mostra_tabella:
-            recs.append({
-                "Ta": Ta,
-                "CF": CF,
-                "peso_kg": P,
-                "ore_min": ore_min,
-                "ore_max": ore_max,
-                "Qd": qd,
-            })
+    # 3) Valuta le combinazioni
+    if strategia not in STRATEGIE:
+        raise ValueError(f"Strategia sconosciuta: {strategia!r} (attese: {', '.join(STRATEGIE)})")
+    strategia_usata = strategia
+    if strategia == STRATEGIA_ANGOLI:
+        if (verifica_angoli and solver is _default_solver
+                and not _angoli_ammissibili(Ta_vals, CF_vals, solver_kwargs.get("Tr"), solver_kwargs.get("T0"))):
+            strategia_usata = STRATEGIA_GRIGLIA   # Qd in forma chiusa: i vertici non bastano
+        else:
+            TA, CFg, PG, ore_mins, ore_maxs, qds = _valuta_combinazioni(
+                _angoli(Ta_vals), _angoli(CF_vals), _angoli(P_vals), solver, solver_kwargs,
+                vettoriale=False,
+            )
+            if verifica_angoli and not _angoli_affidabili(Ta_vals, CF_vals, ore_mins, ore_maxs, qds):
+                strategia_usata = STRATEGIA_GRIGLIA
+    if strategia_usata == STRATEGIA_GRIGLIA:
+        TA, CFg, PG, ore_mins, ore_maxs, qds = _valuta_combinazioni(
+            Ta_vals, CF_vals, P_vals, solver, solver_kwargs
+        )
 
     # 4) Aggregati
-    agg_min = float(min(ore_mins)) if ore_mins else float("inf")
-    agg_max = float(max(ore_maxs)) if ore_maxs else float("inf")
-
-    qd_min = float(min(qds)) if qds else None
-    qd_max = float(max(qds)) if qds else None
+    agg_min, agg_max, qd_min, qd_max = _aggrega(ore_mins, ore_maxs, qds)
 
     # 5) Datetime range relativo all’ispezione
-    dt_min, dt_max = _to_datetimes(agg_min, agg_max, dt_ispezione)
+    dt_min, dt_max = ore_to_datetimes(agg_min, agg_max, dt_ispezione)
 
     # 6) Tabella combinazioni opzionale
-    df = pd.DataFrame.from_records(recs) if (mostra_tabella and recs) else None
+    df = None
+    if mostra_tabella and TA.size:
+        df = pd.DataFrame({
+            "Ta": TA,
+            "CF": CFg,
+            "peso_kg": PG,
+            "ore_min": ore_mins,
+            "ore_max": ore_maxs,
+            "Qd": np.where(np.isfinite(qds), qds, np.nan),
+        })
 
     # 7) Frasi di riepilogo e parentetica
     summary = build_summary_html(
@@ -211,6 +401,16 @@ def compute_raffreddamento_cautelativo(
     except Exception:
         paren = ""
 
+    # 8) Sensibilità analitica nei valori inseriti
+    sens = []
+    if (calcola_sensibilita and solver is _default_solver
+            and solver_kwargs.get("Tr") is not None and solver_kwargs.get("T0") is not None):
+        sens = righe_sensibilita(
+            solver_kwargs["Tr"], Ta_value, solver_kwargs["T0"], peso_kg, CF_value,
+            {"Ta": Ta_hi - Ta_lo, "CF": CF_hi - CF_lo, "W": p_hi - p_lo},
+            metodo=solver_kwargs.get("metodo", METODO_BISEZIONE),
+        )
+
     return CautelativaResult(
         ore_min=agg_min,
         ore_max=agg_max,
@@ -218,10 +418,13 @@ def compute_raffreddamento_cautelativo(
         dt_max=dt_max if math.isfinite(agg_max) else None,
         qd_min=qd_min,
         qd_max=qd_max,
-        n_combinazioni=len(recs) if recs else (len(Ta_vals)*len(CF_vals)*len(P_vals)),
+        n_combinazioni=int(TA.size),
         df_combinazioni=df,
         summary_html=summary,
         parentetica=paren,
+        strategia=strategia_usata,
+        sensibilita=pd.DataFrame(sens) if (mostra_tabella and sens) else None,
+        sensibilita_html=build_sensibilita_html(sens),
     )
 
 
@@ -277,6 +480,37 @@ def _lbl_ore(x: float) -> str:
     return "ora" if abs(x - 1.0) < 1e-9 else "ore"
 
 
+def _fmt_ore_firmate(x: float) -> str:
+    segno = "+" if x >= 0 else "−"
+    return f"{segno}{abs(x):.2f}".replace(".", ",") + f" {_lbl_ore(abs(x))}"
+
+
+def build_sensibilita_html(righe: List[Dict[str, Any]]) -> str:
+    """Elenco HTML delle sensibilità e del parametro che incide di più sul range."""
+    if not righe:
+        return ""
+    voci = []
+    for r in righe:
+        testo = f"{r['parametro']}: <b>{_fmt_ore_firmate(r['ore_per_passo'])}</b> per {r['passo']}"
+        if r["ampiezza_range"] > 0:
+            testo += f" (sul range considerato: circa {_fmt_ore(r['effetto_ore'])})"
+        voci.append(f"<li>{testo}.</li>")
+
+    principale = ""
+    con_range = [r for r in righe if r["ampiezza_range"] > 0]
+    if con_range:
+        top = max(con_range, key=lambda r: r["effetto_ore"])
+        principale = (
+            "<br>Tra i range considerati, quello che incide maggiormente sull'ampiezza "
+            f"dell'intervallo è: <b>{top['parametro'].lower()}</b>."
+        )
+    return (
+        "Sensibilità della stima di Henssge ai singoli parametri (variazione del tempo "
+        "stimato attorno ai valori inseriti):"
+        f"<ul>{''.join(voci)}</ul>{principale}"
+    )
+
+
 def build_summary_html(
     Ta_lo: float, Ta_hi: float,
     CF_lo: float, CF_hi: float,
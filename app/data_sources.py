@@ -1,7 +1,106 @@
 # app/data_sources.py
+import hashlib
+import json
+import os
+import zipfile
+import numpy as np
 import pandas as pd
 import streamlit as st
 from pathlib import Path
+from typing import Optional
+
+from app.factor_calc import Tabella2Interpolatore, compila_tabella2
+
+# Percorso della Tabella 2 (correzione del fattore per il peso)
+TABELLA2_PATH = Path(__file__).resolve().parent.parent / "data" / "tabella_secondaria.xlsx"
+
+# Cache binaria accanto al workbook: evita openpyxl nei riavvii "caldi"
+CACHE_NPZ_VERSIONE = 1
+
+def _percorso_cache(xlsx_path: Path) -> Path:
+    return xlsx_path.with_suffix(".npz")
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for blocco in iter(lambda: f.read(1 << 16), b""):
+            h.update(blocco)
+    return h.hexdigest()
+
+def _scrivi_cache_npz(df: pd.DataFrame, xlsx_path: Path, sha256: Optional[str] = None) -> None:
+    """Salva la tabella in .npz (scrittura atomica); silenziosa se non possibile."""
+    if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+        return
+    try:
+        valori = df.to_numpy(dtype=float)
+        colonne = [c.item() if isinstance(c, np.generic) else c for c in df.columns]
+        stat = xlsx_path.stat()
+        meta = {
+            "versione": CACHE_NPZ_VERSIONE,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": sha256 or _sha256(xlsx_path),
+            "colonne": colonne,
+        }
+        npz_path = _percorso_cache(xlsx_path)
+        tmp = npz_path.with_name(f".{npz_path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, valori=valori, meta=np.array(json.dumps(meta)))
+        os.replace(tmp, npz_path)
+    except (OSError, TypeError, ValueError):
+        # file system in sola lettura o tabella non numerica: si continua senza cache
+        try:
+            tmp.unlink()
+        except (NameError, OSError):
+            pass
+
+def _leggi_cache_npz(xlsx_path: Path) -> Optional[pd.DataFrame]:
+    """
+    Tabella dalla cache .npz se ancora valida: stessa dimensione e mtime del
+    workbook, oppure stesso sha256 (es. mtime cambiato da un checkout).
+    """
+    npz_path = _percorso_cache(xlsx_path)
+    if not npz_path.exists():
+        return None
+    try:
+        with np.load(npz_path, allow_pickle=False) as z:
+            meta = json.loads(str(z["meta"]))
+            valori = z["valori"]
+        if meta.get("versione") != CACHE_NPZ_VERSIONE:
+            return None
+        stat = xlsx_path.stat()
+        if stat.st_size != meta["size"]:
+            return None
+        df = pd.DataFrame(valori, columns=meta["colonne"])
+        if stat.st_mtime_ns != meta["mtime_ns"]:
+            sha = _sha256(xlsx_path)
+            if sha != meta["sha256"]:
+                return None
+            _scrivi_cache_npz(df, xlsx_path, sha)   # aggiorna l'mtime registrato
+        return df
+    except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+        return None   # cache assente, obsoleta o corrotta: si rilegge il workbook
+
+def leggi_tabella_correzione(xlsx_path: Path = TABELLA2_PATH, *, usa_cache: bool = True) -> Optional[pd.DataFrame]:
+    """
+    Lettura senza Streamlit della tabella correttiva del peso.
+    Ritorna None se il file non esiste; gli errori di lettura
+    (es. 'openpyxl' mancante) sono propagati al chiamante.
+    Con `usa_cache` la tabella è letta da/salvata in un .npz accanto
+    al workbook, rigenerato automaticamente se il workbook cambia.
+    """
+    xlsx_path = Path(xlsx_path)
+    if not xlsx_path.exists():
+        return None
+    if usa_cache:
+        df = _leggi_cache_npz(xlsx_path)
+        if df is not None:
+            return df
+    # usa esplicitamente openpyxl per .xlsx
+    df = pd.read_excel(xlsx_path, engine="openpyxl")
+    if usa_cache:
+        _scrivi_cache_npz(df, xlsx_path)
+    return df
 
 @st.cache_data
 def load_tabelle_correzione():
@@ -10,16 +109,22 @@ def load_tabelle_correzione():
     Richiede 'openpyxl'. Se il file non esiste o non è leggibile,
     ritorna None (l'app continua senza correzione peso).
     """
-    xlsx_path = Path("data/tabella_secondaria.xlsx")  # ← adatta il percorso se diverso
-    if not xlsx_path.exists():
+    if not TABELLA2_PATH.exists():
         st.info("Tabella correttiva del peso non trovata: continuo senza.")
         return None
     try:
-        # usa esplicitamente openpyxl per .xlsx
-        return pd.read_excel(xlsx_path, engine="openpyxl")
+        return leggi_tabella_correzione(TABELLA2_PATH)
     except ImportError:
         st.error("Per leggere il file .xlsx serve 'openpyxl'. Installa con: pip install openpyxl")
         return None
     except Exception as e:
         st.warning(f"Impossibile leggere l'Excel della tabella peso: {e}")
         return None
+
+@st.cache_resource
+def load_tabella2_interpolatore() -> Optional[Tabella2Interpolatore]:
+    """
+    Tabella 2 compilata (vedi `Tabella2Interpolatore`), costruita una sola
+    volta per processo; None se la tabella non è disponibile.
+    """
+    return compila_tabella2(load_tabelle_correzione())
@@ -0,0 +1,816 @@
+# -*- coding: utf-8 -*-
+# app/engine.py — Motore di stima senza Streamlit.
+#
+# `estimate(inputs)` esegue l'intero calcolo (gate Tr−Ta, Henssge standard o
+# cautelativo, minimo di Potente, parametri aggiuntivi traslati, intersezione,
+# discordanze) e restituisce numeri, flag e blocchi di testo in un
+# `EstimateResult`. Nessuna lettura/scrittura di st.session_state e nessun
+# output a video: il rendering è in `app.graphing.aggiorna_grafico`.
+
+from __future__ import annotations
+
+import datetime
+from dataclasses import dataclass, field
+from decimal import Decimal, ROUND_HALF_UP
+from numbers import Real
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.cautelativa import CautelativaResult, compute_raffreddamento_cautelativo, STRATEGIA_ANGOLI
+from app.factor_calc import build_cf_description
+from app.henssge import calcola_raffreddamento, ranges_in_disaccordo_completa, METODO_BISEZIONE
+from app.intervals import da_range, intersezione, profilo_copertura, sottoinsieme_coerente_massimo
+from app.parameters import (
+    INF_HOURS, opzioni_macchie, macchie_medi, testi_macchie,
+    opzioni_rigidita, rigidita_medi, rigidita_descrizioni,
+    dati_parametri_aggiuntivi, nomi_brevi, indice_range_parametri,
+)
+from app.plotting import compute_plot_data, linee_intersezione
+from app.textgen import (
+    build_final_sentence, paragrafo_raffreddamento_dettaglio, paragrafo_potente,
+    paragrafo_raffreddamento_input, paragrafi_descrizioni_base,
+    paragrafi_parametri_aggiuntivi, paragrafo_putrefattive,
+    frase_riepilogo_parametri_usati, avvisi_raffreddamento_henssge,
+    frase_qd, build_simple_sentence, build_final_sentence_simple, build_simple_sentence_no_dt,
+    frase_parametri_concordanti,
+)
+from app.timing import FASE_INTERSEZIONE, FASE_PARAMETRI, cronometra, fase
+from app.utils_time import arrotonda_quarto_dora, round_quarter_hour
+
+
+MSG_DISCORDANTI = "⚠️ Le stime basate sui singoli dati tanatologici sono tra loro discordanti."
+MSG_NESSUN_DATO = "Mancanza di dati utili per la stima"
+
+
+# ------------------------
+# Input / output
+# ------------------------
+@dataclass
+class EstimateInputs:
+    # Dati tanatologici
+    selettore_macchie: str
+    selettore_rigidita: str
+    input_rt: Optional[float]
+    input_ta: Optional[float]
+    input_tm: Optional[float]
+    input_w: Optional[float]
+    fattore_correzione: Optional[float]
+    widgets_parametri_aggiuntivi: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    usa_orario_custom: bool = False
+    input_data_rilievo: Optional[datetime.date] = None
+    input_ora_rilievo: Optional[str] = None
+    alterazioni_putrefattive: bool = False
+    skip_warnings: bool = False
+    # Impostazioni Henssge
+    round_minutes: int = 30
+    metodo: str = METODO_BISEZIONE
+    # Stima cautelativa (range Ta / FC / peso)
+    stima_cautelativa: bool = False
+    Ta_min: Optional[float] = None
+    Ta_max: Optional[float] = None
+    FC_min: Optional[float] = None
+    FC_max: Optional[float] = None
+    fc_suggested_vals: Tuple[float, ...] = ()
+    peso_stimato: bool = False
+    # Descrizione del fattore di correzione (stima standard)
+    cf_descrizione_valore: float = 1.0
+    fc_riassunto_contatori: Optional[Dict[str, Any]] = None
+    fattori_condizioni_testo: Optional[str] = None
+    # Data di riferimento se non c'è un orario di ispezione (default: oggi)
+    oggi: Optional[datetime.date] = None
+
+
+@dataclass
+class EstimateResult:
+    # Errore bloccante sugli input (nessun altro campo è significativo)
+    errore: Optional[str] = None
+    errore_html: bool = False   # True → paragrafo rosso, False → st.error
+
+    data_ora_ispezione: Optional[datetime.datetime] = None
+
+    # Raffreddamento (Henssge standard o cautelativo)
+    raffreddamento_calcolabile: bool = False
+    gate_fail: bool = False
+    t_min_raff_henssge: float = np.nan
+    t_max_raff_henssge: float = np.nan
+    t_med_raff_henssge_rounded: float = np.nan
+    t_med_raff_henssge_rounded_raw: float = np.nan
+    Qd_val_check: float = np.nan
+    qd_threshold: float = 0.5
+    cautelativa: Optional[CautelativaResult] = None
+
+    # Potente
+    mt_ore: Optional[float] = None
+    mt_giorni: Optional[float] = None
+    usa_potente: bool = False
+
+    # Range usati e intersezione
+    parametri_aggiuntivi: List[Dict[str, Any]] = field(default_factory=list)
+    inizio: List[float] = field(default_factory=list)
+    fine: List[float] = field(default_factory=list)
+    nomi_usati: List[str] = field(default_factory=list)
+    comune_inizio: float = np.nan
+    comune_fine: float = np.nan
+    overlap: bool = False
+    discordanti: bool = False
+    # Gruppo più ampio di range con intersezione comune (coincide con tutti se non discordanti)
+    nomi_concordanti: List[str] = field(default_factory=list)
+    nomi_esclusi: List[str] = field(default_factory=list)
+    finestra_concordante: Tuple[float, float] = (np.nan, np.nan)
+    profilo_copertura: List[Tuple[float, float, int]] = field(default_factory=list)  # (da, a, n. range)
+    frase_concordanti: Optional[str] = None
+
+    # Grafico
+    num_params_grafico: int = 0
+    plot_data: Optional[Dict[str, Any]] = None
+    extra_params_for_plot: List[Dict[str, Any]] = field(default_factory=list)
+    tail: float = 72.0
+
+    # Testi
+    frase_breve: Optional[str] = None
+    frase_finale_html: str = ""
+    avvisi: List[str] = field(default_factory=list)
+    desc_dettagliate_html: str = ""
+
+
+# ------------------------
+# Helpers
+# ------------------------
+def _is_num(x):
+    return x is not None and not (isinstance(x, float) and np.isnan(x))
+
+def _wrap_final(s: str | None) -> str | None:
+    return f'<div class="final-text">{s}</div>' if s else s
+
+def _round_half_hour(x: float) -> float:
+    return float(np.round(x * 2.0) / 2.0)
+
+def _finite(x):
+    return isinstance(x, Real) and np.isfinite(x)
+
+def _family(label: str) -> str:
+    return label.lower().split("(")[0].strip()
+
+
+def _range_cautelativo(inp: EstimateInputs, Ta_val: float, CF_val: float):
+    """Range Ta/FC passati al core cautelativo (None → default del core)."""
+    # --- TA range ---
+    Ta_range = None
+    if inp.Ta_min is not None and inp.Ta_max is not None:
+        a, b = float(inp.Ta_min), float(inp.Ta_max)
+        if a > b:
+            a, b = b, a
+        Ta_range = (a, b)
+
+    # --- FC range: priorità al manuale se presente, poi suggerito, poi ±0.10 ---
+    CF_range = None
+    if inp.FC_min is not None and inp.FC_max is not None:
+        a, b = float(inp.FC_min), float(inp.FC_max)
+        if a > b:
+            a, b = b, a
+        CF_range = (max(a, 0.01), max(b, 0.01))
+    else:
+        vals = list(inp.fc_suggested_vals or [])
+        if len(vals) == 2:
+            a, b = sorted([float(vals[0]), float(vals[1])])
+            CF_range = (max(a, 0.01), max(b, 0.01))
+        elif len(vals) == 1:
+            v = float(vals[0])
+            CF_range = (max(v - 0.10, 0.01), max(v + 0.10, 0.01))
+        else:
+            CF_range = None  # il core userà ±0.10 su CF_value
+    return Ta_range, CF_range
+
+
+def _elenco_cautelativo(inp: EstimateInputs, Ta_val: float, CF_val: float, W_val: float) -> str:
+    """Elenco HTML dei range Ta/CF/peso usati nella stima cautelativa."""
+    if inp.Ta_min is not None and inp.Ta_max is not None:
+        ta_lo = float(inp.Ta_min)
+        ta_hi = float(inp.Ta_max)
+    else:
+        ta_lo = float(Ta_val) - 1.0
+        ta_hi = float(Ta_val) + 1.0
+    ta_txt = f"{ta_lo:.1f} – {ta_hi:.1f} °C"
+
+    if inp.FC_min is not None and inp.FC_max is not None:
+        cf_lo = float(inp.FC_min)
+        cf_hi = float(inp.FC_max)
+    else:
+        vals = list(inp.fc_suggested_vals or [])
+        if len(vals) == 2:
+            cf_lo, cf_hi = sorted([float(vals[0]), float(vals[1])])
+        elif len(vals) == 1:
+            v = float(vals[0])
+            cf_lo, cf_hi = v - 0.10, v + 0.10
+        else:
+            v = float(CF_val)
+            cf_lo, cf_hi = v - 0.10, v + 0.10
+    cf_lo = max(cf_lo, 0.01)
+    cf_hi = max(cf_hi, 0.01)
+    cf_txt = f"{cf_lo:.2f} – {cf_hi:.2f}"
+
+    p_txt = (
+        f"{max(W_val - 3, 1):.0f}–{(W_val + 3):.0f} kg"
+        if inp.peso_stimato
+        else f"{W_val:.0f} kg"
+    )
+
+    elenco_html = "<ul>"
+    elenco_html += (
+        "<li>Per quanto attiene la valutazione del raffreddamento cadaverico, "
+        "sono stati stimati i parametri di seguito indicati."
+    )
+    elenco_html += "<ul style='list-style-type: circle; margin-left: 20px;'>"
+    elenco_html += (
+        f"<li>Range di temperature ambientali medie (tenendo conto delle possibili escursioni termiche verificatesi tra decesso e ispezione legale): <b>{ta_txt}</b>.</li>"
+        f"<li>Range per il fattore di correzione (considerate le possibili condizioni in cui può essersi trovato il corpo): <b>{cf_txt}</b>.</li>"
+        f"<li>Peso corporeo: <b>{p_txt}</b>.</li>"
+    )
+    elenco_html += "</ul></li>"
+    elenco_html += "</ul>"
+    return elenco_html
+
+
+@cronometra(FASE_PARAMETRI)
+def _parametri_aggiuntivi(
+    widgets_parametri_aggiuntivi: Dict[str, Dict[str, Any]],
+    data_ora_ispezione: datetime.datetime,
+    avvisi: List[str],
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """Range dei parametri aggiuntivi traslati all'orario dell'ispezione."""
+    parametri_aggiuntivi_da_considerare: List[Dict[str, Any]] = []
+    nota_globale_range_adattato = False
+
+    for nome_parametro, widgets in widgets_parametri_aggiuntivi.items():
+        stato_selezionato = widgets["selettore"]
+        if stato_selezionato == "Non valutata":
+            continue
+        data_rilievo_param = widgets["data_rilievo"]
+        ora_rilievo_param_str = widgets["ora_rilievo"]
+
+        # orario
+        if not ora_rilievo_param_str or not str(ora_rilievo_param_str).strip():
+            ora_rilievo_time = data_ora_ispezione.time()
+        else:
+            try:
+                ora_rilievo_time = datetime.datetime.strptime(ora_rilievo_param_str, "%H:%M").time()
+            except ValueError:
+                avvisi.append(f"⚠️ {nome_parametro}: escluso perchè ora '{ora_rilievo_param_str}' non valida (usa HH:MM).")
+                continue
+
+        if data_rilievo_param is None:
+            data_rilievo_param = data_ora_ispezione.date()
+
+        chiave_descrizione = (stato_selezionato.split(':')[0].strip()
+                              if nome_parametro == "Eccitabilità elettrica peribuccale"
+                              else stato_selezionato.strip())
+
+        chiave_esatta = indice_range_parametri()[nome_parametro].get(chiave_descrizione)
+
+        range_valori = dati_parametri_aggiuntivi[nome_parametro]["range"].get(chiave_esatta)
+        if range_valori:
+            descrizione = dati_parametri_aggiuntivi[nome_parametro]["descrizioni"].get(
+                chiave_descrizione, f"Descrizione non trovata per '{stato_selezionato}'."
+            )
+            data_ora_param = arrotonda_quarto_dora(datetime.datetime.combine(data_rilievo_param, ora_rilievo_time))
+            diff_h = (data_ora_param - data_ora_ispezione).total_seconds() / 3600.0
+            if range_valori[1] >= INF_HOURS:
+                range_trasl = (range_valori[0] - diff_h, INF_HOURS)
+            else:
+                range_trasl = (range_valori[0] - diff_h, range_valori[1] - diff_h)
+            lo, hi = round_quarter_hour(range_trasl[0]), round_quarter_hour(range_trasl[1])
+            lo = max(0, lo)
+            parametri_aggiuntivi_da_considerare.append(dict(
+                nome=nome_parametro, stato=stato_selezionato,
+                range_traslato=(lo, hi), descrizione=descrizione,
+                differenza_ore=diff_h, adattato=(diff_h != 0)
+            ))
+            diffs = {p["differenza_ore"] for p in parametri_aggiuntivi_da_considerare if p.get("adattato")}
+            nota_globale_range_adattato = len(diffs) == 1
+        else:
+            if dati_parametri_aggiuntivi[nome_parametro]["range"].get(stato_selezionato) is None:
+                descrizione = dati_parametri_aggiuntivi[nome_parametro]["descrizioni"].get(
+                    chiave_descrizione, f"{nome_parametro} ({stato_selezionato}) senza range definito."
+                )
+                parametri_aggiuntivi_da_considerare.append(dict(
+                    nome=nome_parametro, stato=stato_selezionato,
+                    range_traslato=(np.nan, np.nan), descrizione=descrizione
+                ))
+
+    return parametri_aggiuntivi_da_considerare, nota_globale_range_adattato
+
+
+def _discordanti(inizio: List[float], fine: List[float], nomi_usati: List[str], overlap: bool) -> bool:
+    """Discordanza tra i range, tenendo per ogni famiglia il range più stretto."""
+    labeled_pairs = [(s, e, l) for s, e, l in zip(inizio, fine, nomi_usati)
+                     if _finite(s) and (_finite(e) or np.isnan(e))]
+
+    fam_best = {}
+    for s, e, l in labeled_pairs:
+        f = _family(l)
+        cur = fam_best.get(f)
+        if cur is None:
+            fam_best[f] = (s, e, l)
+        else:
+            s0, e0, _ = cur
+            if np.isnan(e0) and _finite(e):
+                fam_best[f] = (s, e, l)
+            elif _finite(e0) and _finite(e) and (e - s) < (e0 - s0):
+                fam_best[f] = (s, e, l)
+
+    compact = list(fam_best.values())
+    if len(compact) >= 2:
+        v_inizio = [s for s, _, _ in compact]
+        v_fine   = [(e if _finite(e) else INF_HOURS) for _, e, _ in compact]
+        return bool((not overlap) or ranges_in_disaccordo_completa(v_inizio, v_fine))
+    return False
+
+
+# ------------------------
+# Stima
+# ------------------------
+def estimate(inp: EstimateInputs) -> EstimateResult:
+    """
+    Calcolo completo della stima dell'epoca del decesso.
+    Funzione pura: a parità di `inp` restituisce lo stesso `EstimateResult`.
+    """
+    res = EstimateResult()
+    avvisi = res.avvisi
+    dettagli: List[str] = []
+
+    # --- anti-duplicati per i paragrafi ---
+    _dettagli_seen: set[str] = set()
+    def _add_det(blocco: str | None):
+        if isinstance(blocco, str):
+            key = blocco.strip()
+            if key and key not in _dettagli_seen:
+                dettagli.append(key)
+                _dettagli_seen.add(key)
+
+    # --- data/ora ispezione ---
+    if inp.usa_orario_custom:
+        if not inp.input_data_rilievo or not inp.input_ora_rilievo:
+            res.errore, res.errore_html = "⚠️ Inserisci data e ora dell'ispezione legale.", True
+            return res
+        try:
+            ora_isp_obj = datetime.datetime.strptime(inp.input_ora_rilievo, "%H:%M")
+        except ValueError:
+            res.errore, res.errore_html = "⚠️ Errore: formato ora ispezione legale non valido. Usa HH:MM.", True
+            return res
+        data_ora_ispezione = arrotonda_quarto_dora(datetime.datetime.combine(inp.input_data_rilievo, ora_isp_obj.time()))
+    else:
+        data_ora_ispezione = datetime.datetime.combine(inp.oggi or datetime.date.today(), datetime.time(0, 0))
+    res.data_ora_ispezione = data_ora_ispezione
+
+    # --- validazioni base (configurabili) ---
+    if not inp.skip_warnings:
+        if inp.input_w is None or inp.input_w <= 0:
+            res.errore = "⚠️ Peso non valido. Inserire un valore > 0 kg."
+            return res
+        if inp.fattore_correzione is None or inp.fattore_correzione <= 0:
+            res.errore = "⚠️ Fattore di correzione non valido. Inserire un valore > 0."
+            return res
+        if any(v is None for v in [inp.input_rt, inp.input_ta, inp.input_tm]):
+            res.errore = "⚠️ Temperature mancanti."
+            return res
+
+    # --- normalizza locali; modalità silenziosa disattiva Henssge se mancano input ---
+    Tr_val, Ta_val, T0_val, W_val, CF_val = inp.input_rt, inp.input_ta, inp.input_tm, inp.input_w, inp.fattore_correzione
+
+    # placeholder valori calcolati
+    t_min_raff_henssge = np.nan
+    t_max_raff_henssge = np.nan
+    t_med_raff_henssge_rounded_raw = np.nan
+    t_med_raff_henssge_rounded = np.nan
+    Qd_val_check = np.nan
+    raffreddamento_calcolabile = True
+
+    if inp.skip_warnings and (
+        W_val is None or W_val <= 0 or any(v is None for v in [Tr_val, Ta_val, T0_val])
+    ):
+        Tr_val = Ta_val = T0_val = W_val = CF_val = np.nan
+        raffreddamento_calcolabile = False
+
+    # Ta di riferimento e soglia Qd (prudente → usa Ta_max)
+    if _is_num(Ta_val):
+        Ta_for_pot = float(inp.Ta_max if inp.Ta_max is not None else Ta_val) \
+                     if inp.stima_cautelativa else float(Ta_val)
+    else:
+        Ta_for_pot = np.nan
+
+    qd_threshold = 0.2 if (_is_num(Ta_for_pot) and Ta_for_pot <= 23) else 0.5
+    # --- Gate fisico: abilita Henssge solo se Tr ≥ Ta (alla 1ª cifra) + 0.10 ---
+    if _is_num(Tr_val) and _is_num(Ta_val):
+        tr_dec = Decimal(str(Tr_val)).quantize(Decimal("0.1"), rounding=ROUND_HALF_UP)
+        ta_dec = Decimal(str(Ta_val)).quantize(Decimal("0.1"), rounding=ROUND_HALF_UP)
+        diff_dec = tr_dec - ta_dec  # differenza arrotondata a 0.1 °C
+        if diff_dec < Decimal("0.1"):
+            raffreddamento_calcolabile = False
+            res.gate_fail = True
+
+    # =========================
+    # Henssge standard / Cautelativa
+    # =========================
+    if inp.stima_cautelativa:
+        if raffreddamento_calcolabile:
+            Ta_range, CF_range = _range_cautelativo(inp, Ta_val, CF_val)
+
+            # --- calcolo cautelativo ---
+            caut = compute_raffreddamento_cautelativo(
+                dt_ispezione=data_ora_ispezione,
+                Ta_value=float(Ta_val),
+                CF_value=float(CF_val),
+                peso_kg=float(W_val),
+                Ta_range=Ta_range,
+                CF_range=CF_range,
+                peso_stimato=bool(inp.peso_stimato),
+                mostra_tabella=False,
+                strategia=STRATEGIA_ANGOLI,  # ricade sulla griglia se la monotonia non è garantita
+                solver_kwargs={
+                    "Tr": float(Tr_val),
+                    "T0": float(T0_val),
+                    "round_minutes": int(inp.round_minutes),
+                    "metodo": inp.metodo,
+                },
+            )
+            res.cautelativa = caut
+
+            # --- mappa output cautelativa ---
+            t_min_raff_henssge = float(caut.ore_min)
+            t_max_raff_henssge = (
+                np.nan if (not np.isfinite(caut.ore_max) or caut.ore_max >= INF_HOURS - 1e-9)
+                else float(caut.ore_max)
+            )
+            _tmed_raw = (
+                t_min_raff_henssge if np.isnan(t_max_raff_henssge)
+                else 0.5 * (t_min_raff_henssge + t_max_raff_henssge)
+            )
+            t_med_raff_henssge_rounded_raw = float(_tmed_raw)
+            t_med_raff_henssge_rounded = round_quarter_hour(_tmed_raw)
+            Qd_val_check = caut.qd_min if (caut.qd_min is not None) else np.nan
+            raffreddamento_calcolabile = True
+
+            _add_det(_elenco_cautelativo(inp, Ta_val, CF_val, W_val))
+            _add_det(caut.sensibilita_html)
+            _add_det(paragrafo_raffreddamento_dettaglio(
+                t_min_visual=t_min_raff_henssge,
+                t_max_visual=t_max_raff_henssge,
+                t_med_round=t_med_raff_henssge_rounded,
+                qd_val=Qd_val_check,
+                ta_val=Ta_val,
+            ))
+    else:
+        if raffreddamento_calcolabile:
+            (
+                t_med_raff_henssge_rounded,
+                t_min_raff_henssge,
+                t_max_raff_henssge,
+                t_med_raff_henssge_rounded_raw,
+                Qd_val_check,
+            ) = calcola_raffreddamento(
+                Tr_val, Ta_val, T0_val, W_val, CF_val,
+                round_minutes=int(inp.round_minutes), metodo=inp.metodo,
+            )
+            raffreddamento_calcolabile = (
+                not np.isnan(t_med_raff_henssge_rounded) and t_med_raff_henssge_rounded >= 0
+            )
+
+    # --- differenza piccola Tr-Ta ---
+    temp_difference_small = (_is_num(Tr_val) and _is_num(Ta_val) and (Tr_val - Ta_val) >= 0 and (Tr_val - Ta_val) < 2.0)
+
+    # --- macchie/rigidità ---
+    macchie_range = opzioni_macchie.get(inp.selettore_macchie)
+    macchie_range_valido = isinstance(macchie_range, tuple)
+    macchie_medi_range = macchie_medi.get(inp.selettore_macchie) if macchie_range_valido else None
+
+    rigidita_range = opzioni_rigidita.get(inp.selettore_rigidita)
+    rigidita_range_valido = isinstance(rigidita_range, tuple)
+    rigidita_medi_range = rigidita_medi.get(inp.selettore_rigidita) if rigidita_range_valido else None
+
+    # --- parametri aggiuntivi ---
+    parametri_aggiuntivi_da_considerare, nota_globale_range_adattato = _parametri_aggiuntivi(
+        inp.widgets_parametri_aggiuntivi, data_ora_ispezione, avvisi
+    )
+
+    # --- range Henssge per grafico ---
+    t_min_raff_visualizzato = t_min_raff_henssge if raffreddamento_calcolabile else np.nan
+    t_max_raff_visualizzato = t_max_raff_henssge if raffreddamento_calcolabile else np.nan
+
+    # --- intersezione ---
+    inizio, fine = res.inizio, res.fine
+    nomi_usati = res.nomi_usati
+
+    def _append_range_safe(rng, label):
+        if isinstance(rng, tuple) and len(rng) == 2:
+            lo, hi = rng
+            if _is_num(lo):
+                inizio.append(lo)
+                fine.append(hi if _is_num(hi) and hi < INF_HOURS else np.nan)
+                nomi_usati.append(label)
+
+    _append_range_safe(macchie_range, "Macchie ipostatiche")
+    _append_range_safe(rigidita_range, "Rigidità cadaverica")
+
+    # Potente minimo
+    mt_ore = None
+    mt_giorni = None
+
+    # Calcola sempre mt_ore quando la TA MEDIA soddisfa ΔT ≥ 0.1
+    if all(_is_num(v) for v in [Tr_val, Ta_val, Ta_for_pot, CF_val, W_val]) \
+       and (Tr_val - Ta_val) >= (0.1 - 1e-9):
+        B = -1.2815 * (CF_val * W_val) ** (-5/8) + 0.0284
+        ln_term = np.log(0.16) if (_is_num(Ta_for_pot) and Ta_for_pot <= 23) else np.log(0.45)
+        mt_ore_raw = ln_term / B
+        mt_ore = _round_half_hour(float(mt_ore_raw))
+        mt_giorni = round(mt_ore / 24.0, 1)
+
+    # Attiva Potente se c'è mt_ore e:
+    # - Qd è disponibile e <= soglia, OPPURE
+    # - Qd non è disponibile (fallback permissivo sui casi di bordo)
+    qd_ok = (_is_num(Qd_val_check) and Qd_val_check <= qd_threshold) or (not _is_num(Qd_val_check))
+    usa_potente = (mt_ore is not None) and (not np.isnan(mt_ore)) and qd_ok
+
+    # Usa Henssge nel grafico solo se Potente NON è presente
+    raff_for_plot = raffreddamento_calcolabile and not usa_potente
+
+    # extra da parametri aggiuntivi
+    for p in parametri_aggiuntivi_da_considerare:
+        lo, hi = p["range_traslato"]
+        if _is_num(lo):
+            inizio.append(lo)
+            fine.append(hi if (_is_num(hi) and hi < INF_HOURS) else np.nan)
+            nomi_usati.append(p["nome"])
+
+    # Henssge/Potente nell’intersezione
+    if raffreddamento_calcolabile:
+        if usa_potente:
+            if mt_ore is not None and not np.isnan(mt_ore):
+                inizio.append(mt_ore)
+                fine.append(np.nan)
+                nomi_usati.append("raffreddamento cadaverico (intervallo minimo secondo Potente et al.)")
+        else:
+            inizio.append(t_min_raff_henssge)
+            fine.append(t_max_raff_henssge if _is_num(t_max_raff_henssge) else np.nan)
+            nomi_usati.append(
+                "raffreddamento cadaverico (cautelativo: limite superiore aperto)"
+                if np.isnan(t_max_raff_henssge) else
+                "raffreddamento cadaverico"
+            )
+
+    # intersezione finale (limite superiore mancante o ≥ INF_HOURS = aperto)
+    with fase(FASE_INTERSEZIONE):
+        finestra = intersezione(da_range(s, e, INF_HOURS) for s, e in zip(inizio, fine))
+        if finestra is None or not finestra.limitato_sotto:
+            comune_inizio, comune_fine, overlap = np.nan, np.nan, False
+        else:
+            comune_inizio = finestra.inizio
+            comune_fine = finestra.fine if finestra.limitato_sopra else np.nan
+            overlap = not finestra.vuoto
+
+    # --- extra per grafico ---
+    extra_params_for_plot = res.extra_params_for_plot
+    for idx, p in enumerate(parametri_aggiuntivi_da_considerare):
+        lo, hi = p["range_traslato"]
+        if _is_num(lo):
+            label = nomi_brevi.get(p["nome"], p["nome"])
+            if p.get("adattato"):
+                label += "*"
+            extra_params_for_plot.append({
+                "label": label,
+                "start": float(lo),
+                "end": float(hi) if _is_num(hi) else np.inf,
+                "order": idx,
+                "adattato": bool(p.get("adattato", False)),
+            })
+
+    # --- Potente come "extra" per il grafico (nasconde la barra Henssge) ---
+    if usa_potente and _is_num(mt_ore):
+        extra_params_for_plot.insert(0, {
+            "label": "Raffreddamento",
+            "start": float(mt_ore),
+            "end": np.inf,
+            "order": -1,
+            "adattato": False,
+            "is_potente": True,
+        })
+
+    # --- grafico ---
+    num_params_grafico = 0
+    if macchie_range_valido: num_params_grafico += 1
+    if rigidita_range_valido: num_params_grafico += 1
+    if raff_for_plot: num_params_grafico += 1
+    num_params_grafico += len(extra_params_for_plot)
+
+    if num_params_grafico > 0:
+        plot_data = compute_plot_data(
+            macchie_range=macchie_range if macchie_range_valido else (np.nan, np.nan),
+            macchie_medi_range=macchie_medi_range if macchie_range_valido else None,
+            rigidita_range=rigidita_range if rigidita_range_valido else (np.nan, np.nan),
+            rigidita_medi_range=rigidita_medi_range if rigidita_range_valido else None,
+            raffreddamento_calcolabile=raff_for_plot,   # <-- usa raff_for_plot
+            t_min_raff_henssge=t_min_raff_henssge if raff_for_plot else np.nan,
+            t_max_raff_henssge=t_max_raff_henssge if raff_for_plot else np.nan,
+            t_med_raff_henssge_rounded_raw=t_med_raff_henssge_rounded_raw if raff_for_plot else np.nan,
+            Qd_val_check=Qd_val_check if raff_for_plot else np.nan,
+            mt_ore=mt_ore,
+            INF_HOURS=INF_HOURS,
+            qd_threshold=qd_threshold,
+            extra_params=extra_params_for_plot,
+        )
+        plot_data["extra_params"] = extra_params_for_plot
+        tail = plot_data.get("tail_end", 72.0)
+
+        for e in extra_params_for_plot:
+            if (not np.isfinite(e["end"])) or (e["end"] > tail):
+                e["end"] = tail
+
+        # le linee dell'intersezione fanno parte dei dati del grafico (chiave della cache immagini)
+        plot_data["linee_intersezione"] = linee_intersezione(comune_inizio, comune_fine, overlap, tail)
+        res.plot_data = plot_data
+        res.tail = tail
+
+        # frase breve (sotto il grafico)
+        if overlap:
+            if inp.usa_orario_custom:
+                res.frase_breve = build_simple_sentence(
+                    comune_inizio=comune_inizio,
+                    comune_fine=comune_fine,
+                    isp_dt=data_ora_ispezione,
+                    inf_hours=INF_HOURS,
+                ) or None
+            else:
+                res.frase_breve = build_simple_sentence_no_dt(
+                    comune_inizio=comune_inizio,
+                    comune_fine=comune_fine,
+                    inf_hours=INF_HOURS,
+                ) or None
+
+    # --- avvisi ---
+    if nota_globale_range_adattato:
+        avvisi.append("Alcuni parametri sono stati rilevati in orari diversi; i range indicati con \"*\" sono stati traslati per renderli confrontabili.")
+
+    missing_or_invalid = (
+        not _is_num(Tr_val) or not _is_num(Ta_val) or not _is_num(T0_val) or
+        not _is_num(W_val) or not _is_num(CF_val) or
+        (_is_num(W_val) and W_val <= 0) or (_is_num(CF_val) and CF_val <= 0)
+    )
+    if not raffreddamento_calcolabile:
+        if missing_or_invalid:
+            avvisi.append("Non è stato possibile applicare il metodo di Henssge per il raffreddamento cadaverico: dati mancanti o non validi.")
+        else:
+            avvisi.append("Non è stato possibile applicare il metodo di Henssge per il raffreddamento cadaverico: dati incoerenti o fuori range")
+
+    frase_finale_html: str = ""
+    if all(_is_num(v) for v in [Tr_val, Ta_val, T0_val, W_val, CF_val]):
+        if Ta_val > 25:
+            avvisi.append("Per temperature ambientali &gt; 25 °C, variazioni del fattore di correzione possono influenzare notevolmente i risultati.")
+        if Ta_val < 18:
+            avvisi.append("Per temperature ambientali &lt; 18 °C, la scelta di un fattore di correzione diverso da 1 potrebbe influenzare notevolmente i risultati.")
+        if temp_difference_small:
+            avvisi.append("Essendo minima la differenza tra temperatura rettale e ambientale, è possibile che il cadavere fosse ormai in equilibrio termico con l'ambiente. La stima ottenuta dal raffreddamento cadaverico va interpretata con attenzione.")
+        if abs(Tr_val - T0_val) <= 1.0:
+            avvisi.append("Considerato che la T rettale è molto simile alla T ante-mortem stimata, è verosimile che il raffreddamento corporeo non fosse ancora iniziato e/o si trovasse nella fase di plateau. In tale fase, la precisione del metodo è ridotta.")
+
+        avvisi.extend(avvisi_raffreddamento_henssge(t_med_round=t_med_raff_henssge_rounded, qd_val=Qd_val_check))
+        if not inp.stima_cautelativa:
+            cf_descr = build_cf_description(
+                cf_value=inp.cf_descrizione_valore,
+                riassunto=inp.fc_riassunto_contatori,
+                fallback_text=inp.fattori_condizioni_testo,
+            )
+            _add_det(paragrafo_raffreddamento_input(
+                isp_dt=data_ora_ispezione if inp.usa_orario_custom else None,
+                ta_val=Ta_val, tr_val=Tr_val, w_val=W_val, t0_val=T0_val, cf_descr=cf_descr
+            ))
+
+        t_min_vis = t_min_raff_visualizzato if np.isfinite(t_min_raff_visualizzato) else np.nan
+        t_max_vis = t_max_raff_visualizzato if np.isfinite(t_max_raff_visualizzato) else np.nan
+        _add_det(paragrafo_raffreddamento_dettaglio(
+            t_min_visual=t_min_vis,
+            t_max_visual=t_max_vis,
+            t_med_round=t_med_raff_henssge_rounded,
+            qd_val=Qd_val_check,
+            ta_val=Ta_val,
+        ))
+
+        _add_det(paragrafo_potente(
+            mt_ore=mt_ore, mt_giorni=mt_giorni, qd_val=Qd_val_check, ta_val=Ta_val, qd_threshold=qd_threshold,
+        ))
+
+        for blocco in paragrafi_descrizioni_base(
+            testo_macchie=testi_macchie.get(inp.selettore_macchie),
+            testo_rigidita=rigidita_descrizioni.get(inp.selettore_rigidita),
+        ):
+            _add_det(blocco)
+        for blocco in paragrafi_parametri_aggiuntivi(parametri=parametri_aggiuntivi_da_considerare):
+            _add_det(blocco)
+        _add_det(paragrafo_putrefattive(inp.alterazioni_putrefattive))
+
+        # --- frase finale complessiva ---
+        if inp.usa_orario_custom:
+            _tmp = build_final_sentence(
+                comune_inizio, comune_fine, data_ora_ispezione,
+                qd_val=Qd_val_check, mt_ore=mt_ore, ta_val=Ta_val, inf_hours=INF_HOURS
+            )
+        else:
+            _tmp = build_final_sentence_simple(
+                comune_inizio=comune_inizio,
+                comune_fine=comune_fine,
+                inf_hours=INF_HOURS,
+            )
+        if isinstance(_tmp, str):
+            frase_finale_html = _tmp
+
+    # --- discordanze ---
+    with fase(FASE_INTERSEZIONE):
+        discordanti = _discordanti(inizio, fine, nomi_usati, overlap)
+
+        # gruppo più ampio di range concordanti e profondità di copertura nel tempo
+        intervalli = [da_range(s, e, INF_HOURS) for s, e in zip(inizio, fine)]
+        coerente = sottoinsieme_coerente_massimo(intervalli)
+        profilo = profilo_copertura(intervalli)
+    nomi_concordanti = [nomi_usati[k] for k in coerente.inclusi]
+    nomi_esclusi = [nomi_usati[k] for k in coerente.esclusi]
+    finestra_concordante = coerente.finestra.come_range(INF_HOURS) if coerente.finestra is not None else (np.nan, np.nan)
+    frase_concordanti = None
+    if discordanti:
+        frase_concordanti = frase_parametri_concordanti(
+            nomi_concordanti, nomi_esclusi, *finestra_concordante, inf_hours=INF_HOURS
+        )
+
+    # --- blocchi per il popover delle descrizioni ---
+    chunks = [_wrap_final(blocco) for blocco in dettagli]
+
+    # discordanze o frase finale
+    if discordanti:
+        chunks.append(_wrap_final(f"<ul><li><b>{MSG_DISCORDANTI}</b></li></ul>"))
+        chunks.append(_wrap_final(frase_concordanti))
+    elif overlap and frase_finale_html:
+        chunks.append(_wrap_final(f"<ul><li>{frase_finale_html}</li></ul>"))
+
+    # riepilogo parametri usati
+    if overlap and len(nomi_usati) > 0:
+        nomi_finali = []
+        for nome in nomi_usati:
+            if ("raffreddamento cadaverico" in nome.lower()
+                and "potente" not in nome.lower()
+                and mt_ore is not None and not np.isnan(mt_ore)
+                and abs(comune_inizio - mt_ore) < 0.25):
+                continue
+            nomi_finali.append(nome)
+        chunks.append(_wrap_final(frase_riepilogo_parametri_usati(nomi_finali)))
+
+    # frase Qd
+    chunks.append(_wrap_final(frase_qd(Qd_val_check, Ta_val)))
+
+    # testi base se raffreddamento non calcolabile
+    if not raffreddamento_calcolabile:
+        no_macchie = str(inp.selettore_macchie).strip() in {"Non valutata", "Non valutate", "/"}
+        no_rigidita = str(inp.selettore_rigidita).strip() in {"Non valutata", "Non valutate", "/"}
+        if not no_macchie or not no_rigidita:
+            for blk in paragrafi_descrizioni_base(
+                testo_macchie=testi_macchie.get(inp.selettore_macchie),
+                testo_rigidita=rigidita_descrizioni.get(inp.selettore_rigidita),
+            ):
+                chunks.append(_wrap_final(blk))
+
+        # testi di eccitabilità anche senza dati di temperatura
+        if parametri_aggiuntivi_da_considerare:
+            for blocco in paragrafi_parametri_aggiuntivi(parametri=parametri_aggiuntivi_da_considerare):
+                chunks.append(_wrap_final(blocco))
+
+    # --- risultato ---
+    res.raffreddamento_calcolabile = bool(raffreddamento_calcolabile)
+    res.t_min_raff_henssge = t_min_raff_henssge
+    res.t_max_raff_henssge = t_max_raff_henssge
+    res.t_med_raff_henssge_rounded = t_med_raff_henssge_rounded
+    res.t_med_raff_henssge_rounded_raw = t_med_raff_henssge_rounded_raw
+    res.Qd_val_check = Qd_val_check
+    res.qd_threshold = qd_threshold
+    res.mt_ore = mt_ore
+    res.mt_giorni = mt_giorni
+    res.usa_potente = bool(usa_potente)
+    res.parametri_aggiuntivi = parametri_aggiuntivi_da_considerare
+    res.comune_inizio = comune_inizio
+    res.comune_fine = comune_fine
+    res.overlap = bool(overlap)
+    res.discordanti = discordanti
+    res.nomi_concordanti = nomi_concordanti
+    res.nomi_esclusi = nomi_esclusi
+    res.finestra_concordante = finestra_concordante
+    res.profilo_copertura = profilo
+    res.frase_concordanti = frase_concordanti
+    res.num_params_grafico = num_params_grafico
+    res.frase_finale_html = frase_finale_html
+    res.desc_dettagliate_html = "\n".join([c for c in chunks if c])
+    return res
+
+
+__all__ = [
+    "EstimateInputs",
+    "EstimateResult",
+    "estimate",
+    "MSG_DISCORDANTI",
+    "MSG_NESSUN_DATO",
+]
@@ -2,16 +2,59 @@
 # factor_calc.py — Logica per il fattore di correzione e la parentetica.
 
 from dataclasses import dataclass
-from typing import Optional, Dict, Any, Literal, Tuple
+from functools import lru_cache
+from typing import Optional, Dict, Any, Literal, Tuple, Union
+import math
+import weakref
 import numpy as np
 import pandas as pd
-from decimal import Decimal, ROUND_FLOOR, InvalidOperation
+
+from app.timing import FASE_FATTORE, cronometra
+
+# --------------------------------
+# Floor a step decimale (aritmetica intera)
+# --------------------------------
+# Il valore è trattato come il decimale della sua rappresentazione più corta
+# (repr), come faceva la versione con Decimal(str(x)): 1.15 -> 1.15, 0.35 -> 0.35.
+# Con scala = 10**cifre decimali di step, floor(x*scala) è corretto confrontando
+# x con i float k/scala (divisione intera correttamente arrotondata), poi si
+# scende al multiplo di step in interi.
+@lru_cache(maxsize=16)
+def _step_scalato(step: float) -> Tuple[int, int]:
+    """(step intero, scala) con step == step_int / scala."""
+    scala = 1
+    for _ in range(16):
+        step_int = round(step * scala)
+        if step_int / scala == step:
+            if step_int <= 0:
+                break
+            return step_int, scala
+        scala *= 10
+    raise ValueError(f"Step non valido: {step!r}")
 
 def floor_to_step(x: float, step: float = 0.05) -> float:
     """Arrotonda sempre per difetto al multiplo più vicino di step (default 0.05)."""
-    d = Decimal(str(x))
-    s = Decimal(str(step))
-    return float((d / s).to_integral_value(rounding=ROUND_FLOOR) * s)
+    x = float(x)
+    if not math.isfinite(x):
+        return x
+    step_int, scala = _step_scalato(step)
+    n = math.floor(x * scala)
+    # x*scala può essere arrotondato al di là di un intero: correzione di ±1
+    if (n + 1) / scala <= x:
+        n += 1
+    elif n / scala > x:
+        n -= 1
+    return (n // step_int) * step_int / scala
+
+def floor_to_step_array(x, step: float = 0.05) -> np.ndarray:
+    """Versione vettoriale di `floor_to_step` (stesso risultato elemento per elemento)."""
+    x = np.asarray(x, dtype=float)
+    step_int, scala = _step_scalato(step)
+    finito = np.isfinite(x)
+    with np.errstate(invalid="ignore"):
+        n = np.floor(np.where(finito, x, 0.0) * scala)
+        n = np.where((n + 1) / scala <= x, n + 1, np.where(n / scala > x, n - 1, n))
+        return np.where(finito, (n // step_int) * step_int / scala, x)
 
 # --------------------------------
 # Datamodel di input/riassunto
@@ -29,6 +72,12 @@ class ComputeResult:
     fattore_finale: float
     riassunto: Dict[str, Any]  # per sessione/parentetica
 
+@dataclass
+class ComputeBatchResult:
+    fattore_base: np.ndarray     # FC prima dell'adattamento al peso
+    fattore_finale: np.ndarray   # adattato al peso e floor a 0,05
+    peso_adattato: np.ndarray    # bool: la Tabella 2 ha modificato il fattore
+
 @dataclass
 class FCContext:
     stato: Literal["Asciutto", "Bagnato", "Immerso"]
@@ -215,101 +264,215 @@ def _parse_peso_header(col: str) -> Optional[float]:
     except ValueError:
         return None
 
-def adatta_per_peso(fattore_base: float, peso: float, tabella2: Optional[pd.DataFrame]) -> float:
+def _clamp_array(x: np.ndarray, lo: float = 0.35, hi: float = 3.0) -> np.ndarray:
+    # stessa semantica di clamp() (anche per NaN: min(hi, nan) → hi)
+    x = np.where(x < hi, x, hi)
+    return np.where(x > lo, x, lo)
+
+def _round2_array(x: np.ndarray) -> np.ndarray:
+    # round(x, 2) di Python è corretto sul valore binario esatto; np.round no:
+    # per avere risultati identici alla versione scalare si usa round() per elemento.
+    return np.fromiter((round(v, 2) for v in x.ravel().tolist()), dtype=float, count=x.size).reshape(x.shape)
+
+
+@dataclass(frozen=True)
+class Tabella2Interpolatore:
     """
-    Doppia interpolazione (righe e pesi).
+    Tabella 2 compilata una volta: pesi delle colonne ordinati, valori a 70 kg
+    ordinati e matrice delle righe nello stesso ordine (array NumPy read-only).
+    Ogni adattamento richiede due `searchsorted` (riga e colonna).
+    """
+    pesi: np.ndarray    # (m,) pesi delle colonne, crescenti
+    v70: np.ndarray     # (n,) valori della colonna ~70 kg, crescenti
+    righe: np.ndarray   # (n, m) valori delle righe valide, ordinate come v70
+
+    @classmethod
+    def da_dataframe(cls, tabella2: Optional[pd.DataFrame]) -> Optional["Tabella2Interpolatore"]:
+        """None se la tabella manca o non ha almeno due colonne peso / righe valide."""
+        if tabella2 is None:
+            return None
+        pesi_col = {col: _parse_peso_header(col) for col in tabella2.columns}
+        pesi_col = {col: w for col, w in pesi_col.items() if w is not None}
+        if len(pesi_col) < 2:
+            return None
+
+        cols_sorted = sorted(pesi_col.items(), key=lambda x: x[1])
+        col_names = [c for c, _ in cols_sorted]
+        col_weights = np.array([w for _, w in cols_sorted], dtype=float)
+
+        col70 = col_names[int(np.argmin(np.abs(col_weights - 70.0)))]
+        v70 = pd.to_numeric(tabella2[col70], errors="coerce")
+        valid_idx = v70.dropna().index
+        if len(valid_idx) == 0:
+            return None
+
+        v70_valid = v70.loc[valid_idx]
+        order = np.argsort(v70_valid.values)
+        idx_sorted = v70_valid.index.values[order]
+        righe = (tabella2.loc[idx_sorted, col_names]
+                 .apply(pd.to_numeric, errors="coerce")
+                 .to_numpy(dtype=float))
+
+        arrays = (col_weights, v70_valid.values[order].astype(float), np.ascontiguousarray(righe))
+        for a in arrays:
+            a.setflags(write=False)
+        return cls(*arrays)
+
+    # --- scalare ---
+    def _valore_riga(self, r: int, pw: float) -> Optional[float]:
+        row_vals, w = self.righe[r], self.pesi
+        if pw <= w[0]:
+            return float(row_vals[0]) if np.isfinite(row_vals[0]) else None
+        if pw >= w[-1]:
+            return float(row_vals[-1]) if np.isfinite(row_vals[-1]) else None
+        hi = int(np.searchsorted(w, pw, side="right"))
+        lo = hi - 1
+        v_lo, v_hi = row_vals[lo], row_vals[hi]
+        if not np.isfinite(v_lo) and np.isfinite(v_hi): return float(v_hi)
+        if not np.isfinite(v_hi) and np.isfinite(v_lo): return float(v_lo)
+        if not (np.isfinite(v_lo) and np.isfinite(v_hi)): return None
+        alpha = (pw - w[lo]) / (w[hi] - w[lo])
+        return float(v_lo + alpha * (v_hi - v_lo))
+
+    def adatta(self, fattore_base: float, peso: float) -> float:
+        """Come `adatta_per_peso` su un singolo (fc_base, peso)."""
+        fb, pw = float(fattore_base), float(peso)
+        if np.isnan(fb) or fb < 1.4 or np.isnan(pw) or abs(pw - 70.0) < 1e-9:
+            return round(clamp(fb), 2)
+
+        v = self.v70
+        if fb <= v[0]:
+            r_low = r_high = 0; t = 0.0
+        elif fb >= v[-1]:
+            r_low = r_high = len(v) - 1; t = 0.0
+        else:
+            pos = int(np.searchsorted(v, fb, side="left"))
+            r_low, r_high = pos - 1, pos
+            denom = (v[pos] - v[pos-1])
+            t = 0.0 if denom == 0 else float((fb - v[pos-1]) / denom)
+
+        val_low = self._valore_riga(r_low, pw)
+        val_high = self._valore_riga(r_high, pw)
+        if val_low is None and val_high is None:
+            return round(clamp(fb), 2)
+        if r_low == r_high or val_high is None:
+            return round(clamp(float(val_low)), 2)
+        if val_low is None:
+            return round(clamp(float(val_high)), 2)
+        return round(clamp(float(val_low + t * (val_high - val_low))), 2)
+
+    # --- vettoriale ---
+    def _valori_righe(self, r: np.ndarray, pw: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        w, R = self.pesi, self.righe
+        hi = np.clip(np.searchsorted(w, pw, side="right"), 1, len(w) - 1)
+        lo = hi - 1
+        v_lo, v_hi = R[r, lo], R[r, hi]
+        ok_lo, ok_hi = np.isfinite(v_lo), np.isfinite(v_hi)
+        with np.errstate(invalid="ignore"):
+            alpha = (pw - w[lo]) / (w[hi] - w[lo])
+            val = np.where(ok_lo & ok_hi, v_lo + alpha * (v_hi - v_lo), np.where(ok_hi, v_hi, v_lo))
+        ok = ok_lo | ok_hi
+        # fuori dall'intervallo dei pesi: colonna estrema
+        for bordo, col in ((pw <= w[0], 0), (pw >= w[-1], -1)):
+            v_b = R[r, col]
+            val = np.where(bordo, v_b, val)
+            ok = np.where(bordo, np.isfinite(v_b), ok)
+        return val, ok
+
+    def adatta_many(self, fattori_base, pesi) -> np.ndarray:
+        """Versione vettoriale di `adatta` (input con broadcasting)."""
+        fb, pw = np.broadcast_arrays(np.asarray(fattori_base, dtype=float), np.asarray(pesi, dtype=float))
+        with np.errstate(invalid="ignore"):
+            attivo = (fb >= 1.4) & ~np.isnan(pw) & ~(np.abs(pw - 70.0) < 1e-9)
+
+        v, n = self.v70, len(self.v70)
+        sotto, sopra = fb <= v[0], fb >= v[-1]
+        pos = np.clip(np.searchsorted(v, fb, side="left"), 1, n - 1) if n > 1 else np.zeros(fb.shape, dtype=int)
+        r_low = np.where(sotto, 0, np.where(sopra, n - 1, pos - 1))
+        r_high = np.where(sotto, 0, np.where(sopra, n - 1, pos))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            denom = v[r_high] - v[r_low]
+            t = np.where(sotto | sopra | (denom == 0), 0.0, (fb - v[r_low]) / denom)
+
+        val_low, ok_low = self._valori_righe(r_low, pw)
+        val_high, ok_high = self._valori_righe(r_high, pw)
+        stessa = r_low == r_high
+        res = np.where(
+            stessa | ~ok_high, val_low,
+            np.where(~ok_low, val_high, val_low + t * (val_high - val_low)),
+        )
+        res = np.where(attivo & (ok_low | ok_high), res, fb)
+        return _round2_array(_clamp_array(res))
+
+
+# Tabelle già compilate, per identità del DataFrame (rimosse con il DataFrame)
+_tabelle_compilate: Dict[int, Optional[Tabella2Interpolatore]] = {}
+
+def compila_tabella2(tabella2: Union[pd.DataFrame, Tabella2Interpolatore, None]) -> Optional[Tabella2Interpolatore]:
+    """Interpolatore compilato per `tabella2` (memorizzato finché il DataFrame esiste)."""
+    if tabella2 is None or isinstance(tabella2, Tabella2Interpolatore):
+        return tabella2
+    key = id(tabella2)
+    if key not in _tabelle_compilate:
+        _tabelle_compilate[key] = Tabella2Interpolatore.da_dataframe(tabella2)
+        weakref.finalize(tabella2, _tabelle_compilate.pop, key, None)
+    return _tabelle_compilate[key]
+
+Tabella2Like = Union[pd.DataFrame, Tabella2Interpolatore]
+
+def adatta_per_peso(fattore_base: float, peso: float, tabella2: Optional[Tabella2Like]) -> float:
+    """
+    Doppia interpolazione (righe e pesi) sulla Tabella 2 compilata.
     Restituisce valore clampato [0.35, 3.0] e arrotondato a 2 decimali.
     Early-exit se fc_base < 1.4 (fuori tabella) o peso≈70.
     """
     # --- guardie veloci ---
     try:
         fb = float(fattore_base)
-        if tabella2 is None or np.isnan(fb) or peso is None:
+        interp = compila_tabella2(tabella2)
+        if interp is None or np.isnan(fb) or peso is None:
             return round(clamp(fb), 2)
         pw = float(peso)
     except Exception:
         return round(clamp(float(fattore_base)), 2)
+    return interp.adatta(fb, pw)
 
-    # fuori campo tabella: NON adattare
-    if fb < 1.4:
-        return round(clamp(fb), 2)
-
-    # nessun adattamento se peso ~ 70 kg
-    if abs(pw - 70.0) < 1e-9:
-        return round(clamp(fb), 2)
-
-    # --- parse colonne peso ---
-    pesi_col = {col: _parse_peso_header(col) for col in tabella2.columns}
-    pesi_col = {col: w for col, w in pesi_col.items() if w is not None}
-    if len(pesi_col) < 2:
-        return round(clamp(fb), 2)
-
-    # ordina per peso crescente
-    cols_sorted = sorted(pesi_col.items(), key=lambda x: x[1])
-    col_names = [c for c, _ in cols_sorted]
-    col_weights = np.array([w for _, w in cols_sorted], dtype=float)
-
-    # colonna ~70 kg
-    ref_idx = int(np.argmin(np.abs(col_weights - 70.0)))
-    col70 = col_names[ref_idx]
-
-    # serie 70 kg numerica
-    v70 = pd.to_numeric(tabella2[col70], errors="coerce")
-    valid_idx = v70.dropna().index
-    if len(valid_idx) == 0:
-        return round(clamp(fb), 2)
-
-    # ordina righe per valore a 70 kg
-    v70_valid = v70.loc[valid_idx]
-    order = np.argsort(v70_valid.values)
-    v_sorted = v70_valid.values[order]
-    idx_sorted = v70_valid.index.values[order]
-
-    # trova r_low, r_high, t
-    if fb <= v_sorted[0]:
-        r_low = r_high = idx_sorted[0]; t = 0.0
-    elif fb >= v_sorted[-1]:
-        r_low = r_high = idx_sorted[-1]; t = 0.0
-    else:
-        pos = int(np.searchsorted(v_sorted, fb, side="left"))
-        r_low, r_high = idx_sorted[pos-1], idx_sorted[pos]
-        denom = (v_sorted[pos] - v_sorted[pos-1])
-        t = 0.0 if denom == 0 else float((fb - v_sorted[pos-1]) / denom)
-
-    # valore alla riga r e al peso 'pw' con interp tra colonne adiacenti
-    def _val_row_at_weight(row_idx) -> Optional[float]:
-        row_vals = pd.to_numeric(tabella2.loc[row_idx, col_names], errors="coerce").values.astype(float)
-        if pw <= col_weights[0]:
-            return row_vals[0] if np.isfinite(row_vals[0]) else None
-        if pw >= col_weights[-1]:
-            return row_vals[-1] if np.isfinite(row_vals[-1]) else None
-        hi = int(np.searchsorted(col_weights, pw, side="right"))
-        lo = hi - 1
-        w_lo, w_hi = col_weights[lo], col_weights[hi]
-        v_lo, v_hi = row_vals[lo], row_vals[hi]
-        if not np.isfinite(v_lo) and np.isfinite(v_hi): return float(v_hi)
-        if not np.isfinite(v_hi) and np.isfinite(v_lo): return float(v_lo)
-        if not (np.isfinite(v_lo) and np.isfinite(v_hi)): return None
-        alpha = (pw - w_lo) / (w_hi - w_lo)
-        return float(v_lo + alpha * (v_hi - v_lo))
-
-    val_low  = _val_row_at_weight(r_low)
-    val_high = _val_row_at_weight(r_high)
-
-    if val_low is None and val_high is None:
-        return round(clamp(fb), 2)
-    if r_low == r_high or val_high is None:
-        return round(clamp(float(val_low)), 2)
-    if val_low is None:
-        return round(clamp(float(val_high)), 2)
-
-    fc_user = float(val_low + t * (val_high - val_low))
-    return round(clamp(fc_user), 2)
+def adatta_per_peso_many(fattori_base, pesi, tabella2: Optional[Tabella2Like]) -> np.ndarray:
+    """Versione vettoriale di `adatta_per_peso` (input con broadcasting)."""
+    fb, pw = np.broadcast_arrays(np.asarray(fattori_base, dtype=float), np.asarray(pesi, dtype=float))
+    interp = compila_tabella2(tabella2)
+    if interp is None:
+        return _round2_array(_clamp_array(fb))
+    return interp.adatta_many(fb, pw)
 
 
 # --------------------------------
 # API principale di calcolo
 # --------------------------------
+def fattore_base_regole(
+    stato: Literal["Asciutto", "Bagnato", "Immerso"],
+    acqua: Optional[Literal["stagnante", "corrente"]],
+    counts: DressCounts,
+    superficie_key: Optional[str],
+    correnti_aria: bool,
+) -> float:
+    """FC prima dell'adattamento al peso, calcolato applicando le regole."""
+    if stato == "Immerso":
+        return clamp(0.50 if (acqua == "stagnante") else 0.35)
+
+    f_vest = fattore_vestiti_coperte(counts)
+    superf_key = superficie_key if stato == "Asciutto" else None
+
+    f_tmp = float(f_vest)
+    if stato == "Asciutto" and superf_key is not None:
+        f_tmp = applica_regole_superficie(f_tmp, superf_key, stato, counts)
+
+    f_corr, _ = applica_correnti(clamp(f_tmp), stato, superf_key, correnti_aria, counts, f_vest)
+    if np.isnan(f_corr):
+        f_corr = 1.0
+    return clamp(float(f_corr))
+
+@cronometra(FASE_FATTORE)
 def compute_factor(
     stato: Literal["Asciutto", "Bagnato", "Immerso"],
     acqua: Optional[Literal["stagnante", "corrente"]],
@@ -317,23 +480,31 @@ def compute_factor(
     superficie_display: Optional[str],
     correnti_aria: bool,
     peso: float,
-    tabella2_df: Optional[pd.DataFrame] = None
+    tabella2_df: Optional[Tabella2Like] = None,
+    *,
+    usa_tabella: bool = True,
 ) -> ComputeResult:
-    # helper locale per il floor a step 0,05
-    from decimal import Decimal, ROUND_FLOOR
-    def _floor_to_step(x: float, step: float = 0.05) -> float:
-        d = Decimal(str(x)); s = Decimal(str(step))
-        return float((d / s).to_integral_value(rounding=ROUND_FLOOR) * s)
+    """
+    FC finale (adattato al peso e floor a 0,05) con riassunto per la sessione.
+    Con usa_tabella il fattore base è letto dalla tabella precalcolata di
+    `app.fc_table` (stesse regole); fuori tabella si applicano le regole.
+    """
+    superf_key = surface_display_to_key(superficie_display) if stato == "Asciutto" else None
+    fatt_base = None
+    if usa_tabella:
+        from app.fc_table import fattore_base_tabellato   # import locale: fc_table dipende da questo modulo
+        fatt_base = fattore_base_tabellato(stato, acqua, counts, superf_key, correnti_aria)
+    if fatt_base is None:
+        fatt_base = fattore_base_regole(stato, acqua, counts, superf_key, correnti_aria)
+
+    # adatta_per_peso mantiene il suo round(..., 2)
+    fatt_finale_raw = adatta_per_peso(fatt_base, peso, tabella2_df)
+    # floor finale a 0,05 (unico arrotondamento aggiuntivo)
+    fatt_finale = floor_to_step(fatt_finale_raw)
+    peso_adattato = (abs(fatt_finale_raw - fatt_base) > 1e-12)
 
     # Caso IMMERSO
     if stato == "Immerso":
-        base = 0.50 if (acqua == "stagnante") else 0.35
-        fatt_base = clamp(base)
-        # adatta_per_peso mantiene il suo round(..., 2)
-        fatt_finale_raw = adatta_per_peso(fatt_base, peso, tabella2_df)
-        # floor finale a 0,05 (unico arrotondamento aggiuntivo)
-        fatt_finale = _floor_to_step(fatt_finale_raw)
-        peso_adattato = (abs(fatt_finale_raw - fatt_base) > 1e-12)
         return ComputeResult(
             fattore_base=fatt_base,
             fattore_finale=fatt_finale,
@@ -348,24 +519,6 @@ def compute_factor(
         )
 
     # Asciutto / Bagnato
-    f_vest = fattore_vestiti_coperte(counts)
-    superf_key = surface_display_to_key(superficie_display) if stato == "Asciutto" else None
-
-    f_tmp = float(f_vest)
-    if stato == "Asciutto" and superf_key is not None:
-        f_tmp = applica_regole_superficie(f_tmp, superf_key, stato, counts)
-
-    f_corr, _ = applica_correnti(clamp(f_tmp), stato, superf_key, correnti_aria, counts, f_vest)
-    if np.isnan(f_corr):
-        f_corr = 1.0
-    f_corr = clamp(float(f_corr))
-
-    # adatta_per_peso mantiene il suo round(..., 2)
-    fatt_finale_raw = adatta_per_peso(f_corr, peso, tabella2_df)
-    # floor finale a 0,05 (unico arrotondamento aggiuntivo)
-    fatt_finale = _floor_to_step(fatt_finale_raw)
-    peso_adattato = (abs(fatt_finale_raw - f_corr) > 1e-12)
-
     riass = {
         "stato": stato,
         "sottili": int(counts.sottili),
@@ -377,7 +530,64 @@ def compute_factor(
         "correnti": ("Correnti d'aria presenti" if correnti_aria else None),
         "peso_adattato": bool(peso_adattato),
     }
-    return ComputeResult(fattore_base=f_corr, fattore_finale=fatt_finale, riassunto=riass)
+    return ComputeResult(fattore_base=fatt_base, fattore_finale=fatt_finale, riassunto=riass)
+
+# Colonne di conteggio accettate da compute_factor_batch (default 0)
+COLONNE_CONTEGGI = ("sottili", "spessi", "coperte_medie", "coperte_pesanti")
+STATI = ("Asciutto", "Bagnato", "Immerso")
+
+def compute_factor_batch(df: pd.DataFrame, tabella2_df: Optional[Tabella2Like] = None) -> ComputeBatchResult:
+    """
+    `compute_factor` su molti scenari (una riga per scenario), senza riassunto.
+    Colonne: 'stato' e 'peso' obbligatorie; 'acqua', conteggi (COLONNE_CONTEGGI),
+    'superficie' (testo del pannello) e 'correnti_aria' facoltative.
+    Il fattore base è letto dalla tabella precalcolata con maschere NumPy;
+    le sole righe fuori tabella (conteggi > 8 o non interi) passano dalle regole.
+    """
+    from app.fc_table import SUPERFICI, tabella_fattori   # import locale: fc_table dipende da questo modulo
+
+    for col in ("stato", "peso"):
+        if col not in df.columns:
+            raise ValueError(f"Colonna obbligatoria mancante: {col!r}")
+    n = len(df)
+
+    def _colonna(nome: str, default: Any) -> pd.Series:
+        return df[nome] if nome in df.columns else pd.Series([default] * n, index=df.index, dtype=object)
+
+    stato = df["stato"].to_numpy(dtype=object)
+    validi = np.isin(stato, STATI)
+    if not validi.all():
+        raise ValueError(f"Stato del corpo non valido: {stato[~validi][0]!r}")
+    immerso, asciutto = stato == "Immerso", stato == "Asciutto"
+
+    stagnante = _colonna("acqua", None).to_numpy(dtype=object) == "stagnante"
+    conteggi = np.vstack([
+        pd.to_numeric(_colonna(c, 0), errors="coerce").fillna(0).to_numpy(dtype=float)
+        for c in COLONNE_CONTEGGI
+    ]) if n else np.zeros((len(COLONNE_CONTEGGI), 0))
+    correnti = _colonna("correnti_aria", False).fillna(False).astype(bool).to_numpy()
+    pesi = pd.to_numeric(df["peso"], errors="coerce").to_numpy(dtype=float)
+
+    # superficie: testo -> chiave -> indice dell'asse della tabella (calcolato sui soli valori distinti)
+    codici, distinti = pd.factorize(_colonna("superficie", None))
+    # codice -1 (superficie assente) -> ultimo elemento, cioè SUPERFICI[0] = None
+    idx_distinti = np.array([SUPERFICI.index(surface_display_to_key(s)) for s in distinti] + [0], dtype=np.intp)
+    superficie = np.where(asciutto, idx_distinti[codici], 0)
+
+    basi = tabella_fattori().fattori_base_many(immerso, asciutto, stagnante, conteggi, superficie, correnti)
+
+    fuori = np.flatnonzero(np.isnan(basi))
+    for i in fuori:
+        key = SUPERFICI[superficie[i]]
+        basi[i] = fattore_base_regole(stato[i], "stagnante" if stagnante[i] else None,
+                                      DressCounts(*conteggi[:, i]), key, bool(correnti[i]))
+
+    raw = adatta_per_peso_many(basi, pesi, tabella2_df)
+    return ComputeBatchResult(
+        fattore_base=basi,
+        fattore_finale=floor_to_step_array(raw),
+        peso_adattato=np.abs(raw - basi) > 1e-12,
+    )
 
 # --------------------------------
 # Ricalcolo/Autosync FC su cambio peso (riuso compute_factor)
@@ -391,7 +601,7 @@ def _counts_from_ctx(counts_like: Optional[Dict[str, Any]]) -> DressCounts:
         coperte_pesanti=int(d.get("coperte_pesanti", 0) or 0),
     )
 
-def recompute_fc_for_weight(ctx: FCContext, peso: float, tabella2_df: Optional[pd.DataFrame]) -> ComputeResult:
+def recompute_fc_for_weight(ctx: FCContext, peso: float, tabella2_df: Optional[Tabella2Like]) -> ComputeResult:
     counts = _counts_from_ctx(ctx.counts)
     return compute_factor(
         stato=ctx.stato,
@@ -408,7 +618,7 @@ def autosync_fc_if_needed(
     peso_precedente: Optional[float],
     peso_nuovo: float,
     ctx: Optional[Dict[str, Any] | FCContext],
-    tabella2_df: Optional[pd.DataFrame],
+    tabella2_df: Optional[Tabella2Like],
     *,
     soglia_fc: float = 1.40
 ) -> Tuple[float, bool]:
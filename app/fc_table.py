@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+# app/fc_table.py — Tabella precalcolata dei fattori di correzione base.
+#
+# Lo spazio degli input esposto dai pannelli è finito (stato, acqua, contatori
+# 0..8 di strati e coperte, superficie, correnti): il fattore base (prima
+# dell'adattamento al peso) è generato una volta per tutte le combinazioni
+# applicando le regole di `app.factor_calc`, e poi letto in O(1).
+#
+# La tabella è versionata con un'impronta del sorgente delle regole: se le
+# regole cambiano, la copia salvata in data/ non è più valida e viene
+# rigenerata al primo uso.
+
+from __future__ import annotations
+
+import hashlib
+import inspect
+import itertools
+import os
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app import factor_calc as fc
+from app.factor_calc import (
+    DressCounts, SURF_COND, SURF_FOGLIS, SURF_FOGLIU, SURF_INDIFF, SURF_ISOL, SURF_MOLTOC, SURF_MOLTOI,
+    Tabella2Like, adatta_per_peso_many, fattore_base_regole, floor_to_step_array,
+)
+
+FC_TABLE_FORMATO = 1
+MAX_STRATI = 8   # limite dei contatori nel pannello (NumberColumn max_value=8)
+N_STRATI = MAX_STRATI + 1
+
+# Asse "superficie" della tabella (None = nessuna superficie indicata)
+SUPERFICI: Tuple[Optional[str], ...] = (
+    None, SURF_INDIFF, SURF_ISOL, SURF_MOLTOI, SURF_COND, SURF_MOLTOC, SURF_FOGLIU, SURF_FOGLIS,
+)
+_INDICE_SUPERFICIE = {k: i for i, k in enumerate(SUPERFICI)}
+ACQUE = ("stagnante", "corrente")
+
+TABELLA_FC_PATH = Path(__file__).resolve().parent.parent / "data" / "fattori_base.npz"
+
+# Funzioni il cui sorgente entra nell'impronta di versione
+_REGOLE = (
+    fc.clamp, fc.is_nudo, fc.fattore_vestiti_coperte, fc.applica_regole_superficie,
+    fc.bagnato_base_senza_correnti, fc.bagnato_con_correnti, fc.applica_correnti,
+    fc.fattore_base_regole,
+)
+
+
+def versione_regole() -> str:
+    """Impronta (sha256 abbreviato) delle regole e del layout della tabella."""
+    h = hashlib.sha256()
+    h.update(f"formato={FC_TABLE_FORMATO};max_strati={MAX_STRATI};superfici={SUPERFICI!r}".encode())
+    for f in _REGOLE:
+        h.update(inspect.getsource(f).encode())
+    return h.hexdigest()[:16]
+
+
+# ------------------------
+# Tabella
+# ------------------------
+@dataclass(frozen=True)
+class TabellaFattori:
+    versione: str
+    asciutto: np.ndarray   # (9, 9, 9, 9, len(SUPERFICI), 2): sottili, spessi, cop. medie, cop. pesanti, superficie, correnti
+    bagnato: np.ndarray    # (9, 9, 9, 9, 2): sottili, spessi, cop. medie, cop. pesanti, correnti
+    immerso: np.ndarray    # (2,): acqua stagnante, corrente
+
+    def fattore_base(
+        self, stato: str, acqua: Optional[str], counts: DressCounts,
+        superficie_key: Optional[str], correnti_aria: bool,
+    ) -> Optional[float]:
+        """Fattore base tabellato; None se la combinazione è fuori tabella."""
+        if stato == "Immerso":
+            return float(self.immerso[0 if acqua == "stagnante" else 1])
+        c = (counts.sottili, counts.spessi, counts.coperte_medie, counts.coperte_pesanti)
+        if not all(isinstance(v, (int, np.integer)) and 0 <= v <= MAX_STRATI for v in c):
+            return None
+        corr = 1 if correnti_aria else 0
+        if stato == "Asciutto":
+            s = _INDICE_SUPERFICIE.get(superficie_key)
+            return None if s is None and superficie_key is not None else float(self.asciutto[c + (s or 0, corr)])
+        if stato == "Bagnato":
+            return float(self.bagnato[c + (corr,)])
+        return None
+
+    def fattori_base_many(
+        self, immerso: np.ndarray, asciutto: np.ndarray, stagnante: np.ndarray,
+        conteggi: np.ndarray, superficie: np.ndarray, correnti: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Versione vettoriale di `fattore_base`: maschere di stato (le righe non
+        immerse né asciutte sono bagnate), conteggi (4, n), indici sull'asse
+        SUPERFICI e correnti. NaN dove la combinazione è fuori tabella.
+        """
+        conteggi = np.asarray(conteggi, dtype=float)
+        in_tabella = np.all((conteggi >= 0) & (conteggi <= MAX_STRATI) & (conteggi == np.floor(conteggi)), axis=0)
+        s, p, cm, cp = np.where(in_tabella, conteggi, 0).astype(np.intp)
+        corr = np.asarray(correnti, dtype=np.intp)
+        return np.select(
+            [immerso, asciutto & in_tabella, ~asciutto & in_tabella],
+            [np.where(stagnante, self.immerso[0], self.immerso[1]),
+             self.asciutto[s, p, cm, cp, superficie, corr],
+             self.bagnato[s, p, cm, cp, corr]],
+            default=np.nan,
+        )
+
+
+def _genera() -> TabellaFattori:
+    asciutto = np.empty((N_STRATI,) * 4 + (len(SUPERFICI), 2), dtype=float)
+    bagnato = np.empty((N_STRATI,) * 4 + (2,), dtype=float)
+    for c in itertools.product(range(N_STRATI), repeat=4):
+        counts = DressCounts(*c)
+        for corr in (0, 1):
+            bagnato[c + (corr,)] = fattore_base_regole("Bagnato", None, counts, None, bool(corr))
+            for s, key in enumerate(SUPERFICI):
+                asciutto[c + (s, corr)] = fattore_base_regole("Asciutto", None, counts, key, bool(corr))
+    immerso = np.array([fattore_base_regole("Immerso", a, DressCounts(), None, False) for a in ACQUE])
+    return TabellaFattori(versione_regole(), asciutto, bagnato, immerso)
+
+def _salva(tab: TabellaFattori, path: Path) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            np.savez(f, versione=np.array(tab.versione), asciutto=tab.asciutto,
+                     bagnato=tab.bagnato, immerso=tab.immerso)
+        os.replace(tmp, path)
+    except OSError:
+        # file system in sola lettura: la tabella resta solo in memoria
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+
+def _carica(path: Path, versione: str) -> Optional[TabellaFattori]:
+    try:
+        with np.load(path, allow_pickle=False) as z:
+            if str(z["versione"]) != versione:
+                return None
+            return TabellaFattori(versione, z["asciutto"], z["bagnato"], z["immerso"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+_genera_lock = threading.Lock()
+
+@lru_cache(maxsize=1)
+def tabella_fattori(path: Path = TABELLA_FC_PATH) -> TabellaFattori:
+    """
+    Tabella dei fattori base (generata pigramente al primo uso).
+    Riusa la copia salvata in `path` se ha la stessa versione delle regole.
+    """
+    versione = versione_regole()
+    # sessioni concorrenti al primo uso: una sola generazione e scrittura su disco
+    with _genera_lock:
+        tab = _carica(path, versione) if path.exists() else None
+        if tab is None:
+            tab = _genera()
+            _salva(tab, path)
+    for a in (tab.asciutto, tab.bagnato, tab.immerso):
+        a.setflags(write=False)
+    return tab
+
+def fattore_base_tabellato(
+    stato: str, acqua: Optional[str], counts: DressCounts,
+    superficie_key: Optional[str], correnti_aria: bool,
+) -> Optional[float]:
+    """Lookup O(1) del fattore base; None se la combinazione è fuori tabella."""
+    return tabella_fattori().fattore_base(stato, acqua, counts, superficie_key, correnti_aria)
+
+
+# ------------------------
+# Adattamento al peso (vettoriale)
+# ------------------------
+def fattori_finali(basi, pesi, tabella2: Optional[Tabella2Like]) -> np.ndarray:
+    """
+    FC finali per molte coppie (fattore base, peso): adattamento Tabella 2
+    e floor a 0,05, come `compute_factor`.
+    """
+    return floor_to_step_array(adatta_per_peso_many(basi, pesi, tabella2))
+
+
+# ------------------------
+# Verifica di coerenza con le regole
+# ------------------------
+def verifica_tabella_fattori(tabella2: Optional[Tabella2Like] = None,
+                             pesi=(4.0, 35.0, 62.5, 70.0, 95.0, 150.0)) -> List[str]:
+    """
+    Confronta la tabella con il motore a regole su tutte le combinazioni
+    (fattore base) e, per una serie di pesi, il fattore finale vettoriale con
+    la catena scalare di `compute_factor` (adatta_per_peso + floor_to_step).
+    Ritorna le discrepanze (lista vuota = coerente).
+    """
+    tab = tabella_fattori()
+    rif = _genera()
+    errori: List[str] = []
+    if tab.versione != versione_regole():
+        errori.append(f"versione {tab.versione} ≠ {versione_regole()}")
+    for nome in ("asciutto", "bagnato", "immerso"):
+        a, b = getattr(tab, nome), getattr(rif, nome)
+        for idx in zip(*np.nonzero(a != b)):
+            errori.append(f"{nome}{tuple(int(i) for i in idx)}: tabella {a[idx]} ≠ regole {b[idx]}")
+
+    basi = np.unique(np.concatenate([tab.asciutto.ravel(), tab.bagnato.ravel(), tab.immerso]))
+    B, P = np.meshgrid(basi, np.asarray(pesi, dtype=float), indexing="ij")
+    vett = fattori_finali(B, P, tabella2)
+    for (i, j), v in np.ndenumerate(vett):
+        base, peso = float(B[i, j]), float(P[i, j])
+        atteso = fc.floor_to_step(fc.adatta_per_peso(base, peso, tabella2))
+        if v != atteso:
+            errori.append(f"peso {peso}, base {base}: vettoriale {v} ≠ scalare {atteso}")
+    return errori
+
+
+__all__ = [
+    "FC_TABLE_FORMATO",
+    "MAX_STRATI",
+    "SUPERFICI",
+    "TabellaFattori",
+    "versione_regole",
+    "tabella_fattori",
+    "fattore_base_tabellato",
+    "fattori_finali",
+    "verifica_tabella_fattori",
+]
@@ -1,11 +1,24 @@
 # app/henssge.py
 from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
 from typing import List, Tuple
+import math
+import threading
+import time
 import numpy as np
-from scipy.optimize import root_scalar
+
+from app.intervals import da_range, esiste_intervallo_isolato
+from app.timing import FASE_HENSSGE, cronometra
 
 INF_HOURS = 200.0  # opzionale
 
+# Metodi di inversione di Qp(t) = Qd
+METODO_BISEZIONE = "bisezione"   # root finder esatto (default)
+METODO_TABELLA = "tabella"       # tabella inversa precalcolata + interpolazione
+METODI_INVERSIONE = (METODO_BISEZIONE, METODO_TABELLA)
+
 def round_to_step_minutes(x: float, step_minutes: int = 15) -> float:
     """Arrotonda 'x' ore allo step in minuti (6, 15, 30...)."""
     if x is None or (isinstance(x, float) and np.isnan(x)):
@@ -17,14 +30,11 @@ def round_quarter_hour(x: float) -> float:
     """Compat: quarto d’ora (15 min)."""
     return round_to_step_minutes(x, 15)
 
-def calcola_raffreddamento(
+def _calcola_raffreddamento_nocache(
     Tr: float, Ta: float, T0: float, W: float, CF: float, *,
-    round_minutes: int = 30   # default 30 min
+    round_minutes: int = 30,
+    metodo: str = METODO_BISEZIONE,
 ) -> Tuple[float, float, float, float, float]:
-    """
-    Ritorna: (t_med, t_min, t_max, t_med_raw, Qd)
-    t_min/max/med sono arrotondati allo step scelto.
-    """
     # Validazioni base
     if Tr is None or Ta is None or T0 is None or W is None or CF is None:
         return np.nan, np.nan, np.nan, np.nan, np.nan
@@ -57,11 +67,17 @@ def calcola_raffreddamento(
         or not (min(qp_at_160, qp_at_0)-eps <= Qd <= max(qp_at_160, qp_at_0)+eps)):
         return np.nan, np.nan, np.nan, np.nan, np.nan
 
-    try:
-        sol = root_scalar(lambda t: Qp(t) - Qd, bracket=[0, 160], method='bisect')
-        t_med_raw = sol.root
-    except Exception:
-        return np.nan, np.nan, np.nan, np.nan, np.nan
+    if metodo == METODO_TABELLA and B < -TAB_B_MIN:
+        t_med_raw = float(_inverti_con_tabella(np.asarray(Qd), np.asarray(A), np.asarray(B)))
+        if not (0.0 <= t_med_raw <= BISECT_T_MAX):
+            return np.nan, np.nan, np.nan, np.nan, np.nan
+    else:
+        try:
+            from scipy.optimize import root_scalar  # import differito: solo se serve una radice
+            sol = root_scalar(lambda t: Qp(t) - Qd, bracket=[0, 160], method='bisect')
+            t_med_raw = sol.root
+        except Exception:
+            return np.nan, np.nan, np.nan, np.nan, np.nan
 
     if Qd <= 0.2:
         Dt_raw = t_med_raw * 0.20
@@ -77,21 +93,360 @@ def calcola_raffreddamento(
 
     return t_med, t_min, t_max, t_med_raw, Qd
 
+# ------------------------
+# Cache LRU dei risultati
+# ------------------------
+CACHE_MAXSIZE_DEFAULT = 4096
+CACHE_DECIMALI = 6   # quantizzazione degli input: 1e-6 °C / kg è sotto ogni precisione utile
+
+@dataclass(frozen=True)
+class HenssgeCacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    maxsize: int
+    solve_time_s: float   # tempo totale speso nei calcoli (miss)
+
+    @property
+    def mean_solve_time_s(self) -> float:
+        return self.solve_time_s / self.misses if self.misses else 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        tot = self.hits + self.misses
+        return self.hits / tot if tot else 0.0
+
+_cache: "OrderedDict[tuple, Tuple[float, float, float, float, float]]" = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_maxsize = CACHE_MAXSIZE_DEFAULT
+_cache_hits = 0
+_cache_misses = 0
+_cache_evictions = 0
+_cache_solve_time = 0.0
+
+def _chiave_cache(Tr, Ta, T0, W, CF, round_minutes, metodo):
+    """Input quantizzati; None se non cacheabili (None / non finiti)."""
+    vals = (Tr, Ta, T0, W, CF)
+    if any(v is None for v in vals):
+        return None
+    try:
+        q = tuple(round(float(v), CACHE_DECIMALI) + 0.0 for v in vals)  # +0.0: -0.0 → 0.0
+    except (TypeError, ValueError):
+        return None
+    if not all(math.isfinite(v) for v in q):
+        return None
+    return q + (int(round_minutes), metodo)
+
+def configura_cache_henssge(maxsize: int = CACHE_MAXSIZE_DEFAULT) -> None:
+    """Imposta la dimensione massima della cache (0 = disattivata)."""
+    global _cache_maxsize, _cache_evictions
+    if maxsize < 0:
+        raise ValueError("maxsize deve essere >= 0")
+    with _cache_lock:
+        _cache_maxsize = int(maxsize)
+        while len(_cache) > _cache_maxsize:
+            _cache.popitem(last=False)
+            _cache_evictions += 1
+
+def svuota_cache_henssge() -> None:
+    """Svuota la cache e azzera le statistiche."""
+    global _cache_hits, _cache_misses, _cache_evictions, _cache_solve_time
+    with _cache_lock:
+        _cache.clear()
+        _cache_hits = _cache_misses = _cache_evictions = 0
+        _cache_solve_time = 0.0
+
+def statistiche_cache_henssge() -> HenssgeCacheStats:
+    """Istantanea coerente delle statistiche della cache."""
+    with _cache_lock:
+        return HenssgeCacheStats(
+            hits=_cache_hits, misses=_cache_misses, evictions=_cache_evictions,
+            size=len(_cache), maxsize=_cache_maxsize, solve_time_s=_cache_solve_time,
+        )
+
+@cronometra(FASE_HENSSGE)
+def calcola_raffreddamento(
+    Tr: float, Ta: float, T0: float, W: float, CF: float, *,
+    round_minutes: int = 30,   # default 30 min
+    metodo: str = METODO_BISEZIONE,
+) -> Tuple[float, float, float, float, float]:
+    """
+    Ritorna: (t_med, t_min, t_max, t_med_raw, Qd)
+    t_min/max/med sono arrotondati allo step scelto.
+    metodo: "bisezione" (esatto) oppure "tabella" (vedi `tabella_inversa_qp`).
+    I risultati sono memorizzati in una cache LRU thread-safe, con chiave sugli
+    input quantizzati a CACHE_DECIMALI cifre (vedi `statistiche_cache_henssge`).
+    """
+    global _cache_hits, _cache_misses, _cache_evictions, _cache_solve_time
+    _check_metodo(metodo)
+
+    key = _chiave_cache(Tr, Ta, T0, W, CF, round_minutes, metodo)
+    if key is None or _cache_maxsize == 0:
+        return _calcola_raffreddamento_nocache(
+            Tr, Ta, T0, W, CF, round_minutes=round_minutes, metodo=metodo
+        )
+
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+            _cache_hits += 1
+            return hit
+
+    # Calcolo fuori dal lock sugli input quantizzati: il risultato dipende
+    # solo dalla chiave, qualunque sia il thread che lo inserisce.
+    t0 = time.perf_counter()
+    res = _calcola_raffreddamento_nocache(*key[:5], round_minutes=round_minutes, metodo=metodo)
+    elapsed = time.perf_counter() - t0
+
+    with _cache_lock:
+        _cache_misses += 1
+        _cache_solve_time += elapsed
+        _cache[key] = res
+        _cache.move_to_end(key)
+        while len(_cache) > _cache_maxsize:
+            _cache.popitem(last=False)
+            _cache_evictions += 1
+    return res
+
+# ------------------------
+# Versione vettoriale (batch)
+# ------------------------
+BISECT_T_MAX = 160.0   # stesso bracket [0, 160] della versione scalare
+BISECT_ITER = 52       # 160 / 2**52 ≈ 3.6e-14 h: oltre la xtol di root_scalar
+
+def _qp_array(t: np.ndarray, A: np.ndarray, B: np.ndarray) -> np.ndarray:
+    """Qp(t) elemento per elemento; NaN dove il valore esplode (come la closure scalare)."""
+    with np.errstate(over="ignore", invalid="ignore"):
+        val = A*np.exp(B*t) + (1 - A)*np.exp((A/(A-1))*B*t)
+    return np.where(np.isinf(val) | (np.abs(val) > 1e10), np.nan, val)
+
+def _round_to_step_array(x: np.ndarray, step_minutes: int) -> np.ndarray:
+    step_hours = step_minutes / 60.0
+    return np.round(x / step_hours) * step_hours
+
+def _check_metodo(metodo: str) -> None:
+    if metodo not in METODI_INVERSIONE:
+        raise ValueError(f"Metodo di inversione sconosciuto: {metodo!r} (attesi: {', '.join(METODI_INVERSIONE)})")
+
+# ------------------------
+# Tabella inversa di Qp
+# ------------------------
+# Con s = -B·t si ha Qp = A·e^(-s) + (1-A)·e^(-A/(A-1)·s): per ciascuno dei due
+# valori di A la relazione Qd -> s è unica e indipendente da CF·W, quindi
+# t(Qd, CF·W) = s(Qd) / (-B). Basta una tabella 1-D per valore di A.
+#
+# Nodi in s geometrici con rapporto TAB_RATIO: l'interpolazione lineare resta
+# tra due nodi adiacenti, quindi |Δs| <= (TAB_RATIO-1)·s e |Δt| <= (TAB_RATIO-1)·t.
+# Con t <= 160 h l'errore massimo garantito è 5e-4·160 h = 0.08 h (4.8 min),
+# sotto il passo di arrotondamento minimo (6 min). Su casi reali l'errore
+# misurato è di ordini di grandezza inferiore (vedi `verifica_tabella_inversa`).
+# Righe con B >= -TAB_B_MIN (CF·W molto grande) passano alla bisezione.
+TAB_S_MIN = 1e-6
+TAB_S_MAX = 60.0
+TAB_RATIO = 1.0 + 5e-4
+TAB_B_MIN = 1e-3
+TAB_MAX_ERR_H = (TAB_RATIO - 1.0) * BISECT_T_MAX
+
+@lru_cache(maxsize=None)
+def tabella_inversa_qp(A: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Tabella (qd, s) per l'inversione di Qp con il coefficiente A dato.
+    Costruita al primo uso e poi riusata; `qd` è crescente (per np.interp).
+    """
+    n = int(np.ceil(np.log(TAB_S_MAX / TAB_S_MIN) / np.log(TAB_RATIO))) + 1
+    s = np.concatenate(([0.0], np.geomspace(TAB_S_MIN, TAB_S_MAX, n)))
+    k = A / (A - 1)
+    qd = A*np.exp(-s) + (1 - A)*np.exp(-k*s)
+    qd, s = qd[::-1].copy(), s[::-1].copy()
+    qd.flags.writeable = False
+    s.flags.writeable = False
+    return qd, s
+
+def _inverti_con_tabella(Qd: np.ndarray, A: np.ndarray, B: np.ndarray) -> np.ndarray:
+    """t tale che Qp(t) = Qd, via tabella; richiede B < 0."""
+    out = np.empty(np.shape(Qd))
+    for a_val in (1.25, 10/9):
+        m = (A == a_val)
+        if np.any(m):
+            qd_tab, s_tab = tabella_inversa_qp(a_val)
+            out[m] = np.interp(Qd[m], qd_tab, s_tab) / (-B[m])
+    return out
+
+def verifica_tabella_inversa(n: int = 100_000, seed: int = 0) -> float:
+    """
+    Confronta la modalità tabella con la bisezione su `n` casi casuali
+    nel dominio valido. Ritorna l'errore massimo |Δt_med_raw| in ore.
+    """
+    rng = np.random.default_rng(seed)
+    Ta = rng.uniform(-10.0, 35.0, n)
+    T0 = rng.uniform(35.0, 40.0, n)
+    Tr = Ta + rng.uniform(0.01, 1.0, n) * (T0 - Ta)
+    W = rng.uniform(3.0, 150.0, n)
+    CF = rng.uniform(0.35, 3.0, n)
+    esatto = calcola_raffreddamento_batch(Tr, Ta, T0, W, CF, metodo=METODO_BISEZIONE)[3]
+    tabella = calcola_raffreddamento_batch(Tr, Ta, T0, W, CF, metodo=METODO_TABELLA)[3]
+    return float(np.nanmax(np.abs(esatto - tabella)))
+
+def semiampiezza_henssge_array(Qd, CF, t_med_raw) -> np.ndarray:
+    """Semiampiezza Dt (h) dell'intervallo al 95% di Henssge, per bande di Qd e CF."""
+    Qd, CF, t_med_raw = (np.asarray(v, dtype=float) for v in (Qd, CF, t_med_raw))
+    return np.where(
+        Qd <= 0.2, t_med_raw * 0.20,
+        np.where(
+            CF == 1,
+            np.where(Qd > 0.5, 2.8, np.where(Qd > 0.3, 3.2, 4.5)),
+            np.where(Qd > 0.5, 2.8, np.where(Qd > 0.3, 4.5, 7.0)),
+        ),
+    )
+
+@cronometra(FASE_HENSSGE)
+def calcola_raffreddamento_batch(
+    Tr, Ta, T0, W, CF, *,
+    round_minutes: int = 30,
+    metodo: str = METODO_BISEZIONE,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Versione vettoriale di `calcola_raffreddamento` su array (broadcast NumPy).
+    Ritorna: (t_med, t_min, t_max, t_med_raw, Qd) come array float;
+    le righe non calcolabili valgono NaN in tutti e cinque gli array.
+    La radice è trovata con una bisezione simultanea su [0, 160] h per tutte le righe
+    oppure, con metodo="tabella", interpolando la tabella inversa di Qp.
+    """
+    _check_metodo(metodo)
+    Tr, Ta, T0, W, CF = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (Tr, Ta, T0, W, CF)))
+    nan = np.full(Tr.shape, np.nan)
+
+    # Validazioni base (stesse soglie della versione scalare)
+    temp_tolerance = 1e-6
+    with np.errstate(divide="ignore", invalid="ignore"):
+        Qd = (Tr - Ta) / (T0 - Ta)
+        cw = CF * W
+        B = -1.2815 * np.where(cw > 0, cw, np.nan)**(-5/8) + 0.0284
+    A = np.where(Ta <= 23, 1.25, 10/9)
+
+    valid = (
+        (Tr > Ta + temp_tolerance)
+        & (np.abs(T0 - Ta) >= temp_tolerance)
+        & (Qd > 0) & (Qd <= 1)
+        & np.isfinite(B)
+    )
+
+    # Bracket: Qp(0) - Qd >= 0 e Qp(160) - Qd <= 0
+    f_lo = _qp_array(np.zeros_like(Qd), A, B) - Qd
+    f_hi = _qp_array(np.full_like(Qd, BISECT_T_MAX), A, B) - Qd
+    valid &= np.isfinite(f_lo) & np.isfinite(f_hi) & (f_lo >= 0) & (f_hi <= 0)
+
+    t_med_raw = np.full(Qd.shape, np.nan)
+    if metodo == METODO_TABELLA:
+        da_tabella = valid & (B < -TAB_B_MIN)
+        if np.any(da_tabella):
+            t_med_raw[da_tabella] = _inverti_con_tabella(Qd[da_tabella], A[da_tabella], B[da_tabella])
+        da_bisezione = valid & ~da_tabella
+    else:
+        da_bisezione = valid
+
+    if np.any(da_bisezione):
+        Qd_b, A_b, B_b = Qd[da_bisezione], A[da_bisezione], B[da_bisezione]
+        lo = np.zeros_like(Qd_b)
+        hi = np.full_like(Qd_b, BISECT_T_MAX)
+        for _ in range(BISECT_ITER):
+            mid = 0.5 * (lo + hi)
+            f_mid = _qp_array(mid, A_b, B_b) - Qd_b
+            go_right = f_mid > 0
+            lo = np.where(go_right, mid, lo)
+            hi = np.where(go_right, hi, mid)
+        t_med_raw[da_bisezione] = 0.5 * (lo + hi)
+
+    # Radici esatte sugli estremi (root_scalar ritorna l'estremo se f=0)
+    t_med_raw = np.where(f_lo == 0, 0.0, t_med_raw)
+    t_med_raw = np.where((f_hi == 0) & (f_lo != 0), BISECT_T_MAX, t_med_raw)
+    t_med_raw = np.where(valid, np.clip(t_med_raw, 0.0, BISECT_T_MAX), np.nan)
+
+    Dt_raw = semiampiezza_henssge_array(Qd, CF, t_med_raw)
+
+    t_med = _round_to_step_array(t_med_raw, round_minutes)
+    t_min = _round_to_step_array(np.maximum(0.0, t_med_raw - Dt_raw), round_minutes)
+    t_max = _round_to_step_array(t_med_raw + Dt_raw, round_minutes)
+
+    Qd = np.where(valid, Qd, nan)
+    return t_med, t_min, t_max, t_med_raw, Qd
+
+# ------------------------
+# Sensibilità analitica
+# ------------------------
+# Con F(t) = Qp(t; A, B) - Qd = 0, per il teorema della funzione implicita
+# dt/dx = -(∂F/∂x) / (∂F/∂t), con ∂Qp/∂t = A·B·(e^(B·t) - e^(A/(A-1)·B·t)).
+# Poiché ∂Qp/∂B = (t/B)·∂Qp/∂t si ha dt/dB = -t/B, da cui CF e peso tramite
+# dB/d(CF·W) = 0.8009375·(CF·W)^(-13/8); Tr, T0 e Ta entrano tramite Qd.
+# A dipende da Ta solo a gradino (23 °C): il salto non è incluso in dt/dTa.
+@dataclass(frozen=True)
+class SensibilitaHenssge:
+    t: np.ndarray       # t_med non arrotondato (h)
+    dt_dTa: np.ndarray  # h / °C
+    dt_dCF: np.ndarray  # h / unità di CF
+    dt_dW: np.ndarray   # h / kg
+    dt_dTr: np.ndarray  # h / °C
+    dt_dT0: np.ndarray  # h / °C
+
+def sensibilita_henssge(
+    Tr, Ta, T0, W, CF, *,
+    t_med_raw=None,
+    metodo: str = METODO_BISEZIONE,
+) -> SensibilitaHenssge:
+    """
+    Derivate parziali del tempo di Henssge rispetto a ogni input (array o scalari).
+    Se `t_med_raw` non è fornito si esegue una sola risoluzione vettoriale.
+    NaN dove la stima non è calcolabile o la derivata non è definita (t = 0).
+    """
+    Tr, Ta, T0, W, CF = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (Tr, Ta, T0, W, CF)))
+    if t_med_raw is None:
+        t_med_raw = calcola_raffreddamento_batch(Tr, Ta, T0, W, CF, metodo=metodo)[3]
+    t = np.broadcast_to(np.asarray(t_med_raw, dtype=float), Tr.shape)
+
+    A = np.where(Ta <= 23, 1.25, 10/9)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        cw = CF * W
+        B = -1.2815 * np.where(cw > 0, cw, np.nan)**(-5/8) + 0.0284
+        dQp_dt = A * B * (np.exp(B * t) - np.exp((A / (A - 1)) * B * t))
+        dQp_dt = np.where((dQp_dt != 0) & np.isfinite(t), dQp_dt, np.nan)
+
+        dt_dB = -t / B
+        dB_dcw = 0.8009375 * cw**(-13/8)   # = 1.2815 · 5/8 · (CF·W)^(-13/8)
+        Qd = (Tr - Ta) / (T0 - Ta)
+        dt_dQd = 1.0 / dQp_dt
+        return SensibilitaHenssge(
+            t=t,
+            dt_dTa=dt_dQd * (Qd - 1.0) / (T0 - Ta),
+            dt_dCF=dt_dB * dB_dcw * W,
+            dt_dW=dt_dB * dB_dcw * CF,
+            dt_dTr=dt_dQd / (T0 - Ta),
+            dt_dT0=-dt_dQd * Qd / (T0 - Ta),
+        )
+
 def ranges_in_disaccordo_completa(r_inizio: List[float], r_fine: List[float]) -> bool:
-    intervalli = []
-    for start, end in zip(r_inizio, r_fine):
-        s = start if not np.isnan(start) else -np.inf
-        e = end if not np.isnan(end) else np.inf
-        intervalli.append((s, e))
-    for i, (s1, e1) in enumerate(intervalli):
-        if not any(i != j and s1 <= e2 and s2 <= e1 for j, (s2, e2) in enumerate(intervalli)):
-            return True
-    return False
+    """Vero se almeno un range non si sovrappone a nessun altro (NaN = limite illimitato)."""
+    return esiste_intervallo_isolato([da_range(s, e) for s, e in zip(r_inizio, r_fine)])
 
 __all__ = [
     "INF_HOURS",
+    "METODO_BISEZIONE",
+    "METODO_TABELLA",
+    "METODI_INVERSIONE",
     "round_quarter_hour",
     "round_to_step_minutes",
     "calcola_raffreddamento",
+    "calcola_raffreddamento_batch",
+    "semiampiezza_henssge_array",
+    "SensibilitaHenssge",
+    "sensibilita_henssge",
+    "CACHE_MAXSIZE_DEFAULT",
+    "HenssgeCacheStats",
+    "configura_cache_henssge",
+    "svuota_cache_henssge",
+    "statistiche_cache_henssge",
+    "tabella_inversa_qp",
+    "verifica_tabella_inversa",
     "ranges_in_disaccordo_completa",
 ]
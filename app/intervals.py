@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+# app/intervals.py — Algebra degli intervalli temporali (ore dal decesso).
+#
+# I range tanatologici sono intervalli sull'asse delle ore; un limite mancante
+# (NaN/None) o non inferiore a INF_HOURS è illimitato (±inf). Intersezione,
+# unione, profondità di copertura e ricerca degli intervalli isolati usano
+# una scansione ordinata degli estremi (sweep-line): O(n log n) invece del
+# confronto a coppie. Nessuna dipendenza da Streamlit o dagli altri moduli app.
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+
+# ------------------------
+# Intervallo
+# ------------------------
+@dataclass(frozen=True)
+class Intervallo:
+    """
+    Intervallo [inizio, fine] (estremi chiusi per default, come i range delle tabelle).
+    Gli estremi infiniti sono sempre aperti. Un intervallo con inizio > fine è vuoto
+    ma conserva gli estremi (serve a riportare la "finestra" di range discordanti).
+    """
+    inizio: float = -math.inf
+    fine: float = math.inf
+    chiuso_inizio: bool = True
+    chiuso_fine: bool = True
+
+    def __post_init__(self):
+        if math.isnan(self.inizio) or math.isnan(self.fine):
+            raise ValueError("Estremi NaN: usare da_range() per i limiti mancanti")
+        if math.isinf(self.inizio):
+            object.__setattr__(self, "chiuso_inizio", False)
+        if math.isinf(self.fine):
+            object.__setattr__(self, "chiuso_fine", False)
+
+    @property
+    def vuoto(self) -> bool:
+        if self.inizio > self.fine:
+            return True
+        return self.inizio == self.fine and not (self.chiuso_inizio and self.chiuso_fine)
+
+    @property
+    def limitato_sotto(self) -> bool:
+        return not math.isinf(self.inizio)
+
+    @property
+    def limitato_sopra(self) -> bool:
+        return not math.isinf(self.fine)
+
+    def contiene(self, x: float) -> bool:
+        if x < self.inizio or x > self.fine:
+            return False
+        if x == self.inizio and not self.chiuso_inizio:
+            return False
+        return not (x == self.fine and not self.chiuso_fine)
+
+    def interseca(self, altro: "Intervallo") -> bool:
+        return not self.intersezione(altro).vuoto
+
+    def intersezione(self, altro: "Intervallo") -> "Intervallo":
+        return _interseca_estremi(_estremi(self), _estremi(altro))
+
+    def come_range(self, inf_hours: float = math.inf) -> Tuple[float, float]:
+        """(inizio, fine) con NaN per i limiti illimitati, come i range del motore di stima."""
+        s = self.inizio if self.limitato_sotto else math.nan
+        e = self.fine if (self.limitato_sopra and self.fine < inf_hours) else math.nan
+        return s, e
+
+
+def _valore_mancante(x: Optional[float]) -> bool:
+    return x is None or (isinstance(x, float) and math.isnan(x))
+
+def da_range(inizio: Optional[float], fine: Optional[float], inf_hours: float = math.inf) -> Intervallo:
+    """Intervallo chiuso da una coppia (inizio, fine) con NaN/None per i limiti mancanti."""
+    s = -math.inf if _valore_mancante(inizio) else float(inizio)
+    e = math.inf if (_valore_mancante(fine) or fine >= inf_hours) else float(fine)
+    return Intervallo(s, e)
+
+def fine_aperta(fine: Optional[float], inf_hours: float = math.inf) -> bool:
+    """Vero se il limite superiore manca (NaN/None) o rappresenta l'infinito (≥ inf_hours)."""
+    return _valore_mancante(fine) or fine >= inf_hours
+
+
+# ------------------------
+# Estremi
+# ------------------------
+# Ordinamento degli estremi a parità di ascissa (sweep-line):
+# fine aperta < inizio chiuso < fine chiusa < inizio aperto.
+# Così (a, x) e [x, b] non si toccano, mentre [a, x] e [x, b] sì.
+_FINE_APERTA, _INIZIO_CHIUSO, _FINE_CHIUSA, _INIZIO_APERTO = 0, 1, 2, 3
+
+def _estremi(iv: Intervallo) -> Tuple[float, bool, float, bool]:
+    return iv.inizio, iv.chiuso_inizio, iv.fine, iv.chiuso_fine
+
+def _interseca_estremi(a: Tuple[float, bool, float, bool], b: Tuple[float, bool, float, bool]) -> Intervallo:
+    # inizio più a destra (a parità, aperto), fine più a sinistra (a parità, aperta)
+    s, cs = max((a[0], not a[1]), (b[0], not b[1]))
+    e, ce = min((a[2], a[3]), (b[2], b[3]))
+    return Intervallo(s, e, not cs, ce)
+
+def _si_toccano(fine: float, chiusa: bool, inizio: float, chiuso: bool) -> bool:
+    """Un intervallo che termina in `fine` ne incontra uno che inizia in `inizio` (≥ del suo inizio)?"""
+    return fine > inizio or (fine == inizio and chiusa and chiuso)
+
+
+# ------------------------
+# Operazioni su n intervalli
+# ------------------------
+def intersezione(intervalli: Iterable[Intervallo]) -> Optional[Intervallo]:
+    """
+    Finestra comune a tutti gli intervalli, O(n); None se non ce ne sono.
+    Se i range sono discordanti la finestra è vuota (inizio > fine) ma ne
+    conserva gli estremi.
+    """
+    risultato: Optional[Intervallo] = None
+    for iv in intervalli:
+        risultato = iv if risultato is None else _interseca_estremi(_estremi(risultato), _estremi(iv))
+    return risultato
+
+def unione(intervalli: Iterable[Intervallo]) -> List[Intervallo]:
+    """Unione come lista ordinata di intervalli disgiunti (O(n log n))."""
+    ordinati = sorted((iv for iv in intervalli if not iv.vuoto), key=lambda iv: (iv.inizio, not iv.chiuso_inizio))
+    fusi: List[Intervallo] = []
+    for iv in ordinati:
+        if fusi:
+            ult = fusi[-1]
+            # si fondono se si sovrappongono o si toccano in un punto incluso da almeno uno dei due
+            if ult.fine > iv.inizio or (ult.fine == iv.inizio and (ult.chiuso_fine or iv.chiuso_inizio)):
+                if (iv.fine, iv.chiuso_fine) > (ult.fine, ult.chiuso_fine):
+                    fusi[-1] = Intervallo(ult.inizio, iv.fine, ult.chiuso_inizio, iv.chiuso_fine)
+                continue
+        fusi.append(iv)
+    return fusi
+
+def _eventi(intervalli: Sequence[Intervallo]) -> List[Tuple[float, int, int]]:
+    eventi = []
+    for iv in intervalli:
+        if iv.vuoto:
+            continue
+        eventi.append((iv.inizio, _INIZIO_CHIUSO if iv.chiuso_inizio else _INIZIO_APERTO, +1))
+        eventi.append((iv.fine, _FINE_CHIUSA if iv.chiuso_fine else _FINE_APERTA, -1))
+    eventi.sort()
+    return eventi
+
+def profilo_copertura(intervalli: Sequence[Intervallo]) -> List[Tuple[float, float, int]]:
+    """
+    Profondità di copertura lungo l'asse: [(da, a, quanti intervalli coprono (da, a))],
+    tratti consecutivi con profondità diversa, ±inf inclusi. Gli estremi puntuali
+    (es. due range che si toccano) sono considerati da `profondita_massima`.
+    """
+    profilo: List[Tuple[float, float, int]] = []
+    prof, x_prec = 0, -math.inf
+    eventi = _eventi(intervalli)
+    i = 0
+    while i < len(eventi):
+        x = eventi[i][0]
+        if x > x_prec:
+            if profilo and profilo[-1][2] == prof and profilo[-1][1] == x_prec:
+                profilo[-1] = (profilo[-1][0], x, prof)
+            else:
+                profilo.append((x_prec, x, prof))
+        while i < len(eventi) and eventi[i][0] == x:
+            prof += eventi[i][2]
+            i += 1
+        x_prec = x
+    if x_prec < math.inf:
+        if profilo and profilo[-1][2] == prof and profilo[-1][1] == x_prec:
+            profilo[-1] = (profilo[-1][0], math.inf, prof)
+        else:
+            profilo.append((x_prec, math.inf, prof))
+    return profilo
+
+def profondita_massima(intervalli: Sequence[Intervallo]) -> Tuple[int, Optional[Intervallo]]:
+    """
+    Massimo numero di intervalli che si sovrappongono e il primo tratto (o punto)
+    in cui è raggiunto; (0, None) se non ci sono intervalli non vuoti.
+    """
+    migliore, dove = 0, None
+    prof = 0
+    eventi = _eventi(intervalli)
+    i = 0
+    while i < len(eventi):
+        x = eventi[i][0]
+        # punto x: fine aperte e inizi chiusi già applicati
+        while i < len(eventi) and eventi[i][0] == x and eventi[i][1] <= _INIZIO_CHIUSO:
+            prof += eventi[i][2]
+            i += 1
+        if prof > migliore:
+            migliore, dove = prof, Intervallo(x, x)
+        while i < len(eventi) and eventi[i][0] == x:
+            prof += eventi[i][2]
+            i += 1
+        # tratto aperto (x, x successivo)
+        x_succ = eventi[i][0] if i < len(eventi) else math.inf
+        if prof > migliore:
+            migliore, dove = prof, Intervallo(x, x_succ, False, False)
+    return migliore, dove
+
+def intervalli_isolati(intervalli: Sequence[Intervallo]) -> List[int]:
+    """
+    Indici (nell'ordine dato) degli intervalli che non ne incontrano nessun altro.
+    Ordinati per inizio, l'intervallo k incontra un precedente se la fine massima
+    dei precedenti lo raggiunge, e un successivo se il primo successivo inizia
+    prima della sua fine: O(n log n).
+    """
+    n = len(intervalli)
+    # gli intervalli vuoti non incontrano nulla: isolati per definizione
+    ordine = sorted((k for k in range(n) if not intervalli[k].vuoto),
+                    key=lambda k: (intervalli[k].inizio, not intervalli[k].chiuso_inizio))
+    isolati = [k for k in range(n) if intervalli[k].vuoto]
+    fine_max: Optional[Tuple[float, bool]] = None
+    for pos, k in enumerate(ordine):
+        iv = intervalli[k]
+        tocca = fine_max is not None and _si_toccano(fine_max[0], fine_max[1], iv.inizio, iv.chiuso_inizio)
+        if not tocca and pos + 1 < len(ordine):
+            succ = intervalli[ordine[pos + 1]]
+            tocca = _si_toccano(iv.fine, iv.chiuso_fine, succ.inizio, succ.chiuso_inizio)
+        if fine_max is None or (iv.fine, iv.chiuso_fine) > fine_max:
+            fine_max = (iv.fine, iv.chiuso_fine)
+        if not tocca:
+            isolati.append(k)
+    return sorted(isolati)
+
+def esiste_intervallo_isolato(intervalli: Sequence[Intervallo]) -> bool:
+    """Vero se almeno un intervallo non si sovrappone a nessun altro (range discordanti)."""
+    return bool(intervalli_isolati(intervalli))
+
+
+# ------------------------
+# Sottoinsieme coerente massimo
+# ------------------------
+@dataclass(frozen=True)
+class SottoinsiemeCoerente:
+    inclusi: Tuple[int, ...]          # indici degli intervalli con intersezione comune
+    esclusi: Tuple[int, ...]          # indici dei rimanenti
+    finestra: Optional[Intervallo]    # intersezione degli inclusi (None se non ci sono)
+
+    @property
+    def profondita(self) -> int:
+        return len(self.inclusi)
+
+def _punto_interno(iv: Intervallo) -> float:
+    if iv.limitato_sotto and iv.limitato_sopra:
+        return 0.5 * (iv.inizio + iv.fine)
+    if iv.limitato_sotto:
+        return iv.inizio + 1.0
+    if iv.limitato_sopra:
+        return iv.fine - 1.0
+    return 0.0
+
+def sottoinsieme_coerente_massimo(intervalli: Sequence[Intervallo]) -> SottoinsiemeCoerente:
+    """
+    Il più grande sottoinsieme di intervalli con un'intersezione non vuota.
+    Sulla retta, intervalli a due a due sovrapposti hanno un punto comune: il
+    sottoinsieme massimo è quello che copre il punto di profondità massima
+    (sweep-line, O(n log n)). A parità di profondità vale il tratto più precoce.
+    """
+    profondita, dove = profondita_massima(intervalli)
+    if dove is None:
+        return SottoinsiemeCoerente((), tuple(range(len(intervalli))), None)
+    x = _punto_interno(dove)
+    inclusi = tuple(k for k, iv in enumerate(intervalli) if iv.contiene(x))
+    esclusi = tuple(k for k, iv in enumerate(intervalli) if not iv.contiene(x))
+    return SottoinsiemeCoerente(inclusi, esclusi, intersezione(intervalli[k] for k in inclusi))
+
+
+__all__ = [
+    "Intervallo",
+    "da_range",
+    "fine_aperta",
+    "intersezione",
+    "unione",
+    "profilo_copertura",
+    "profondita_massima",
+    "intervalli_isolati",
+    "esiste_intervallo_isolato",
+    "SottoinsiemeCoerente",
+    "sottoinsieme_coerente_massimo",
+]
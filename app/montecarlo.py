@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+# app/montecarlo.py — Propagazione Monte Carlo dell'incertezza (Henssge).
+#
+# In alternativa alla griglia della stima cautelativa (intervalli "rigidi"),
+# Ta, CF, peso, T0 e l'errore di misura della temperatura rettale sono
+# campionati da distribuzioni; ogni estrazione è risolta con il solver
+# vettoriale di app.henssge e si riportano i percentili del tempo dal decesso.
+# Le estrazioni sono riproducibili (seme esplicito).
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from app.henssge import METODO_BISEZIONE, calcola_raffreddamento_batch, semiampiezza_henssge_array
+from app.cautelativa import ore_to_datetimes
+
+# ------------------------
+# Costanti
+# ------------------------
+N_ESTRAZIONI_DEFAULT = 100_000
+SEED_DEFAULT = 20240601
+PERCENTILI_DEFAULT = (2.5, 5.0, 25.0, 50.0, 75.0, 95.0, 97.5)
+T0_DEFAULT = 37.2
+
+# Dt di Henssge è la semiampiezza dell'intervallo al 95%: σ del modello = Dt / 1.96
+Z_95 = 1.959963984540054
+
+# Limiti fisici applicati ai campioni
+CF_MIN, CF_MAX = 0.35, 3.0
+PESO_MIN = 1.0
+
+TIPI_DISTRIBUZIONE = ("costante", "normale", "uniforme", "triangolare")
+
+
+# ------------------------
+# Distribuzioni
+# ------------------------
+@dataclass(frozen=True)
+class Distribuzione:
+    """
+    Distribuzione di un input.
+    - costante:    valore
+    - normale:     media = valore, deviazione standard = sd, troncata a [minimo, massimo] se indicati
+    - uniforme:    [minimo, massimo]
+    - triangolare: [minimo, massimo] con moda = valore
+    """
+    tipo: str
+    valore: float = 0.0
+    sd: float = 0.0
+    minimo: Optional[float] = None
+    massimo: Optional[float] = None
+
+    def __post_init__(self):
+        if self.tipo not in TIPI_DISTRIBUZIONE:
+            raise ValueError(f"Distribuzione sconosciuta: {self.tipo!r}")
+        if self.tipo == "normale" and not self.sd >= 0:
+            raise ValueError("La deviazione standard deve essere ≥ 0")
+        if self.tipo in ("uniforme", "triangolare"):
+            if self.minimo is None or self.massimo is None or self.minimo > self.massimo:
+                raise ValueError(f"Distribuzione {self.tipo}: limiti non validi")
+            if self.tipo == "triangolare" and not (self.minimo <= self.valore <= self.massimo):
+                raise ValueError("Distribuzione triangolare: la moda deve essere tra i limiti")
+
+    def campiona(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        if self.tipo == "costante" or (self.tipo == "normale" and self.sd == 0):
+            return np.full(n, float(self.valore))
+        if self.tipo == "uniforme":
+            return rng.uniform(self.minimo, self.massimo, n)
+        if self.tipo == "triangolare":
+            if self.minimo == self.massimo:
+                return np.full(n, float(self.valore))
+            return rng.triangular(self.minimo, self.valore, self.massimo, n)
+        x = rng.normal(self.valore, self.sd, n)
+        if self.minimo is None and self.massimo is None:
+            return x
+        lo = -np.inf if self.minimo is None else self.minimo
+        hi = np.inf if self.massimo is None else self.massimo
+        # normale troncata: si ri-estraggono i campioni fuori dai limiti (pochi giri bastano)
+        for _ in range(20):
+            fuori = (x < lo) | (x > hi)
+            k = int(fuori.sum())
+            if k == 0:
+                break
+            x[fuori] = rng.normal(self.valore, self.sd, k)
+        return np.clip(x, lo, hi)
+
+def costante(valore: float) -> Distribuzione:
+    return Distribuzione("costante", float(valore))
+
+def normale(media: float, sd: float, minimo: Optional[float] = None, massimo: Optional[float] = None) -> Distribuzione:
+    return Distribuzione("normale", float(media), float(sd), minimo, massimo)
+
+def uniforme(minimo: float, massimo: float) -> Distribuzione:
+    return Distribuzione("uniforme", 0.5 * (minimo + massimo), 0.0, float(minimo), float(massimo))
+
+def triangolare(minimo: float, moda: float, massimo: float) -> Distribuzione:
+    return Distribuzione("triangolare", float(moda), 0.0, float(minimo), float(massimo))
+
+DistribuzioneLike = Union[Distribuzione, float, Tuple[float, float]]
+
+def _come_distribuzione(v: DistribuzioneLike) -> Distribuzione:
+    """Numero -> costante; coppia (min, max) -> uniforme (come i range della stima cautelativa)."""
+    if isinstance(v, Distribuzione):
+        return v
+    if isinstance(v, (tuple, list)):
+        a, b = v
+        return uniforme(min(a, b), max(a, b))
+    return costante(float(v))
+
+
+# ------------------------
+# Risultato
+# ------------------------
+@dataclass
+class MonteCarloResult:
+    n: int                          # estrazioni totali
+    n_validi: int                   # estrazioni risolte (Tr > Ta, Qd in (0, 1], ...)
+    seed: int
+    percentili: Dict[float, float]  # percentile -> ore dal decesso
+    media: float
+    sd: float
+    errore_modello: bool            # se include la dispersione propria di Henssge (±Dt al 95%)
+    campioni: Optional[np.ndarray] = None   # ore (solo estrazioni valide), se richiesti
+
+    @property
+    def frazione_valida(self) -> float:
+        return self.n_validi / self.n if self.n else 0.0
+
+    def intervallo(self, livello: float = 95.0) -> Tuple[float, float]:
+        """Intervallo centrale al `livello` percentuale (dai campioni se disponibili, altrimenti dai percentili)."""
+        a, b = 50.0 - livello / 2.0, 50.0 + livello / 2.0
+        if self.campioni is not None and self.campioni.size:
+            lo, hi = np.percentile(self.campioni, [a, b])
+            return float(lo), float(hi)
+        if a in self.percentili and b in self.percentili:
+            return self.percentili[a], self.percentili[b]
+        raise KeyError(f"Percentili {a} e {b} non calcolati")
+
+    def intervallo_datetime(self, dt_ispezione: datetime, livello: float = 95.0) -> Tuple[Optional[datetime], Optional[datetime]]:
+        """Intervallo come orari del decesso (arrotondati al quarto d'ora)."""
+        lo, hi = self.intervallo(livello)
+        return ore_to_datetimes(lo, hi, dt_ispezione)
+
+
+# ------------------------
+# Simulazione
+# ------------------------
+def simula_raffreddamento(
+    Tr: float,
+    Ta: DistribuzioneLike,
+    CF: DistribuzioneLike,
+    W: DistribuzioneLike,
+    T0: DistribuzioneLike = T0_DEFAULT,
+    errore_Tr: DistribuzioneLike = 0.0,
+    *,
+    n: int = N_ESTRAZIONI_DEFAULT,
+    seed: int = SEED_DEFAULT,
+    percentili: Sequence[float] = PERCENTILI_DEFAULT,
+    errore_modello: bool = True,
+    metodo: str = METODO_BISEZIONE,
+    restituisci_campioni: bool = False,
+) -> MonteCarloResult:
+    """
+    Percentili del tempo dal decesso (ore) propagando l'incertezza degli input.
+    Tr è la temperatura rettale misurata; `errore_Tr` è l'errore additivo di misura.
+    Ogni input accetta un numero (costante), una coppia (min, max) (uniforme)
+    o una `Distribuzione`. CF è limitato a [0.35, 3.0] e il peso a ≥ 1 kg.
+    Con `errore_modello` a ogni estrazione si somma l'errore di Henssge
+    (normale con σ = Dt/1.96); altrimenti si usa il solo t_med.
+    """
+    if n <= 0:
+        raise ValueError("Il numero di estrazioni deve essere positivo")
+    rng = np.random.default_rng(seed)
+
+    # ordine di estrazione fisso: stesso seme -> stessi campioni
+    Ta_s = _come_distribuzione(Ta).campiona(rng, n)
+    CF_s = np.clip(_come_distribuzione(CF).campiona(rng, n), CF_MIN, CF_MAX)
+    W_s = np.maximum(_come_distribuzione(W).campiona(rng, n), PESO_MIN)
+    T0_s = _come_distribuzione(T0).campiona(rng, n)
+    Tr_s = float(Tr) + _come_distribuzione(errore_Tr).campiona(rng, n)
+
+    _, _, _, t_raw, Qd = calcola_raffreddamento_batch(Tr_s, Ta_s, T0_s, W_s, CF_s, metodo=metodo)
+    if errore_modello:
+        sigma = semiampiezza_henssge_array(Qd, CF_s, t_raw) / Z_95
+        t_raw = np.maximum(0.0, t_raw + sigma * rng.standard_normal(n))
+
+    validi = t_raw[np.isfinite(t_raw)]
+    if validi.size:
+        valori = np.percentile(validi, list(percentili))
+        perc = {float(p): float(v) for p, v in zip(percentili, valori)}
+        media, sd = float(validi.mean()), float(validi.std())
+    else:
+        perc = {float(p): float("nan") for p in percentili}
+        media = sd = float("nan")
+
+    return MonteCarloResult(
+        n=n, n_validi=int(validi.size), seed=seed, percentili=perc,
+        media=media, sd=sd, errore_modello=errore_modello,
+        campioni=validi if restituisci_campioni else None,
+    )
+
+
+__all__ = [
+    "N_ESTRAZIONI_DEFAULT",
+    "SEED_DEFAULT",
+    "PERCENTILI_DEFAULT",
+    "Distribuzione",
+    "costante",
+    "normale",
+    "uniforme",
+    "triangolare",
+    "MonteCarloResult",
+    "simula_raffreddamento",
+]
@@ -9,6 +9,10 @@ Dizionari statici per:
 - costante INF_HOURS condivisa
 """
 
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Mapping
+
 INF_HOURS = 200  # usato per “infinito” sui range aperti
 
 
@@ -320,9 +324,26 @@ nomi_brevi = {
     "Eccitabilità muscolare meccanica": "Ecc. meccanica",
 }
 
+
+# --- Indice delle chiavi dei range (ricerca O(1) dello stato selezionato) ---
+@lru_cache(maxsize=1)
+def indice_range_parametri() -> Mapping[str, Mapping[str, str]]:
+    """
+    Per ogni parametro aggiuntivo: chiave del range senza spazi iniziali/finali
+    → chiave originale (a parità, la prima). Mapping in sola lettura.
+    """
+    indice = {}
+    for nome, dati in dati_parametri_aggiuntivi.items():
+        chiavi = {}
+        for k in dati["range"].keys():
+            chiavi.setdefault(k.strip(), k)
+        indice[nome] = MappingProxyType(chiavi)
+    return MappingProxyType(indice)
+
 __all__ = [
     "INF_HOURS",
     "opzioni_macchie", "macchie_medi", "testi_macchie",
     "opzioni_rigidita", "rigidita_medi", "rigidita_descrizioni",
     "dati_parametri_aggiuntivi", "nomi_brevi",
+    "indice_range_parametri",
 ]
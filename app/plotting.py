@@ -1,15 +1,40 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-from typing import Dict, List, Tuple, Optional, Any
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, List, Tuple, Optional, Any
+import hashlib
+import html
+import io
+import json
+import threading
+import time
 import numpy as np
-import matplotlib.pyplot as plt
+
+from app.intervals import da_range
+from app.timing import FASE_DATI_GRAFICO, FASE_RENDERING, cronometra
+
+if TYPE_CHECKING:  # matplotlib è importato solo quando si disegna una figura
+    from matplotlib.figure import Figure
 
 
 # Formatter numerico: "7.0" -> "7", "7.5" -> "7.5"
 def _fmt(x: float) -> str:
     return f"{x:.1f}".rstrip("0").rstrip(".")
 
+def linee_intersezione(comune_inizio: float, comune_fine: float, overlap: bool, tail: float) -> List[float]:
+    """Ascisse delle linee rosse tratteggiate che delimitano l'intervallo comune."""
+    linee: List[float] = []
+    finestra = da_range(comune_inizio, comune_fine)
+    if overlap and finestra.fine > 0:
+        if finestra.limitato_sotto and finestra.inizio < tail:
+            linee.append(float(max(0, finestra.inizio)))
+        if finestra.limitato_sopra:
+            linee.append(float(min(tail, finestra.fine)))
+    return linee
+
+@cronometra(FASE_DATI_GRAFICO)
 def compute_plot_data(
     *,
     macchie_range: Tuple[float, float],
@@ -192,10 +217,25 @@ def compute_plot_data(
 
 
 
-def render_ranges_plot(data: Dict[str, Any]) -> plt.Figure:
+# Colori dei segmenti (nomi CSS, validi sia per matplotlib sia per SVG)
+COLORE_RANGE = "steelblue"
+COLORE_MEDIANA = "mediumseagreen"
+COLORE_INTERSEZIONE = "red"
+
+@dataclass(frozen=True)
+class _Segmento:
+    y: int
+    x0: float
+    x1: float
+    colore: str
+    zorder: int
+    tratteggiato: bool = False
+    linea: bool = False   # disegnato con ax.plot invece di ax.hlines (stesso aspetto)
+
+def _segmenti_grafico(data: Dict[str, Any]) -> List[_Segmento]:
     """
-    Disegna il grafico dei range usando esclusivamente `data` di compute_plot_data.
-    Non aggiunge linee rosse dell’intersezione: quelle restano nel main.
+    Segmenti orizzontali del grafico, nell'ordine di disegno, calcolati solo da
+    `data`: comuni al renderer matplotlib e a quello SVG.
     """
     labels: List[str] = data["labels"]
     starts: List[float] = data["starts"]
@@ -210,13 +250,7 @@ def render_ranges_plot(data: Dict[str, Any]) -> plt.Figure:
     t_min_raff_visualizzato = data["t_min_raff_visualizzato"]
     t_max_raff_visualizzato = data["t_max_raff_visualizzato"]
 
-    LINE_W = style["line_w"]
-    DASH_LS = style["dash_ls"]
-
-    fig, ax = plt.subplots(figsize=data["figsize"])
-
-        
-
+    segmenti: List[_Segmento] = []
 
     # 1) Segmenti verdi speciali per RAFFREDDAMENTO (sotto)
     if raff_idx is not None:
@@ -224,21 +258,19 @@ def render_ranges_plot(data: Dict[str, Any]) -> plt.Figure:
         raff_only_lower = style.get("raff_only_lower", False)
         raff_only_lower_start = style.get("raff_only_lower_start")
 
-        def _draw_green_segment(y: int, start: float):
+        def _green_segment(y: int, start: float):
             solid_from = max(0.0, start)
             solid_to = max(solid_from, cap_base)
             if solid_from < tail_end and solid_to > solid_from:
-                ax.hlines(y, solid_from, min(solid_to, tail_end),
-                          color='mediumseagreen', linewidth=LINE_W, alpha=1.0, zorder=1)
+                segmenti.append(_Segmento(y, solid_from, min(solid_to, tail_end), COLORE_MEDIANA, 1))
             dash_start = max(solid_to, solid_from)
             if tail_end > dash_start:
-                ax.hlines(y, dash_start, tail_end,
-                          color='mediumseagreen', linewidth=LINE_W, alpha=1.0, zorder=1, linestyle=DASH_LS)
+                segmenti.append(_Segmento(y, dash_start, tail_end, COLORE_MEDIANA, 1, tratteggiato=True))
 
         if raff_only_lower and (raff_only_lower_start is not None):
-            _draw_green_segment(raff_idx, float(raff_only_lower_start))
+            _green_segment(raff_idx, float(raff_only_lower_start))
         if raff_over_48:
-            _draw_green_segment(raff_idx, 48.0)
+            _green_segment(raff_idx, 48.0)
 
     # 2) Linee blu base (tutti i range)
     for i, (s, e) in enumerate(zip(starts, ends)):
@@ -246,49 +278,33 @@ def render_ranges_plot(data: Dict[str, Any]) -> plt.Figure:
             continue
         is_infinite = (np.isnan(e) or e >= INF_HOURS)
         if not is_infinite:
-            ax.hlines(i, s, e, color='steelblue', linewidth=LINE_W, zorder=2)
+            segmenti.append(_Segmento(i, s, e, COLORE_RANGE, 2))
         else:
             solid_to = max(s, cap_base)
             if solid_to > s and s < tail_end:
-                ax.hlines(i, s, min(solid_to, tail_end), color='steelblue', linewidth=LINE_W, zorder=2)
+                segmenti.append(_Segmento(i, s, min(solid_to, tail_end), COLORE_RANGE, 2))
             dash_start = max(solid_to, s)
             if tail_end > dash_start:
-                ax.hlines(i, dash_start, tail_end, color='steelblue', linewidth=LINE_W, zorder=2, linestyle=DASH_LS)
+                segmenti.append(_Segmento(i, dash_start, tail_end, COLORE_RANGE, 2, tratteggiato=True))
 
     # 3) Mediane verdi per ipostasi/rigidità (sopra)
-    # Macchie
-    if "Macchie ipostatiche" in medians and medians["Macchie ipostatiche"] is not None:
-        y = next((idx for idx, lbl in enumerate(labels) if lbl.startswith("Ipostasi")), None)
-        if y is not None:
-            m_s, m_e = medians["Macchie ipostatiche"]
-            is_inf = (m_e is None) or (np.isnan(m_e)) or (m_e >= INF_HOURS)
-            if not is_inf:
-                ax.hlines(y, m_s, m_e, color='mediumseagreen', linewidth=LINE_W, alpha=1.0, zorder=3)
-            else:
-                solid_to = max(m_s, cap_base)
-                if solid_to > m_s and m_s < tail_end:
-                    ax.hlines(y, m_s, min(solid_to, tail_end), color='mediumseagreen', linewidth=LINE_W, alpha=1.0, zorder=3)
-                dash_start = max(solid_to, m_s)
-                if tail_end > dash_start:
-                    ax.plot([dash_start, tail_end], [y, y],
-                            color='mediumseagreen', linewidth=LINE_W, alpha=1.0, linestyle=DASH_LS, zorder=3)
-
-    # Rigidità
-    if "Rigidità cadaverica" in medians and medians["Rigidità cadaverica"] is not None:
-        y = next((idx for idx, lbl in enumerate(labels) if lbl.startswith("Rigor")), None)
-        if y is not None:
-            r_s, r_e = medians["Rigidità cadaverica"]
-            is_inf = (r_e is None) or (np.isnan(r_e)) or (r_e >= INF_HOURS)
-            if not is_inf:
-                ax.hlines(y, r_s, r_e, color='mediumseagreen', linewidth=LINE_W, alpha=1.0, zorder=3)
-            else:
-                solid_to = max(r_s, cap_base)
-                if solid_to > r_s and r_s < tail_end:
-                    ax.hlines(y, r_s, min(solid_to, tail_end), color='mediumseagreen', linewidth=LINE_W, alpha=1.0, zorder=3)
-                dash_start = max(solid_to, r_s)
-                if tail_end > dash_start:
-                    ax.plot([dash_start, tail_end], [y, y],
-                            color='mediumseagreen', linewidth=LINE_W, alpha=1.0, linestyle=DASH_LS, zorder=3)
+    for chiave, prefisso in (("Macchie ipostatiche", "Ipostasi"), ("Rigidità cadaverica", "Rigor")):
+        if medians.get(chiave) is None:
+            continue
+        y = next((idx for idx, lbl in enumerate(labels) if lbl.startswith(prefisso)), None)
+        if y is None:
+            continue
+        m_s, m_e = medians[chiave]
+        is_inf = (m_e is None) or (np.isnan(m_e)) or (m_e >= INF_HOURS)
+        if not is_inf:
+            segmenti.append(_Segmento(y, m_s, m_e, COLORE_MEDIANA, 3))
+        else:
+            solid_to = max(m_s, cap_base)
+            if solid_to > m_s and m_s < tail_end:
+                segmenti.append(_Segmento(y, m_s, min(solid_to, tail_end), COLORE_MEDIANA, 3))
+            dash_start = max(solid_to, m_s)
+            if tail_end > dash_start:
+                segmenti.append(_Segmento(y, dash_start, tail_end, COLORE_MEDIANA, 3, tratteggiato=True, linea=True))
 
     # Marker corto verde del punto medio raffreddamento (solo se NON stiamo facendo tratteggiare all'infinito)
     if raff_idx is not None:
@@ -299,8 +315,38 @@ def render_ranges_plot(data: Dict[str, Any]) -> plt.Figure:
                 pm = (t_min_raff_visualizzato + t_max_raff_visualizzato) / 2.0
                 off = 0.1
                 if (pm - off) < tail_end:
-                    ax.hlines(raff_idx, max(0, pm - off), min(tail_end, pm + off),
-                              color='mediumseagreen', linewidth=LINE_W, alpha=1.0, zorder=3)
+                    segmenti.append(_Segmento(raff_idx, max(0, pm - off), min(tail_end, pm + off), COLORE_MEDIANA, 3))
+
+    return segmenti
+
+
+def render_ranges_plot(data: Dict[str, Any]) -> Figure:
+    """
+    Disegna il grafico dei range usando esclusivamente `data` di compute_plot_data.
+    Le linee rosse dell’intersezione sono lette da data["linee_intersezione"]
+    (aggiunte dal motore di stima), se presenti.
+    La figura è creata senza pyplot (nessuno stato globale): non va chiusa e
+    viene liberata dal garbage collector quando non è più referenziata.
+    """
+    labels: List[str] = data["labels"]
+    tail_end: float = data["tail_end"]
+    style = data["style_flags"]
+
+    LINE_W = style["line_w"]
+    DASH_LS = style["dash_ls"]
+
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=data["figsize"])
+    ax = fig.add_subplot()
+
+    for sg in _segmenti_grafico(data):
+        if sg.linea:
+            ax.plot([sg.x0, sg.x1], [sg.y, sg.y], color=sg.colore, linewidth=LINE_W, alpha=1.0,
+                    linestyle=DASH_LS if sg.tratteggiato else "solid", zorder=sg.zorder)
+        else:
+            ax.hlines(sg.y, sg.x0, sg.x1, color=sg.colore, linewidth=LINE_W, alpha=1.0,
+                      linestyle=DASH_LS if sg.tratteggiato else "solid", zorder=sg.zorder)
 
     #     # Assi, griglia, etichette
     ax.set_xlim(0, tail_end)
@@ -312,8 +358,319 @@ def render_ranges_plot(data: Dict[str, Any]) -> plt.Figure:
     ax.tick_params(axis="x", labelsize=14)         # numeri asse X leggibili
     ax.grid(True, axis='x', linestyle=':', alpha=0.6)
 
-    plt.tight_layout()
-    return fig
+    # Linee rosse dell'intersezione
+    for x in data.get("linee_intersezione") or []:
+        ax.axvline(x, color=COLORE_INTERSEZIONE, linestyle='--')
 
-    plt.tight_layout()
+    fig.tight_layout()
     return fig
+
+
+# ------------------------
+# Renderer SVG leggero
+# ------------------------
+# Stesso grafico di render_ranges_plot costruito come stringa SVG, senza
+# matplotlib. Geometria (segmenti, limiti, tick) e stili replicano quelli di
+# matplotlib; il testo usa le larghezze di DejaVu Sans (il font di default di
+# matplotlib) per dimensionare i margini come fa tight_layout.
+BACKEND_MATPLOTLIB = "matplotlib"
+BACKEND_SVG = "svg"
+BACKENDS_GRAFICO = (BACKEND_MATPLOTLIB, BACKEND_SVG)
+
+_PT_PER_POLLICE = 72.0
+_FONT_SVG = "DejaVu Sans, Bitstream Vera Sans, Verdana, sans-serif"
+_FS_Y, _FS_XTICK, _FS_XLABEL = 18.0, 14.0, 16.0
+_INTERLINEA = 1.42           # distanza tra le righe di un'etichetta (linespacing 1.2 × altezza riga)
+_SPORGENZA_RIGA = 0.26        # parte della riga esterna oltre il centro, in em (va="center_baseline")
+_PAD = 10.8                   # pad di tight_layout (1.08 × 10 pt)
+_TICK_LEN, _TICK_PAD, _LABEL_PAD = 3.5, 3.5, 4.0
+_LW_ASSI, _LW_GRIGLIA, _LW_INTERSEZIONE = 0.8, 0.8, 1.5
+_DASH_GRIGLIA = (0.8, 1.32)   # ':' di matplotlib scalato sullo spessore
+_DASH_INTERSEZIONE = (5.55, 2.4)  # '--' di matplotlib scalato sullo spessore
+
+# Avanzamento dei glifi di DejaVu Sans in em (default per le lettere non elencate)
+_LARGHEZZE_EM: Dict[str, float] = {
+    **{c: 0.636 for c in "0123456789"},
+    " ": 0.318, ".": 0.318, ",": 0.318, ":": 0.337, ";": 0.337, "/": 0.337,
+    "(": 0.39, ")": 0.39, "*": 0.5, "-": 0.361, "–": 0.5, "°": 0.5, "'": 0.275,
+    "≥": 0.838, ">": 0.838,
+    "f": 0.352, "i": 0.278, "j": 0.279, "l": 0.278, "ì": 0.278, "r": 0.412, "t": 0.392,
+    "s": 0.521, "c": 0.55, "z": 0.525, "k": 0.579, "m": 0.974, "w": 0.818,
+    "v": 0.592, "x": 0.592, "y": 0.592,
+    "I": 0.295, "J": 0.295, "L": 0.557, "F": 0.575, "M": 0.863, "W": 0.989,
+}
+
+def _larghezza_testo(testo: str, fontsize: float) -> float:
+    em = 0.0
+    for c in testo:
+        w = _LARGHEZZE_EM.get(c)
+        if w is None:
+            w = 0.69 if c.isupper() else 0.625
+        em += w
+    return em * fontsize
+
+def _passo_tick(ampiezza: float, nbins: int = 9) -> float:
+    """Passo "rotondo" dei tick (come MaxNLocator: passi 1, 2, 2.5, 5, 10 × 10^k)."""
+    if not ampiezza > 0:
+        return 1.0
+    grezzo = ampiezza / nbins
+    scala = 10.0 ** np.floor(np.log10(grezzo))
+    for m in (1.0, 2.0, 2.5, 5.0, 10.0):
+        if m * scala >= grezzo * (1 - 1e-9):
+            return m * scala
+    return 10.0 * scala
+
+def _tick_x(tail_end: float) -> Tuple[List[float], List[str]]:
+    passo = _passo_tick(tail_end)
+    n = int(np.floor(tail_end / passo + 1e-9))
+    valori = [k * passo for k in range(n + 1)]
+    # come ScalarFormatter: stesse cifre decimali per tutte le etichette
+    decimali = 0
+    while decimali < 6 and abs(round(passo, decimali) - passo) > 1e-9 * passo:
+        decimali += 1
+    return valori, [f"{v:.{decimali}f}" for v in valori]
+
+def _num(x: float) -> str:
+    return f"{x:.2f}".rstrip("0").rstrip(".")
+
+def render_ranges_svg(data: Dict[str, Any]) -> str:
+    """
+    Grafico dei range come documento SVG (stringa), dallo stesso `data` di
+    render_ranges_plot. Non importa matplotlib: costa pochi decimi di millisecondo.
+    """
+    labels: List[str] = data["labels"]
+    tail_end: float = data["tail_end"]
+    style = data["style_flags"]
+    line_w = float(style["line_w"])
+    offset, (on, off) = style["dash_ls"]
+    dash_segmenti = (on * line_w, off * line_w)
+
+    W = float(data["figsize"][0]) * _PT_PER_POLLICE
+    H = float(data["figsize"][1]) * _PT_PER_POLLICE
+    n = len(labels)
+
+    # Limiti y come matplotlib (margine 5%, asse invertito: indice 0 in alto)
+    margine = 0.05 * (n - 1) if n > 1 else 0.055
+    y_lo, y_hi = -margine, (n - 1) + margine
+
+    # Margini del riquadro degli assi (tight_layout)
+    righe = [lbl.split("\n") for lbl in labels]
+    larghezza_y = max((_larghezza_testo(r, _FS_Y) for lbl in righe for r in lbl), default=0.0)
+    max_righe = max((len(lbl) for lbl in righe), default=1)
+    meta_altezza_y = ((max_righe - 1) * _INTERLINEA / 2.0 + _SPORGENZA_RIGA) * _FS_Y
+    tick_vals, tick_txt = _tick_x(tail_end)
+    sx = _PAD + larghezza_y + _TICK_PAD + _TICK_LEN
+    dx = W - _PAD
+    if tick_txt and tail_end > 0:
+        # l'ultima etichetta x può sporgere a destra del riquadro
+        meta = _larghezza_testo(tick_txt[-1], _FS_XTICK) / 2.0
+        for _ in range(2):
+            dx = W - _PAD - max(0.0, meta - (1.0 - tick_vals[-1] / tail_end) * (dx - sx))
+    basso = H - _PAD - _FS_XLABEL - _LABEL_PAD - _FS_XTICK - _TICK_PAD - _TICK_LEN
+    alto = _PAD
+    for _ in range(2):  # le etichette y sporgono oltre il riquadro se le righe sono vicine al bordo
+        bordo = (margine / (y_hi - y_lo)) * (basso - alto)
+        alto = _PAD + max(0.0, meta_altezza_y - bordo)
+    bordo = (margine / (y_hi - y_lo)) * (basso - alto)
+    basso = min(basso, H - _PAD - max(0.0, meta_altezza_y - bordo))
+    aw, ah = dx - sx, basso - alto
+
+    def px(v: float) -> float:
+        return sx + (v / tail_end) * aw if tail_end > 0 else sx
+
+    def py(v: float) -> float:
+        return alto + ((v - y_lo) / (y_hi - y_lo)) * ah
+
+    def linea(x0, y0, x1, y1, colore, lw, dash=None, extra=""):
+        attr_dash = f' stroke-dasharray="{_num(dash[0])},{_num(dash[1])}"' if dash else ""
+        return (f'<line x1="{_num(x0)}" y1="{_num(y0)}" x2="{_num(x1)}" y2="{_num(y1)}" '
+                f'stroke="{colore}" stroke-width="{_num(lw)}"{attr_dash}{extra}/>')
+
+    clip = "c" + chiave_plot_data(data, "svg", BACKEND_SVG)[:10]
+    segmenti = _segmenti_grafico(data)
+
+    def disegna_segmenti(zorder: int) -> List[str]:
+        out = []
+        for sg in segmenti:
+            if sg.zorder == zorder:
+                out.append(linea(px(sg.x0), py(sg.y), px(sg.x1), py(sg.y), sg.colore, line_w,
+                                 dash_segmenti if sg.tratteggiato else None))
+        if not out:
+            return []
+        return [f'<g clip-path="url(#{clip})" stroke-linecap="butt">', *out, "</g>"]
+
+    parti: List[str] = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{_num(W)}pt" height="{_num(H)}pt" '
+        f'viewBox="0 0 {_num(W)} {_num(H)}" font-family="{_FONT_SVG}">',
+        f'<defs><clipPath id="{clip}"><rect x="{_num(sx)}" y="{_num(alto)}" '
+        f'width="{_num(aw)}" height="{_num(ah)}"/></clipPath></defs>',
+        f'<rect width="{_num(W)}" height="{_num(H)}" fill="white"/>',
+    ]
+
+    # z1: segmenti verdi speciali (sotto la griglia)
+    parti += disegna_segmenti(1)
+
+    # z1.5: griglia verticale e tick dell'asse x
+    for v in tick_vals:
+        x = px(v)
+        parti.append(linea(x, alto, x, basso, "#b0b0b0", _LW_GRIGLIA, _DASH_GRIGLIA, ' stroke-opacity="0.6"'))
+        parti.append(linea(x, basso, x, basso + _TICK_LEN, "black", _LW_ASSI))
+    for i in range(n):
+        y = py(i)
+        parti.append(linea(sx - _TICK_LEN, y, sx, y, "black", _LW_ASSI))
+
+    # z2: range blu, poi linee rosse dell'intersezione
+    parti += disegna_segmenti(2)
+    for v in data.get("linee_intersezione") or []:
+        x = px(float(v))
+        parti.append(linea(x, alto, x, basso, COLORE_INTERSEZIONE, _LW_INTERSEZIONE, _DASH_INTERSEZIONE))
+
+    # z2.5: cornice degli assi
+    parti.append(f'<rect x="{_num(sx)}" y="{_num(alto)}" width="{_num(aw)}" height="{_num(ah)}" '
+                 f'fill="none" stroke="black" stroke-width="{_num(_LW_ASSI)}"/>')
+
+    # z3: mediane e marker del punto medio
+    parti += disegna_segmenti(3)
+
+    # Testo: etichette y (più righe, allineate a destra), tick x, titolo asse x
+    x_lbl = sx - _TICK_LEN - _TICK_PAD
+    for i, lbl in enumerate(righe):
+        y0 = py(i) - (len(lbl) - 1) * _FS_Y * _INTERLINEA / 2.0
+        tspan = "".join(
+            f'<tspan x="{_num(x_lbl)}" y="{_num(y0 + k * _FS_Y * _INTERLINEA)}">{html.escape(r)}</tspan>'
+            for k, r in enumerate(lbl)
+        )
+        parti.append(f'<text font-size="{_num(_FS_Y)}" text-anchor="end" dominant-baseline="central">{tspan}</text>')
+    y_tick = basso + _TICK_LEN + _TICK_PAD
+    for v, txt in zip(tick_vals, tick_txt):
+        parti.append(f'<text x="{_num(px(v))}" y="{_num(y_tick)}" font-size="{_num(_FS_XTICK)}" '
+                     f'text-anchor="middle" dominant-baseline="hanging">{html.escape(txt)}</text>')
+    parti.append(f'<text x="{_num(sx + aw / 2.0)}" y="{_num(y_tick + _FS_XTICK + _LABEL_PAD)}" '
+                 f'font-size="{_num(_FS_XLABEL)}" text-anchor="middle" dominant-baseline="hanging">Ore dal decesso</text>')
+
+    parti.append("</svg>")
+    return "\n".join(parti)
+
+
+# ------------------------
+# Cache delle immagini renderizzate
+# ------------------------
+# I rerun di Streamlit causati da widget estranei al grafico (popover, tema,
+# toggle) producono lo stesso dict di compute_plot_data: l'immagine è servita
+# dalla cache, indicizzata da un hash canonico del dict, senza ridisegnare.
+PLOT_CACHE_MAXSIZE_DEFAULT = 64
+PLOT_DPI = 200            # stessi default di st.pyplot (dpi=200, bbox_inches="tight")
+FORMATI_IMMAGINE = ("png", "svg")
+
+@dataclass(frozen=True)
+class PlotCacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    maxsize: int
+    render_time_s: float   # tempo totale di disegno + serializzazione (miss)
+
+_plot_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_plot_cache_lock = threading.Lock()
+_plot_cache_maxsize = PLOT_CACHE_MAXSIZE_DEFAULT
+_plot_cache_hits = 0
+_plot_cache_misses = 0
+_plot_cache_evictions = 0
+_plot_cache_render_time = 0.0
+
+def _canonico(obj: Any) -> Any:
+    """Forma JSON deterministica: chiavi ordinate, tuple come liste, float via repr (NaN/inf inclusi)."""
+    if isinstance(obj, dict):
+        return [[str(k), _canonico(v)] for k, v in sorted(obj.items(), key=lambda kv: str(kv[0]))]
+    if isinstance(obj, (list, tuple)):
+        return [_canonico(v) for v in obj]
+    if isinstance(obj, np.ndarray):
+        return [_canonico(v) for v in obj.tolist()]
+    if isinstance(obj, np.generic):
+        obj = obj.item()
+    if isinstance(obj, bool) or obj is None or isinstance(obj, str):
+        return obj
+    if isinstance(obj, (int, float)):
+        return repr(float(obj) + 0.0)   # 7 e 7.0 coincidono; +0.0: -0.0 → 0.0
+    return repr(obj)
+
+def chiave_plot_data(data: Dict[str, Any], formato: str = "png", backend: str = BACKEND_MATPLOTLIB) -> str:
+    """Hash canonico (sha256) del dict di compute_plot_data, del formato di output e del backend."""
+    testo = json.dumps([backend, formato, PLOT_DPI, _canonico(data)], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(testo.encode("utf-8")).hexdigest()
+
+def _serializza(data: Dict[str, Any], formato: str, backend: str) -> bytes:
+    if backend == BACKEND_SVG:
+        return render_ranges_svg(data).encode("utf-8")
+    fig = render_ranges_plot(data)
+    buf = io.BytesIO()
+    fig.savefig(buf, format=formato, dpi=PLOT_DPI, bbox_inches="tight")
+    return buf.getvalue()
+
+@cronometra(FASE_RENDERING)
+def render_ranges_image(data: Dict[str, Any], formato: str = "png", backend: str = BACKEND_MATPLOTLIB) -> bytes:
+    """
+    Immagine (PNG o SVG) del grafico dei range, con cache LRU sul contenuto di `data`.
+    A parità di dati l'immagine è restituita senza ridisegnare.
+    Il backend "svg" (render_ranges_svg) produce solo SVG e non usa matplotlib.
+    """
+    global _plot_cache_hits, _plot_cache_misses, _plot_cache_evictions, _plot_cache_render_time
+    if formato not in FORMATI_IMMAGINE:
+        raise ValueError(f"Formato immagine sconosciuto: {formato!r} (attesi: {', '.join(FORMATI_IMMAGINE)})")
+    if backend not in BACKENDS_GRAFICO:
+        raise ValueError(f"Backend del grafico sconosciuto: {backend!r} (attesi: {', '.join(BACKENDS_GRAFICO)})")
+    if backend == BACKEND_SVG and formato != "svg":
+        raise ValueError("Il backend SVG produce solo il formato 'svg'")
+    chiave = chiave_plot_data(data, formato, backend)
+    with _plot_cache_lock:
+        img = _plot_cache.get(chiave)
+        if img is not None:
+            _plot_cache.move_to_end(chiave)
+            _plot_cache_hits += 1
+            return img
+
+    t0 = time.perf_counter()
+    img = _serializza(data, formato, backend)
+    dt = time.perf_counter() - t0
+
+    with _plot_cache_lock:
+        _plot_cache_misses += 1
+        _plot_cache_render_time += dt
+        if _plot_cache_maxsize > 0:
+            _plot_cache[chiave] = img
+            _plot_cache.move_to_end(chiave)
+            while len(_plot_cache) > _plot_cache_maxsize:
+                _plot_cache.popitem(last=False)
+                _plot_cache_evictions += 1
+    return img
+
+def configura_cache_grafici(maxsize: int = PLOT_CACHE_MAXSIZE_DEFAULT) -> None:
+    """Imposta la dimensione massima della cache delle immagini (0 = disattivata)."""
+    global _plot_cache_maxsize, _plot_cache_evictions
+    if maxsize < 0:
+        raise ValueError("maxsize deve essere >= 0")
+    with _plot_cache_lock:
+        _plot_cache_maxsize = int(maxsize)
+        while len(_plot_cache) > _plot_cache_maxsize:
+            _plot_cache.popitem(last=False)
+            _plot_cache_evictions += 1
+
+def svuota_cache_grafici() -> None:
+    """Svuota la cache delle immagini e azzera le statistiche."""
+    global _plot_cache_hits, _plot_cache_misses, _plot_cache_evictions, _plot_cache_render_time
+    with _plot_cache_lock:
+        _plot_cache.clear()
+        _plot_cache_hits = _plot_cache_misses = _plot_cache_evictions = 0
+        _plot_cache_render_time = 0.0
+
+def statistiche_cache_grafici() -> PlotCacheStats:
+    with _plot_cache_lock:
+        return PlotCacheStats(
+            hits=_plot_cache_hits,
+            misses=_plot_cache_misses,
+            evictions=_plot_cache_evictions,
+            size=len(_plot_cache),
+            maxsize=_plot_cache_maxsize,
+            render_time_s=_plot_cache_render_time,
+        )
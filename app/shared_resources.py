@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# app/shared_resources.py — Risorse condivise tra le sessioni Streamlit.
+#
+# Tabelle di sola lettura costruite una volta per processo server con
+# st.cache_resource: la prima sessione le crea (Streamlit serializza la
+# costruzione), le successive ricevono lo stesso oggetto. Gli array NumPy
+# hanno write=False e i mapping sono MappingProxyType: le sessioni le leggono
+# in parallelo senza lock né copie, e la memoria non cresce con gli utenti.
+#
+# I moduli di calcolo (engine, henssge, factor_calc) non dipendono da
+# Streamlit e usano direttamente i costruttori memoizzati qui sotto: gli
+# oggetti sono gli stessi restituiti da queste funzioni.
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+import streamlit as st
+
+from app.data_sources import load_tabella2_interpolatore
+from app.factor_calc import Tabella2Interpolatore
+from app.fc_table import TabellaFattori, tabella_fattori
+from app.henssge import tabella_inversa_qp
+from app.parameters import indice_range_parametri
+
+# Coefficiente A di Henssge: 1.25 per Ta ≤ 23 °C, 10/9 oltre
+COEFFICIENTI_A = (1.25, 10 / 9)
+
+
+# ------------------------
+# Risorse
+# ------------------------
+def tabella2() -> Optional[Tabella2Interpolatore]:
+    """Tabella 2 (correzione per il peso) compilata; None se il workbook manca."""
+    return load_tabella2_interpolatore()   # già st.cache_resource in app.data_sources
+
+@st.cache_resource(show_spinner=False)
+def tabelle_inverse_henssge() -> Mapping[float, Tuple[np.ndarray, np.ndarray]]:
+    """Tabelle (qd, s) per l'inversione rapida di Qp, per ciascun coefficiente A."""
+    return MappingProxyType({A: tabella_inversa_qp(A) for A in COEFFICIENTI_A})
+
+@st.cache_resource(show_spinner=False)
+def tabella_fattori_base() -> TabellaFattori:
+    """Tabella precalcolata dei fattori di correzione base (app.fc_table)."""
+    return tabella_fattori()
+
+@st.cache_resource(show_spinner=False)
+def indice_parametri() -> Mapping[str, Mapping[str, str]]:
+    """Indice stato → chiave del range dei parametri aggiuntivi."""
+    return indice_range_parametri()
+
+def inizializza_risorse_condivise() -> None:
+    """
+    Crea (se non ancora presenti nel processo) tutte le risorse condivise.
+    Da chiamare all'avvio di ogni pagina: dopo la prima sessione costa
+    solo una ricerca nella cache.
+    """
+    tabella2()
+    tabelle_inverse_henssge()
+    tabella_fattori_base()
+    indice_parametri()
+
+
+# ------------------------
+# Diagnostica
+# ------------------------
+@dataclass(frozen=True)
+class RisorsaCondivisa:
+    nome: str
+    byte: int            # memoria degli array (0 per i mapping)
+    sola_lettura: bool   # tutti gli array con write=False
+
+def _array(obj) -> List[np.ndarray]:
+    if isinstance(obj, np.ndarray):
+        return [obj]
+    if isinstance(obj, (tuple, list)):
+        return [a for v in obj for a in _array(v)]
+    if isinstance(obj, Mapping):
+        return [a for v in obj.values() for a in _array(v)]
+    if obj is not None and hasattr(obj, "__dataclass_fields__"):
+        return [a for f in obj.__dataclass_fields__ for a in _array(getattr(obj, f))]
+    return []
+
+def descrivi_risorse_condivise() -> List[RisorsaCondivisa]:
+    """Dimensione e stato di sola lettura di ogni risorsa condivisa."""
+    risorse: Dict[str, object] = {
+        "Tabella 2 (peso)": tabella2(),
+        "Tabelle inverse Henssge": tabelle_inverse_henssge(),
+        "Fattori di correzione base": tabella_fattori_base(),
+        "Indice parametri aggiuntivi": indice_parametri(),
+    }
+    out = []
+    for nome, obj in risorse.items():
+        arr = _array(obj)
+        out.append(RisorsaCondivisa(
+            nome=nome,
+            byte=int(sum(a.nbytes for a in arr)),
+            sola_lettura=all(not a.flags.writeable for a in arr),
+        ))
+    return out
+
+
+__all__ = [
+    "COEFFICIENTI_A",
+    "tabella2",
+    "tabelle_inverse_henssge",
+    "tabella_fattori_base",
+    "indice_parametri",
+    "inizializza_risorse_condivise",
+    "RisorsaCondivisa",
+    "descrivi_risorse_condivise",
+]
@@ -6,7 +6,6 @@ La logica è volutamente isolata: intercetta soltanto il selectbox con l'etichet
 """
 
 import streamlit as st
-from streamlit_image_coordinates import streamlit_image_coordinates
 
 
 _LABEL = "Eccitabilità elettrica sopraciliare"
@@ -47,6 +46,9 @@ def install_sopraciliare_click_selector():
 
     def selectbox_with_sopraciliare(label, options, *args, **kwargs):
         if label == _LABEL:
+            # componente importato solo quando il selettore viene davvero mostrato
+            from streamlit_image_coordinates import streamlit_image_coordinates
+
             click = streamlit_image_coordinates(
                 _IMAGE_PATH,
                 width=_IMAGE_WIDTH,
@@ -6,6 +6,8 @@ import datetime
 from typing import List, Optional, Tuple, Iterable, Dict, Any
 import numpy as np
 
+from app.intervals import fine_aperta
+from app.timing import FASE_TESTI, cronometra
 from app.utils_time import split_hours_minutes
 
 # ------------------------------------------------------------
@@ -59,6 +61,7 @@ def _fmt_range_hm(h1: int, m1: int, h2: int, m2: int) -> str:
 # Frasi conclusive (HTML pronto)
 # ------------------------------------------------------------
 
+@cronometra(FASE_TESTI)
 def build_final_sentence(
     comune_inizio: float,
     comune_fine: float,
@@ -72,7 +75,7 @@ def build_final_sentence(
     if _safe_is_nan(comune_inizio) and _safe_is_nan(comune_fine):
         return None
 
-    limite_sup_inf = _safe_is_nan(comune_fine) or comune_fine == inf_hours
+    limite_sup_inf = fine_aperta(comune_fine, inf_hours)
 
     # Caso: limite superiore infinito → “oltre X”
     if limite_sup_inf and not _safe_is_nan(comune_inizio):
@@ -131,6 +134,7 @@ def build_final_sentence(
 # Frasi brevi per la sezione sotto al grafico
 # ------------------------------------------------------------
 
+@cronometra(FASE_TESTI)
 def build_simple_sentence(
     comune_inizio: Optional[float],
     comune_fine: Optional[float],
@@ -141,7 +145,7 @@ def build_simple_sentence(
     """Versione breve con data/ora. HTML con intestazione in grassetto."""
     if _safe_is_nan(comune_inizio) and _safe_is_nan(comune_fine):
         return None
-    limite_sup_inf = _safe_is_nan(comune_fine) or comune_fine == inf_hours
+    limite_sup_inf = fine_aperta(comune_fine, inf_hours)
 
     def _ora_data(h_dec):
         dt = isp_dt - datetime.timedelta(hours=h_dec)
@@ -185,6 +189,7 @@ def build_simple_sentence(
                 f"ovvero circa {finestra}.</p>")
     return None
 
+@cronometra(FASE_TESTI)
 def build_simple_sentence_no_dt(
     comune_inizio: Optional[float],
     comune_fine: Optional[float],
@@ -196,7 +201,7 @@ def build_simple_sentence_no_dt(
     """
     if _safe_is_nan(comune_inizio) and _safe_is_nan(comune_fine):
         return None
-    limite_sup_inf = _safe_is_nan(comune_fine) or comune_fine == inf_hours
+    limite_sup_inf = fine_aperta(comune_fine, inf_hours)
 
     # 0–X
     if not _safe_is_nan(comune_fine) and (comune_inizio == 0 or _safe_is_nan(comune_inizio)):
@@ -222,6 +227,7 @@ def build_simple_sentence_no_dt(
                 "dei rilievi dei dati tanatologici.</p>")
     return None
 
+@cronometra(FASE_TESTI)
 def build_final_sentence_simple(
     comune_inizio: float,
     comune_fine: float,
@@ -234,7 +240,7 @@ def build_final_sentence_simple(
     if _safe_is_nan(comune_inizio) and _safe_is_nan(comune_fine):
         return None
 
-    limite_sup_inf = _safe_is_nan(comune_fine) or comune_fine == inf_hours
+    limite_sup_inf = fine_aperta(comune_fine, inf_hours)
 
     # oltre X
     if limite_sup_inf and not _safe_is_nan(comune_inizio):
@@ -274,6 +280,7 @@ def build_final_sentence_simple(
 # Paragrafi descrittivi per l’expander “Descrizioni dettagliate”
 # ------------------------------------------------------------
 
+@cronometra(FASE_TESTI)
 def paragrafo_raffreddamento_dettaglio(
     *,
     t_min_visual: Optional[float],
@@ -341,6 +348,7 @@ def paragrafo_raffreddamento_dettaglio(
     return par
 
 
+@cronometra(FASE_TESTI)
 def paragrafo_potente(
     *,
     mt_ore: Optional[float],
@@ -367,6 +375,7 @@ def paragrafo_potente(
         f"Applicandolo al caso specifico, si può ipotizzare che, al momento dell’ispezione legale, fossero trascorse almeno <b>{_fmt_hm_full(h, m)}</b> (≈ {mt_giorni:.1f} giorni) dal decesso.</li></ul>"
     )
 
+@cronometra(FASE_TESTI)
 def paragrafo_raffreddamento_input(
     *,
     isp_dt: Optional[datetime.datetime],
@@ -406,6 +415,7 @@ def paragrafo_raffreddamento_input(
         "</li></ul>"
     )
 
+@cronometra(FASE_TESTI)
 def paragrafi_descrizioni_base(
     *,
     testo_macchie: str,
@@ -417,6 +427,7 @@ def paragrafi_descrizioni_base(
         f"<ul><li>{testo_rigidita}</li></ul>",
     ]
 
+@cronometra(FASE_TESTI)
 def paragrafi_parametri_aggiuntivi(
     *,
     parametri: Iterable[Dict[str, Any]]
@@ -433,6 +444,7 @@ def paragrafi_parametri_aggiuntivi(
             out.append(f"<ul><li>{desc}</li></ul>")
     return out
 
+@cronometra(FASE_TESTI)
 def paragrafo_putrefattive(segnalate: bool) -> Optional[str]:
     """
     Paragrafo standard sui processi putrefattivi. HTML <ul><li>...</li></ul>.
@@ -448,6 +460,7 @@ def paragrafo_putrefattive(segnalate: bool) -> Optional[str]:
         "ulteriori precisazioni sull’epoca della morte.</li></ul>"
     )
 
+@cronometra(FASE_TESTI)
 def avvisi_raffreddamento_henssge(*, t_med_round: Optional[float], qd_val: Optional[float]) -> List[str]:
     """
     Avvisi testuali relativi al raffreddamento cadaverico.
@@ -465,6 +478,7 @@ def avvisi_raffreddamento_henssge(*, t_med_round: Optional[float], qd_val: Optio
 # Riepilogo parametri usati
 # ------------------------------------------------------------
 
+@cronometra(FASE_TESTI)
 def frase_riepilogo_parametri_usati(labels: List[str]) -> Optional[str]:
     """
     Testo arancione piccolo: “La stima complessiva si basa su…”.
@@ -480,6 +494,37 @@ def frase_riepilogo_parametri_usati(labels: List[str]) -> Optional[str]:
     join += f" e {labels[-1][0].lower() + labels[-1][1:]}"
     return f"<p style='color:blue;font-size:small;'>La stima complessiva si basa sui seguenti parametri: {join}.</p>"
 
+@cronometra(FASE_TESTI)
+def frase_parametri_concordanti(
+    concordanti: List[str],
+    esclusi: List[str],
+    finestra_inizio: float,
+    finestra_fine: float,
+    *,
+    inf_hours: float = np.inf
+) -> Optional[str]:
+    """
+    Con stime discordanti: finestra indicata dal gruppo più ampio di parametri
+    tra loro concordanti e parametri che ne restano esclusi.
+    """
+    if len(concordanti) < 2 or not esclusi or _safe_is_nan(finestra_inizio):
+        return None
+    n_tot = len(concordanti) + len(esclusi)
+    if fine_aperta(finestra_fine, inf_hours):
+        h1, m1 = _hm_from_hours(finestra_inizio)
+        finestra = f"oltre {_fmt_hm_full(h1, m1)}"
+    else:
+        h1, m1 = _hm_from_hours(finestra_inizio)
+        h2, m2 = _hm_from_hours(finestra_fine)
+        finestra = _fmt_range_hm(h1, m1, h2, m2)
+    nomi = [x[0].lower() + x[1:] for x in esclusi]
+    elenco = nomi[0] if len(nomi) == 1 else ', '.join(nomi[:-1]) + f" e {nomi[-1]}"
+    verbo = "resta escluso il seguente parametro" if len(nomi) == 1 else "restano esclusi i seguenti parametri"
+    return (f"<p style='color:blue;font-size:small;'>Il gruppo più ampio di parametri tra loro concordanti "
+            f"({len(concordanti)} su {n_tot}) indica un'epoca del decesso {finestra} prima dei rilievi; "
+            f"{verbo}: {elenco}.</p>")
+
+@cronometra(FASE_TESTI)
 def frase_qd(qd_val: Optional[float], ta_val: Optional[float]) -> Optional[str]:
     """
     Frase con Qd e confronto con la soglia (0.2 o 0.5 a seconda della T ambiente).
@@ -1,7 +1,6 @@
 # app/theme.py
 # -*- coding: utf-8 -*-
 import streamlit as st
-from streamlit_extras.stylable_container import stylable_container
 
 # ------------------------------------------------------------
 # Utility per ottenere valori dal config di Streamlit
@@ -146,6 +145,7 @@ def apply_theme():
 # Box frase breve con sfondo verde soft (come FC)
 # ------------------------------------------------------------
 def frase_breve_box(key: str = "frase_breve"):
+    from streamlit_extras.stylable_container import stylable_container
     C = theme_colors()
     return stylable_container(
         key=key,
@@ -185,6 +185,7 @@ def frase_breve_box(key: str = "frase_breve"):
 # Helper per pannello FC
 # ------------------------------------------------------------
 def fc_panel_start(key: str = "fcwrap_mobile"):
+    from streamlit_extras.stylable_container import stylable_container
     C = theme_colors()
     bg_light = "#f0f6ff"
     bg_dark  = "#0f2036"
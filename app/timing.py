@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+# app/timing.py — Tempi per fase del calcolo, per rerun, sessione e processo.
+#
+# I timer sono sempre attivi e costano pochi microsecondi per fase: due
+# letture di perf_counter e un aggiornamento di dizionario. Le fasi annidate
+# (es. Henssge chiamato dalla stima cautelativa) confluiscono in quella
+# esterna, così la somma delle fasi di un rerun non conta due volte lo stesso
+# tempo. Senza un rerun attivo (batch, bench) i tempi vanno solo nel totale
+# del processo.
+#
+# Ogni rerun di pagina può essere scritto come riga JSON in un file di log
+# (variabile d'ambiente STIMA_LOG_TEMPI o `configura_log_tempi`).
+
+from __future__ import annotations
+
+import contextvars
+import datetime
+import functools
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, TypeVar
+
+# ------------------------
+# Fasi
+# ------------------------
+FASE_FATTORE = "fattore_correzione"
+FASE_HENSSGE = "henssge"
+FASE_CAUTELATIVA = "cautelativa"
+FASE_PARAMETRI = "parametri_aggiuntivi"
+FASE_INTERSEZIONE = "intersezione"
+FASE_TESTI = "testi"
+FASE_DATI_GRAFICO = "dati_grafico"
+FASE_RENDERING = "rendering"
+FASE_VISUALIZZAZIONE = "visualizzazione"
+FASE_RERUN = "rerun"   # durata complessiva dello script (solo con una misura di rerun)
+
+ETICHETTE_FASI: Dict[str, str] = {
+    FASE_FATTORE: "Fattore di correzione",
+    FASE_HENSSGE: "Henssge",
+    FASE_CAUTELATIVA: "Stima cautelativa",
+    FASE_PARAMETRI: "Traslazione parametri aggiuntivi",
+    FASE_INTERSEZIONE: "Intersezione e discordanze",
+    FASE_TESTI: "Generazione testi",
+    FASE_DATI_GRAFICO: "Dati del grafico",
+    FASE_RENDERING: "Rendering del grafico",
+    FASE_VISUALIZZAZIONE: "Invio immagine (st.image)",
+    FASE_RERUN: "Rerun completo",
+}
+
+
+# ------------------------
+# Statistiche
+# ------------------------
+@dataclass
+class StatFase:
+    conteggio: int = 0
+    totale_s: float = 0.0
+    massimo_s: float = 0.0
+
+    @property
+    def media_s(self) -> float:
+        return self.totale_s / self.conteggio if self.conteggio else 0.0
+
+    def aggiungi(self, dt: float) -> None:
+        self.conteggio += 1
+        self.totale_s += dt
+        if dt > self.massimo_s:
+            self.massimo_s = dt
+
+class StatisticheFasi:
+    """Aggregato nome fase → StatFase, sicuro tra thread."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._fasi: Dict[str, StatFase] = {}
+
+    def registra(self, nome: str, dt: float) -> None:
+        with self._lock:
+            stat = self._fasi.get(nome)
+            if stat is None:
+                stat = self._fasi[nome] = StatFase()
+            stat.aggiungi(dt)
+
+    def istantanea(self) -> Dict[str, StatFase]:
+        """Copia delle statistiche, nell'ordine di ETICHETTE_FASI (poi le altre)."""
+        with self._lock:
+            copia = {k: StatFase(v.conteggio, v.totale_s, v.massimo_s) for k, v in self._fasi.items()}
+        ordine = [k for k in ETICHETTE_FASI if k in copia] + sorted(k for k in copia if k not in ETICHETTE_FASI)
+        return {k: copia[k] for k in ordine}
+
+    def azzera(self) -> None:
+        with self._lock:
+            self._fasi.clear()
+
+_processo = StatisticheFasi()
+
+def statistiche_processo() -> Dict[str, StatFase]:
+    """Tempi per fase aggregati su tutte le sessioni del processo."""
+    return _processo.istantanea()
+
+def azzera_statistiche_processo() -> None:
+    _processo.azzera()
+
+def azzeramento_processo_abilitato() -> bool:
+    """
+    True se il server è avviato con STIMA_DIAGNOSTICA_ADMIN=1: le statistiche
+    del processo sono condivise da tutte le sessioni e la pagina Diagnostica
+    è raggiungibile da chiunque, quindi l'azzeramento è un'opzione lato server.
+    """
+    return os.environ.get("STIMA_DIAGNOSTICA_ADMIN", "").strip().lower() in ("1", "true", "si", "sì")
+
+
+# ------------------------
+# Misura di un rerun
+# ------------------------
+@dataclass
+class MisuraRerun:
+    pagina: str
+    inizio: datetime.datetime
+    sessione: Optional[StatisticheFasi] = None
+    fasi: Dict[str, float] = field(default_factory=dict)   # secondi per fase nel rerun
+    durata_s: Optional[float] = None
+    interrotta: bool = False   # chiusa dal rerun successivo (st.stop, eccezione, nuovo rerun)
+    _t0: float = field(default_factory=time.perf_counter, repr=False)
+    _ultimo: float = field(default=0.0, repr=False)
+
+    @property
+    def chiusa(self) -> bool:
+        return self.durata_s is not None
+
+    def come_dict(self) -> Dict[str, object]:
+        return {
+            "inizio": self.inizio.isoformat(timespec="milliseconds"),
+            "pagina": self.pagina,
+            "durata_ms": round(1000 * self.durata_s, 3) if self.durata_s is not None else None,
+            "interrotta": self.interrotta,
+            "fasi_ms": {k: round(1000 * v, 3) for k, v in self.fasi.items()},
+        }
+
+_misura_corrente: contextvars.ContextVar[Optional[MisuraRerun]] = contextvars.ContextVar(
+    "misura_rerun", default=None
+)
+_fase_attiva: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("fase_attiva", default=None)
+
+def _registra(nome: str, dt: float) -> None:
+    _processo.registra(nome, dt)
+    misura = _misura_corrente.get()
+    if misura is not None and not misura.chiusa:
+        misura.fasi[nome] = misura.fasi.get(nome, 0.0) + dt
+        misura._ultimo = time.perf_counter()
+        if misura.sessione is not None:
+            misura.sessione.registra(nome, dt)
+
+def avvia_misura(pagina: str, sessione: Optional[StatisticheFasi] = None) -> MisuraRerun:
+    """Apre la misura di un rerun nel contesto corrente; le fasi successive vi confluiscono."""
+    misura = MisuraRerun(pagina=pagina, inizio=datetime.datetime.now(), sessione=sessione)
+    misura._ultimo = misura._t0
+    _misura_corrente.set(misura)
+    return misura
+
+def chiudi_misura(misura: MisuraRerun, *, interrotta: bool = False) -> None:
+    """
+    Chiude la misura (idempotente), la aggiunge alle statistiche e la scrive
+    nel log. Una misura interrotta dura fino all'ultima fase registrata.
+    """
+    if misura.chiusa:
+        return
+    fine = misura._ultimo if interrotta else time.perf_counter()
+    misura.durata_s = fine - misura._t0
+    misura.interrotta = interrotta
+    _processo.registra(FASE_RERUN, misura.durata_s)
+    if misura.sessione is not None:
+        misura.sessione.registra(FASE_RERUN, misura.durata_s)
+    if _misura_corrente.get() is misura:
+        _misura_corrente.set(None)
+    _scrivi_log(misura)
+
+
+# ------------------------
+# Cronometri
+# ------------------------
+class _Fase:
+    __slots__ = ("nome", "_t0", "_token")
+
+    def __init__(self, nome: str) -> None:
+        self.nome = nome
+        self._token = None
+
+    def __enter__(self) -> "_Fase":
+        if _fase_attiva.get() is None:
+            self._token = _fase_attiva.set(self.nome)
+            self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        if self._token is not None:
+            dt = time.perf_counter() - self._t0
+            _fase_attiva.reset(self._token)
+            self._token = None
+            _registra(self.nome, dt)
+        return False
+
+def fase(nome: str) -> _Fase:
+    """Context manager che cronometra il blocco come fase `nome`."""
+    return _Fase(nome)
+
+F = TypeVar("F", bound=Callable)
+
+def cronometra(nome: str) -> Callable[[F], F]:
+    """Decoratore: ogni chiamata della funzione è cronometrata come fase `nome`."""
+    def decora(fn: F) -> F:
+        @functools.wraps(fn)
+        def avvolta(*args, **kwargs):
+            with _Fase(nome):
+                return fn(*args, **kwargs)
+        return avvolta  # type: ignore[return-value]
+    return decora
+
+
+# ------------------------
+# Log JSON lines
+# ------------------------
+_log_lock = threading.Lock()
+_log_percorso: Optional[str] = os.environ.get("STIMA_LOG_TEMPI") or None
+
+def configura_log_tempi(percorso: Optional[str]) -> None:
+    """File a cui accodare una riga JSON per rerun; None disattiva il log."""
+    global _log_percorso
+    with _log_lock:
+        _log_percorso = percorso or None
+
+def percorso_log_tempi() -> Optional[str]:
+    return _log_percorso
+
+def _scrivi_log(misura: MisuraRerun) -> None:
+    percorso = _log_percorso
+    if not percorso:
+        return
+    riga = json.dumps(misura.come_dict(), ensure_ascii=False)
+    with _log_lock:
+        try:
+            with open(percorso, "a", encoding="utf-8") as fh:
+                fh.write(riga + "\n")
+        except OSError:
+            pass   # il log è diagnostico: un file non scrivibile non deve bloccare la pagina
+
+
+# ------------------------
+# Integrazione Streamlit (per sessione)
+# ------------------------
+_SS_TEMPI = "_tempi_fasi_sessione"
+_SS_MISURA = "_tempi_ultimo_rerun"
+
+def avvia_misura_rerun(pagina: str) -> MisuraRerun:
+    """
+    Da chiamare all'inizio dello script di pagina. Chiude come interrotta la
+    misura del rerun precedente se la pagina non ha raggiunto `chiudi_misura_rerun`.
+    """
+    import streamlit as st
+
+    ss = st.session_state
+    precedente = ss.get(_SS_MISURA)
+    if precedente is not None:
+        chiudi_misura(precedente, interrotta=True)
+    sessione = ss.get(_SS_TEMPI)
+    if sessione is None:
+        sessione = ss[_SS_TEMPI] = StatisticheFasi()
+    misura = ss[_SS_MISURA] = avvia_misura(pagina, sessione)
+    return misura
+
+def chiudi_misura_rerun() -> None:
+    """Da chiamare alla fine dello script di pagina."""
+    import streamlit as st
+
+    misura = st.session_state.get(_SS_MISURA)
+    if misura is not None:
+        chiudi_misura(misura)
+
+def statistiche_sessione() -> Dict[str, StatFase]:
+    import streamlit as st
+
+    sessione = st.session_state.get(_SS_TEMPI)
+    return sessione.istantanea() if sessione is not None else {}
+
+def ultima_misura_sessione() -> Optional[MisuraRerun]:
+    import streamlit as st
+
+    return st.session_state.get(_SS_MISURA)
+
+def azzera_statistiche_sessione() -> None:
+    import streamlit as st
+
+    sessione = st.session_state.get(_SS_TEMPI)
+    if sessione is not None:
+        sessione.azzera()
+
+
+__all__ = [
+    "FASE_FATTORE",
+    "FASE_HENSSGE",
+    "FASE_CAUTELATIVA",
+    "FASE_PARAMETRI",
+    "FASE_INTERSEZIONE",
+    "FASE_TESTI",
+    "FASE_DATI_GRAFICO",
+    "FASE_RENDERING",
+    "FASE_VISUALIZZAZIONE",
+    "FASE_RERUN",
+    "ETICHETTE_FASI",
+    "StatFase",
+    "StatisticheFasi",
+    "statistiche_processo",
+    "azzera_statistiche_processo",
+    "azzeramento_processo_abilitato",
+    "MisuraRerun",
+    "avvia_misura",
+    "chiudi_misura",
+    "fase",
+    "cronometra",
+    "configura_log_tempi",
+    "percorso_log_tempi",
+    "avvia_misura_rerun",
+    "chiudi_misura_rerun",
+    "statistiche_sessione",
+    "ultima_misura_sessione",
+    "azzera_statistiche_sessione",
+]
@@ -8,7 +8,9 @@ from app.theme import fc_panel_start
 
 
 from app.graphing import aggiorna_grafico
-from app.data_sources import load_tabelle_correzione
+from app.data_sources import load_tabella2_interpolatore
+from app.shared_resources import inizializza_risorse_condivise
+from app.timing import avvia_misura_rerun, chiudi_misura_rerun
 from app.factor_calc import (DressCounts, compute_factor, SURF_DISPLAY_ORDER, fattore_vestiti_coperte, floor_to_step)
 from app.textgen import paragrafi_descrizioni_base, paragrafi_parametri_aggiuntivi
 
@@ -17,6 +19,8 @@ from app.textgen import paragrafi_descrizioni_base, paragrafi_parametri_aggiunti
 # ------------------------------------------------------------
 st.set_page_config(page_title="STIMA EPOCA DECESSO - MSIL", layout="centered")
 apply_theme()
+inizializza_risorse_condivise()
+avvia_misura_rerun("App_MSIL")
 # ------------------------------------------------------------
 # CSS compatto + nascondi header/footer/badge
 # ------------------------------------------------------------
@@ -376,7 +380,7 @@ def pannello_suggerisci_fc_mobile(peso_default: float = 70.0, key_prefix: str =
     stato_corpo = "Asciutto" if stato_label == "Corpo asciutto" else stato_label
 
     try:
-        tabella2 = load_tabelle_correzione()
+        tabella2 = load_tabella2_interpolatore()
     except Exception:
         tabella2 = None
 
@@ -475,7 +479,7 @@ def pannello_suggerisci_fc_mobile(peso_default: float = 70.0, key_prefix: str =
             )
 
     try:
-        tabella2 = load_tabelle_correzione()
+        tabella2 = load_tabella2_interpolatore()
     except Exception:
         tabella2 = None
 
@@ -616,3 +620,5 @@ st.session_state["selettore_rigidita"] = selettore_rigidita
 
 with st.popover("ℹ️ Raccomandazioni"):
     st.markdown(_raccomandazioni_html(), unsafe_allow_html=True)
+
+chiudi_misura_rerun()
@@ -0,0 +1,113 @@
+# pages/Diagnostica.py
+import pandas as pd
+import streamlit as st
+
+from app.graphing import statistiche_cache_bundle
+from app.henssge import statistiche_cache_henssge
+from app.plotting import statistiche_cache_grafici
+from app.shared_resources import descrivi_risorse_condivise
+from app.timing import (
+    ETICHETTE_FASI, FASE_RERUN,
+    statistiche_processo, statistiche_sessione, ultima_misura_sessione,
+    azzera_statistiche_processo, azzera_statistiche_sessione, azzeramento_processo_abilitato,
+    percorso_log_tempi,
+)
+
+st.set_page_config(page_title="Diagnostica", layout="centered")
+
+st.markdown("## ⏱️ Diagnostica prestazioni")
+st.caption(
+    "Tempi per fase del calcolo. Le fasi annidate (es. Henssge nella stima cautelativa) "
+    "sono incluse nella fase esterna; il rerun completo comprende anche i widget."
+)
+
+
+def _tabella_fasi(stats) -> pd.DataFrame:
+    return pd.DataFrame([
+        {
+            "Fase": ETICHETTE_FASI.get(nome, nome),
+            "Chiamate": s.conteggio,
+            "Totale (ms)": round(1000 * s.totale_s, 2),
+            "Media (ms)": round(1000 * s.media_s, 3),
+            "Max (ms)": round(1000 * s.massimo_s, 2),
+        }
+        for nome, s in stats.items()
+    ])
+
+
+# --- Ultimo rerun della sessione ---
+st.markdown("### Ultimo rerun")
+misura = ultima_misura_sessione()
+if misura is None:
+    st.info("Nessun rerun misurato in questa sessione: esegui una stima nella pagina principale.")
+else:
+    if misura.durata_s is None:
+        stato = "non completato (script interrotto)"
+    else:
+        stato = f"{1000 * misura.durata_s:.1f} ms" + (" (interrotto)" if misura.interrotta else "")
+    st.markdown(f"Pagina **{misura.pagina}**, avviato alle {misura.inizio:%H:%M:%S}: {stato}")
+    if misura.fasi:
+        st.dataframe(pd.DataFrame([
+            {"Fase": ETICHETTE_FASI.get(nome, nome), "Tempo (ms)": round(1000 * dt, 3)}
+            for nome, dt in misura.fasi.items()
+        ]), hide_index=True, width="stretch")
+    else:
+        st.caption("Nessuna fase di calcolo eseguita (risultati dalla cache di sessione).")
+
+# --- Aggregati ---
+st.markdown("### Questa sessione")
+stats_sessione = statistiche_sessione()
+if stats_sessione:
+    st.dataframe(_tabella_fasi(stats_sessione), hide_index=True, width="stretch")
+else:
+    st.caption("Nessun dato.")
+
+st.markdown("### Processo (tutte le sessioni)")
+stats_processo = statistiche_processo()
+if stats_processo:
+    st.dataframe(_tabella_fasi(stats_processo), hide_index=True, width="stretch")
+    if FASE_RERUN in stats_processo:
+        st.caption(f"Rerun misurati dall'avvio del server: {stats_processo[FASE_RERUN].conteggio}")
+else:
+    st.caption("Nessun dato.")
+
+c1, c2 = st.columns(2)
+with c1:
+    if st.button("Azzera tempi della sessione", key="azzera_tempi_sessione"):
+        azzera_statistiche_sessione()
+        st.rerun()
+with c2:
+    # i tempi del processo sono condivisi da tutte le sessioni: azzerabili solo se abilitato lato server
+    if azzeramento_processo_abilitato():
+        if st.button("Azzera tempi del processo", key="azzera_tempi_processo"):
+            azzera_statistiche_processo()
+            st.rerun()
+
+# --- Cache ---
+st.markdown("### Cache")
+bundle = statistiche_cache_bundle()
+henssge = statistiche_cache_henssge()
+grafici = statistiche_cache_grafici()
+st.dataframe(pd.DataFrame([
+    {"Cache": "Risultati (sessione)", "Hit": bundle["hits"], "Miss": bundle["misses"],
+     "Voci": f"{bundle['size']}/{bundle['maxsize']}"},
+    {"Cache": "Henssge (processo)", "Hit": henssge.hits, "Miss": henssge.misses,
+     "Voci": f"{henssge.size}/{henssge.maxsize}"},
+    {"Cache": "Immagini grafico (processo)", "Hit": grafici.hits, "Miss": grafici.misses,
+     "Voci": f"{grafici.size}/{grafici.maxsize}"},
+]), hide_index=True, width="stretch")
+
+st.markdown("### Risorse condivise")
+st.dataframe(pd.DataFrame([
+    {"Risorsa": r.nome, "Memoria (kB)": round(r.byte / 1024, 1), "Sola lettura": r.sola_lettura}
+    for r in descrivi_risorse_condivise()
+]), hide_index=True, width="stretch")
+
+# --- Log ---
+st.markdown("### Log dei rerun (JSON lines)")
+percorso = percorso_log_tempi()
+if percorso:
+    st.markdown(f"Una riga JSON per rerun accodata a `{percorso}`.")
+else:
+    # il percorso si imposta solo lato server: la pagina è raggiungibile da ogni sessione
+    st.caption("Log disattivato: imposta la variabile d'ambiente STIMA_LOG_TEMPI all'avvio del server.")
@@ -22,6 +22,34 @@ st.session_state["henssge_round_minutes"] = {
 
 st.success(f"Impostato a {st.session_state['henssge_round_minutes']} minuti.")
 
+# Metodo di inversione dell'equazione di Henssge
+if "henssge_metodo" not in st.session_state:
+    st.session_state["henssge_metodo"] = "bisezione"
+
+scelta_metodo = st.radio(
+    "Metodo di calcolo per l'equazione di Henssge",
+    ["Esatto (bisezione)", "Rapido (tabella precalcolata, errore < 6 minuti)"],
+    index={"bisezione": 0, "tabella": 1}[st.session_state["henssge_metodo"]],
+)
+st.session_state["henssge_metodo"] = {
+    "Esatto (bisezione)": "bisezione",
+    "Rapido (tabella precalcolata, errore < 6 minuti)": "tabella",
+}[scelta_metodo]
+
+# Motore di disegno del grafico dei range
+if "grafico_backend" not in st.session_state:
+    st.session_state["grafico_backend"] = "matplotlib"
+
+scelta_grafico = st.radio(
+    "Motore di disegno del grafico",
+    ["Matplotlib (immagine PNG)", "SVG leggero (più rapido)"],
+    index={"matplotlib": 0, "svg": 1}[st.session_state["grafico_backend"]],
+)
+st.session_state["grafico_backend"] = {
+    "Matplotlib (immagine PNG)": "matplotlib",
+    "SVG leggero (più rapido)": "svg",
+}[scelta_grafico]
+
 if st.button("⬅️ Torna alla pagina principale", key="back_home"):
     st.switch_page("app.py")
 